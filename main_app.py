@@ -1,166 +1,3293 @@
 import os
 import configparser
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pythoncom
-import win32com.client
+from tkinter import ttk, messagebox, filedialog
 import subprocess
 import time
 import sys
+import queue
+import threading
+import argparse
+import csv
+import itertools
+import json
+import collections
+import random
+import atexit
+import tempfile
+import math
+import types
+import re
+import string
+import logging
+import logging.handlers
+
+# Origine des mesures du rapport de démarrage (--startup-report)
+STARTUP_T0 = time.perf_counter()
 
 CONFIG_FILE = "config.ini"
+# Journal local des HU traitées (un objet JSON par ligne, en ajout seul)
+JOURNAL_FILE = "hu_journal.jsonl"
+# Index local des HU déjà créées, tous lots confondus (une HU par ligne, trié)
+HU_INDEX_FILE = "hu_index.txt"
+# Valeurs de l'écran d'emballage lues dans SAP (postes, emplacements, types de HU), par environnement
+PACK_VALUES_FILE = "pack_values.json"
+PACK_VALUES_TTL = 24 * 3600
+# Format des entrées du cache ; une entrée d'un autre format est relue dans SAP
+PACK_VALUES_FORMAT = 2
+# Macros de transactions (déclarées ou importées d'un enregistrement SAP GUI), à côté de config.ini
+MACRO_FILE = "macros.json"
+# Log complet de la fenêtre de création des HU (fichiers tournants) ; la fenêtre n'en garde que la fin
+HU_LOG_FILE = "hu_creation.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_MAX_LINES = 1000
+LOG_FRAME_MS = 100
 
-def load_config():
-    """Charge la config depuis config.ini (ou crée par défaut si absent)."""
-    config = configparser.ConfigParser()
-    if not os.path.exists(CONFIG_FILE):
-        # Créer un config.ini par défaut
-        config["SAP"] = {
-            "saplogon_path": r"C:\Program Files\SAP\FrontEnd\SAPGUI\saplogon.exe",
-            "sap_environment": "1075 PW1 - EWM Production with SSO"
-        }
-        config["Transactions"] = {
-            "favorites": "/n/scwm/mon, /n/scwm/packspec, /n/scwm/mat1"
-        }
-        config["App"] = {
-            "version": "1.0.0"
-        }
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            config.write(f)
+# Description déclarative des champs de la transaction /scwm/pack, par nom logique
+PACK_SCANNER = "wnd[0]/usr/subSUB_SCANNER:/SCWM/SAPLUI_PACKING:0200/tabsTS_SCANNER/tabpHU_CREATE/ssubSS_SCANNER:/SCWM/SAPLUI_PACKING:0202/"
+PACK_SCREEN = {
+    "okcode": "wnd[0]/tbar[0]/okcd",
+    "window": "wnd[0]",
+    "status_bar": "wnd[0]/sbar",
+    # Écran de sélection
+    "work_center": "wnd[0]/usr/ctxtPA_WRKST",
+    "storage_bin": "wnd[0]/usr/ctxtSOLGPLA-LOW",
+    # Onglet scanner "Créer HU" (dynpro 0202)
+    "dest_hu": PACK_SCANNER + "txt/SCWM/S_PACK_VIEW_SCANNER-DEST_HU_UI",
+    "pack_material": PACK_SCANNER + "ctxt/SCWM/S_PACK_VIEW_SCANNER-DEST_PMAT_NO",
+    "dest_bin": PACK_SCANNER + "txt/SCWM/S_PACK_VIEW_SCANNER-DEST_ID",
+}
+# Aide F4 dans un popup : en grille ALV, ou en liste (une valeur par ligne à partir de F4_FIRST_ROW,
+# seules les lignes affichées existent)
+F4_POPUP = "wnd[1]"
+F4_AREA = "wnd[1]/usr"
+F4_LIST_LABEL = "wnd[1]/usr/lbl[{column},{row}]"
+F4_FIRST_ROW = 3
+F4_VALUE_COLUMN = 1
+F4_MAX_ROWS = 5000
+
+# SAP limite le nombre de sessions par connexion
+MAX_SAP_SESSIONS = 6
+
+# Délai maximal d'enregistrement de SAPGUI après le lancement de SAP Logon (secondes)
+SAPLOGON_TIMEOUT = 30
+
+# Attentes pilotées par l'état de la session (secondes)
+WAIT_TIMEOUT = 30
+WAIT_POLL_MIN = 0.002
+WAIT_POLL_MAX = 0.2
+# Lissage de la durée observée d'un aller-retour serveur (moyenne mobile exponentielle),
+# et part de cette durée attendue d'un bloc avant de sonder la session
+ROUNDTRIP_EWMA_ALPHA = 0.2
+ROUNDTRIP_FIRST_WAIT = 0.8
+# Réduction de l'estimation quand la session est libre dès le premier sondage (aller-retour plus court)
+ROUNDTRIP_SHORTEN = 0.75
+
+# Nouvelles tentatives des HU en échec (délai doublé à chaque tentative, en secondes)
+HU_MAX_RETRIES = 1
+HU_RETRY_BACKOFF = 2.0
+
+# Création en masse des HU sans numéro : nombre maximal de HU par validation,
+# et nombre maximal de HU par lot dans l'interface (100 sans champ de quantité)
+HU_BULK_SIZE = 500
+HU_BULK_MAX_COUNT = 100000
+
+#
+# ---- CONFIGURATION (config.ini chargé une seule fois, écritures différées) ----
+#
+DEFAULT_CONFIG = {
+    "SAP": {
+        "saplogon_path": r"C:\Program Files\SAP\FrontEnd\SAPGUI\saplogon.exe",
+        "sap_environment": "1075 PW1 - EWM Production with SSO",
+    },
+    "Transactions": {
+        "favorites": "/n/scwm/mon, /n/scwm/packspec, /n/scwm/mat1",
+    },
+    "App": {
+        "version": "1.0.0",
+        "session_refresh_interval": "5",
+    },
+    "HU": {
+        "work_center": "GPAK",
+        "storage_bin": "COOL-PACK, GR-ZONE",
+        "hu_type": "PAC0002, PAC0005, PAC0008, PAC0011, PAC0012",
+        # Format accepté d'un numéro de HU (expression régulière sur le numéro entier)
+        "hu_pattern": "[0-9A-Za-z]{1,20}",
+        # Chargement des valeurs valides depuis SAP (PACK_VALUE_FETCHERS, vide pour désactiver), durée du cache en secondes
+        "pack_values_source": "f4",
+        "pack_values_ttl": str(PACK_VALUES_TTL),
+    },
+}
+
+class ConfigStore:
+    """
+    Configuration de l'application gardée en mémoire.
+    config.ini est lu une seule fois ; les sections et clés absentes prennent les valeurs
+    de DEFAULT_CONFIG. Chaque modification programme une écriture différée (FLUSH_DELAY)
+    de toutes les sections, faite dans un fichier temporaire puis renommée sur config.ini :
+    plusieurs modifications rapprochées ne donnent qu'une écriture, jamais un fichier partiel.
+    Les listes (valeurs séparées par des virgules) gardent leur ordre et ne contiennent pas de doublon.
+    """
+    FLUSH_DELAY = 0.5
 
-    config.read(CONFIG_FILE, encoding="utf-8")
+    def __init__(self, path=CONFIG_FILE, defaults=DEFAULT_CONFIG):
+        self.path = path
+        self._lock = threading.RLock()
+        self._timer = None
+        self._dirty = False
+        self._parser = configparser.ConfigParser()
+        exists = os.path.exists(path)
+        if exists:
+            self._parser.read(path, encoding="utf-8")
+        for section, values in defaults.items():
+            if not self._parser.has_section(section):
+                self._parser.add_section(section)
+            for key, value in values.items():
+                if not self._parser.has_option(section, key):
+                    self._parser.set(section, key, value)
+        if not exists:
+            # Créer un config.ini par défaut
+            self._dirty = True
+            self.flush()
+        atexit.register(self.flush)
 
-    saplogon_path = config["SAP"].get("saplogon_path", r"C:\Program Files\SAP\FrontEnd\SAPGUI\saplogon.exe")
-    sap_env = config["SAP"].get("sap_environment", "1075 PW1 - EWM Production with SSO")
+    def get(self, section, key, fallback=None):
+        with self._lock:
+            return self._parser.get(section, key, fallback=fallback)
 
-    tx_list = config["Transactions"].get("favorites", "/n/scwm/mon,/n/scwm/packspec").split(",")
-    tx_list = [tx.strip() for tx in tx_list if tx.strip()]
+    def get_int(self, section, key, fallback=None):
+        with self._lock:
+            return self._parser.getint(section, key, fallback=fallback)
 
-    version_app = config["App"].get("version", "1.0.0")
+    def get_float(self, section, key, fallback=None):
+        with self._lock:
+            return self._parser.getfloat(section, key, fallback=fallback)
 
+    def get_bool(self, section, key, fallback=None):
+        with self._lock:
+            return self._parser.getboolean(section, key, fallback=fallback)
+
+    def get_list(self, section, key, fallback=""):
+        """Valeurs d'une liste séparée par des virgules, dans l'ordre, sans doublon ni vide."""
+        raw = self.get(section, key, fallback=fallback) or ""
+        return list(dict.fromkeys(v.strip() for v in raw.split(",") if v.strip()))
+
+    def section(self, section):
+        with self._lock:
+            return dict(self._parser[section]) if self._parser.has_section(section) else {}
+
+    def sections(self):
+        with self._lock:
+            return self._parser.sections()
+
+    def set(self, section, key, value):
+        with self._lock:
+            if not self._parser.has_section(section):
+                self._parser.add_section(section)
+            if self._parser.get(section, key, fallback=None) == str(value):
+                return
+            self._parser.set(section, key, str(value))
+            self._dirty = True
+            self._schedule_flush()
+
+    def set_list(self, section, key, values):
+        self.set(section, key, ", ".join(dict.fromkeys(v.strip() for v in values if v.strip())))
+
+    def add_to_list(self, section, key, value):
+        """Ajoute 'value' en fin de liste si elle n'y est pas ; renvoie True si la liste a changé."""
+        values = self.get_list(section, key)
+        if not value.strip() or value.strip() in values:
+            return False
+        self.set_list(section, key, values + [value])
+        return True
+
+    def remove_from_list(self, section, key, value):
+        values = self.get_list(section, key)
+        if value not in values:
+            return False
+        values.remove(value)
+        self.set_list(section, key, values)
+        return True
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.FLUSH_DELAY, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Écrit immédiatement toutes les sections s'il y a des modifications (fichier temporaire + renommage atomique)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    self._parser.write(f)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+_config_store = None
+
+def get_config():
+    """ConfigStore partagé par toute l'application, créé au premier appel."""
+    global _config_store
+    if _config_store is None:
+        _config_store = ConfigStore()
+    return _config_store
+
+def load_config():
+    """Renvoie (saplogon_path, sap_env, tx_list, version_app) depuis la configuration en mémoire."""
+    config = get_config()
+    saplogon_path = config.get("SAP", "saplogon_path")
+    sap_env = config.get("SAP", "sap_environment")
+    tx_list = config.get_list("Transactions", "favorites")
+    version_app = config.get("App", "version")
     return saplogon_path, sap_env, tx_list, version_app
 
 def save_config(saplogon_path, sap_env, tx_list, version_app="1.0.0"):
-    """Enregistre la config dans config.ini."""
-    config = configparser.ConfigParser()
-    config["SAP"] = {
-        "saplogon_path": saplogon_path,
-        "sap_environment": sap_env
-    }
-    config["Transactions"] = {
-        "favorites": ", ".join(tx_list)
-    }
-    config["App"] = {
-        "version": version_app
-    }
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        config.write(f)
+    """Met à jour la configuration ; les autres sections (dont [HU]) sont conservées."""
+    config = get_config()
+    config.set("SAP", "saplogon_path", saplogon_path)
+    config.set("SAP", "sap_environment", sap_env)
+    config.set_list("Transactions", "favorites", tx_list)
+    config.set("App", "version", version_app)
+
+# Profils d'environnement : la section [SAP] (profil par défaut) et les sections [Env:NOM]
+DEFAULT_ENV_PROFILE = "SAP"
+ENV_SECTION_PREFIX = "Env:"
 
-def get_sap_gui_object(timeout=30):
+def env_profiles():
     """
-    Tente de récupérer l'objet SAPGUI (ScriptingEngine) pendant 'timeout' secondes.
-    Retourne l'objet si disponible, sinon None après expiration.
+    Noms des profils d'environnement : DEFAULT_ENV_PROFILE, puis ceux des sections [Env:NOM]
+    (clé sap_environment, et saplogon_path si elle diffère de celle de [SAP]).
+    """
+    names = [section[len(ENV_SECTION_PREFIX):].strip() for section in get_config().sections()
+             if section.startswith(ENV_SECTION_PREFIX)]
+    return [DEFAULT_ENV_PROFILE] + [name for name in names if name and name != DEFAULT_ENV_PROFILE]
+
+def load_env_profile(name=None):
+    """Renvoie (saplogon_path, sap_env) du profil 'name' ([SAP] par défaut) ; lève ValueError s'il n'existe pas."""
+    config = get_config()
+    saplogon_path = config.get("SAP", "saplogon_path")
+    if not name or name == DEFAULT_ENV_PROFILE:
+        return saplogon_path, config.get("SAP", "sap_environment")
+    section = config.section(ENV_SECTION_PREFIX + name)
+    if not section.get("sap_environment"):
+        raise ValueError(f"Profil d'environnement inconnu : '{name}' (disponibles : {', '.join(env_profiles())})")
+    return section.get("saplogon_path") or saplogon_path, section["sap_environment"]
+
+def env_file(path, env=None):
+    """Fichier propre au profil 'env' : hu_index.txt devient hu_index.QW1.txt ; inchangé pour le profil par défaut."""
+    if not env or env == DEFAULT_ENV_PROFILE:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{re.sub(r'[^0-9A-Za-z_-]', '_', env)}{ext}"
+
+#
+# ---- BACKENDS SAP GUI (COM / simulateur) ----
+#
+# Le reste du code ne manipule que le modèle objet de SAP GUI Scripting :
+#   GuiAuto.GetScriptingEngine -> application
+#   application.Children(i) / .Count, application.OpenConnection(desc, True), application.findById(id)
+#   connection.Name / .Description / .Children(i) / .Count
+#   session.Id / .Busy / .Info (Program, ScreenNumber, Transaction) / .findById(id, raise)
+#   control.Text / .sendVKey(n) / .maximize()
+# Un backend fournit l'objet GuiAuto, le type d'erreur levé par ces objets
+# et l'initialisation COM de chaque thread.
+class SapBackend:
+    """Interface commune des backends d'accès à SAP GUI."""
+    name = ""
+    # Type d'exception levé par les objets du backend (contrôle absent, session occupée...)
+    com_error = Exception
+    # Messages de la barre de statut propres au backend, (classe, numéro) -> résultat (voir get_status_table)
+    status_messages = {}
+
+    def init_thread(self):
+        """À appeler au début de chaque thread qui manipule des objets SAP."""
+
+    def release_thread(self):
+        """À appeler à la fin de chaque thread qui a appelé init_thread()."""
+
+    def get_gui_object(self):
+        """Renvoie l'objet SAPGUI enregistré, ou lève com_error si SAP Logon ne tourne pas."""
+        raise NotImplementedError
+
+    def start_saplogon(self, saplogon_path):
+        """Démarre SAP Logon et renvoie le processus lancé (poll() renvoie None tant qu'il tourne)."""
+        raise NotImplementedError
+
+    def is_saplogon_running(self, saplogon_path):
+        """Indique si un processus SAP Logon tourne déjà (table des processus)."""
+        return False
+
+class ComBackend(SapBackend):
+    """Accès réel à SAP GUI via COM (pywin32). Les modules COM ne sont importés qu'au premier usage."""
+    name = "com"
+
+    def __init__(self):
+        self._pythoncom = None
+        self._client = None
+
+    def _modules(self):
+        if self._pythoncom is None:
+            try:
+                import pythoncom
+                import win32com.client
+            except ImportError as e:
+                raise RuntimeError(f"Le backend COM nécessite pywin32 (Windows) : {e}")
+            self._pythoncom, self._client = pythoncom, win32com.client
+        return self._pythoncom, self._client
+
+    @property
+    def com_error(self):
+        return self._modules()[0].com_error
+
+    def init_thread(self):
+        self._modules()[0].CoInitialize()
+
+    def release_thread(self):
+        self._modules()[0].CoUninitialize()
+
+    def get_gui_object(self):
+        return self._modules()[1].GetObject("SAPGUI")
+
+    def start_saplogon(self, saplogon_path):
+        return subprocess.Popen([saplogon_path])
+
+    def is_saplogon_running(self, saplogon_path):
+        image_name = os.path.basename(saplogon_path) or "saplogon.exe"
+        try:
+            result = subprocess.run(
+                ["tasklist", "/FI", f"IMAGENAME eq {image_name}", "/NH", "/FO", "CSV"],
+                capture_output=True, text=True, timeout=5,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return f'"{image_name.lower()}"' in result.stdout.lower()
+
+class SimulatedComError(Exception):
+    """Erreur levée par les objets du simulateur (équivalent de pythoncom.com_error)."""
+
+# Lignes affichées par le popup F4 simulé : les listes plus longues doivent défiler
+SIM_F4_PAGE_SIZE = 3
+
+class SimulatorBackend(SapBackend):
+    """
+    Simulateur SAP GUI déterministe, en mémoire, pour les tests de charge et les benchmarks.
+    Il modélise l'écran d'accueil, l'ouverture et la fermeture de sessions (/o, 6 au maximum), /scwm/pack
+    (écran de sélection puis onglet scanner de création de HU, aides F4 : SIM_F4_VALUES) et la barre de statut.
+    - call_latency : durée de chaque appel (propriété ou méthode) sur un objet simulé
+    - roundtrip_latency : durée d'un aller-retour serveur (sendVKey) ; l'appel rend la main tout de suite
+      et la session reste occupée (Busy vrai, findById en erreur) pendant cette durée
+    - error_rate : probabilité qu'une création d'HU échoue (objet verrouillé)
+    - com_error_rate : probabilité qu'un findById lève une erreur COM
+    - seed : graine du générateur aléatoire, pour des runs reproductibles
+    - quantity_field : Id d'un champ de quantité sur l'onglet scanner (création en masse), absent si None
+    - f4_page_size : nombre de lignes affichées par le popup F4 (liste à faire défiler, ou grille chargée par page)
+    - f4_grid : aides F4 affichées en grille ALV plutôt qu'en liste
+    - saplogon_running : SAP Logon tourne déjà ; sinon start_saplogon le lance, et SAPGUI
+      s'enregistre après 'saplogon_delay' secondes, ou le processus s'arrête avec 'saplogon_exit_code'
+    """
+    name = "simulator"
+    com_error = SimulatedComError
+
+    def __init__(self, call_latency=0.0, roundtrip_latency=0.0, error_rate=0.0, com_error_rate=0.0,
+                 seed=0, saplogon_running=True, quantity_field=None, saplogon_delay=0.0, saplogon_exit_code=None,
+                 f4_page_size=SIM_F4_PAGE_SIZE, f4_grid=False):
+        self.call_latency = call_latency
+        self.quantity_field = quantity_field
+        self.f4_page_size = f4_page_size
+        self.f4_grid = f4_grid
+        self.saplogon_delay = saplogon_delay
+        self.saplogon_exit_code = saplogon_exit_code
+        self._registered_at = 0.0
+        self.roundtrip_latency = roundtrip_latency
+        self.error_rate = error_rate
+        self.com_error_rate = com_error_rate
+        self.saplogon_running = saplogon_running
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.application = SimApplication(self)
+        # Compteurs : appels sur les objets simulés, allers-retours serveur
+        self.calls = 0
+        self.roundtrips = 0
+
+    @property
+    def status_messages(self):
+        return SIM_STATUS_MESSAGES
+
+    def get_gui_object(self):
+        self.call()
+        if not self.saplogon_running or time.monotonic() < self._registered_at:
+            raise SimulatedComError("SAPGUI n'est pas enregistré.")
+        return SimGuiAuto(self.application)
+
+    def start_saplogon(self, saplogon_path):
+        process = SimProcess(self.saplogon_exit_code)
+        if self.saplogon_exit_code is None:
+            self.saplogon_running = True
+            self._registered_at = time.monotonic() + self.saplogon_delay
+        return process
+
+    def is_saplogon_running(self, saplogon_path):
+        return self.saplogon_running
+
+    def stop_saplogon(self):
+        """Ferme SAP Logon, comme l'utilisateur : connexions et sessions deviennent périmées."""
+        self.saplogon_running = False
+        for connection in self.application.connections:
+            connection.closed = True
+            for session in connection.sessions:
+                session.closed = True
+        self.application.connections = []
+
+    def call(self):
+        with self._lock:
+            self.calls += 1
+        if self.call_latency:
+            time.sleep(self.call_latency)
+
+    def roundtrip(self, session=None):
+        """Aller-retour serveur : la session reste occupée 'roundtrip_latency' secondes, sans bloquer l'appelant."""
+        with self._lock:
+            self.roundtrips += 1
+        if self.roundtrip_latency:
+            if session is not None:
+                session.busy_until = time.monotonic() + self.roundtrip_latency
+            else:
+                # Sans session (ouverture de connexion), l'appel est synchrone
+                time.sleep(self.roundtrip_latency)
+
+    def draw(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+class SimProcess:
+    """Processus SAP Logon simulé : poll() renvoie None tant qu'il tourne, sinon son code de sortie."""
+    def __init__(self, exit_code=None):
+        self.returncode = exit_code
+
+    def poll(self):
+        return self.returncode
+
+class SimGuiAuto:
+    def __init__(self, application):
+        self.GetScriptingEngine = application
+
+class SimCollection:
+    """Collection COM : appelable avec un index, et propriété Count."""
+    def __init__(self, backend, items):
+        self._backend = backend
+        self._items = items
+
+    @property
+    def Count(self):
+        self._backend.call()
+        return len(self._items)
+
+    def __call__(self, index):
+        self._backend.call()
+        return self._items[index]
+
+    Item = __call__
+
+class SimApplication:
+    def __init__(self, backend):
+        self._backend = backend
+        self.connections = []
+        # Numéros des HU déjà créées, par système (description de la connexion), partagés par ses sessions
+        self.created_hus = {}
+        self._next_hu = 100000000000
+
+    @property
+    def Children(self):
+        self._backend.call()
+        return SimCollection(self._backend, self.connections)
+
+    def OpenConnection(self, description, sync=True):
+        self._backend.call()
+        self._backend.roundtrip()
+        connection = SimConnection(self._backend, self, len(self.connections), description)
+        self.connections.append(connection)
+        return connection
+
+    def findById(self, control_id, raise_error=True):
+        self._backend.call()
+        for connection in self.connections:
+            for session in connection.sessions:
+                if control_id == session.Id:
+                    return session
+                if control_id.startswith(session.Id + "/"):
+                    return session.find(control_id[len(session.Id) + 1:], raise_error)
+        if raise_error:
+            raise SimulatedComError(f"Objet introuvable : {control_id}")
+        return None
+
+    FindById = findById
+
+    def new_hu_number(self):
+        with self._backend._lock:
+            self._next_hu += 1
+            return str(self._next_hu)
+
+class SimConnection:
+    def __init__(self, backend, application, index, description):
+        self._backend = backend
+        self.application = application
+        self.Id = f"/app/con[{index}]"
+        self.Name = description
+        self.Description = description
+        self.created_hus = application.created_hus.setdefault(description, set())
+        self.sessions = []
+        self._next_session = 0
+        # Connexion perdue (SAP Logon fermé) : ses poignées sont périmées
+        self.closed = False
+        self.add_session()
+
+    @property
+    def Children(self):
+        self._backend.call()
+        if self.closed:
+            raise SimulatedComError(f"Connexion fermée : {self.Id}")
+        return SimCollection(self._backend, self.sessions)
+
+    def add_session(self):
+        session = SimSession(self._backend, self, f"{self.Id}/ses[{self._next_session}]")
+        self._next_session += 1
+        self.sessions.append(session)
+        return session
+
+    def CloseSession(self, session_id):
+        self._backend.call()
+        for session in self.sessions:
+            if session.Id == session_id:
+                session.closed = True
+        self.sessions[:] = [session for session in self.sessions if session.Id != session_id]
+
+class SimInfo:
+    def __init__(self, session):
+        self._session = session
+
+    @property
+    def Program(self):
+        self._session._backend.call()
+        return self._session.screen[0]
+
+    @property
+    def ScreenNumber(self):
+        self._session._backend.call()
+        return self._session.screen[1]
+
+    @property
+    def Transaction(self):
+        self._session._backend.call()
+        return self._session.transaction
+
+# Écrans simulés : (programme, dynpro) -> (titre, contrôles propres à l'écran)
+SIM_SCREENS = {
+    ("SAPLSMTR_NAVIGATION", 100): ("SAP Easy Access", ()),
+    ("/SCWM/R_PACKING", 1000): ("Packing - General", (PACK_SCREEN["work_center"], PACK_SCREEN["storage_bin"])),
+    ("/SCWM/SAPLUI_PACKING", 200): ("Packing - Work Center",
+                                    (PACK_SCREEN["dest_hu"], PACK_SCREEN["pack_material"], PACK_SCREEN["dest_bin"])),
+}
+SIM_COMMON_CONTROLS = ("wnd[0]", "wnd[0]/tbar[0]/okcd", "wnd[0]/sbar")
+# Id fictif du champ de quantité proposé par le simulateur (option quantity_field)
+SIM_QUANTITY_FIELD = PACK_SCANNER + "txt/SCWM/S_PACK_VIEW_SCANNER-HU_QUANTITY"
+# Listes proposées par l'aide F4 des champs de /scwm/pack
+SIM_F4_VALUES = {
+    PACK_SCREEN["work_center"]: ("GPAK", "RPAK", "GPK2"),
+    PACK_SCREEN["storage_bin"]: ("GR-ZONE", "COOL-PACK", "PACK-01", "PACK-02"),
+    PACK_SCREEN["pack_material"]: ("PAC0011", "PAC0002", "PAC0005", "PAC0008", "PAC0012"),
+}
+SIM_F4_LABEL = re.compile(r"wnd\[1\]/usr/lbl\[(\d+),(\d+)\]")
+SIM_F4_GRID = "wnd[1]/usr/cntlCONTAINER/shellcont/shell"
+
+class SimSession:
+    def __init__(self, backend, connection, session_id):
+        self._backend = backend
+        self.connection = connection
+        self.Id = session_id
+        # Fin de l'aller-retour serveur en cours (time.monotonic())
+        self.busy_until = 0.0
+        self.screen = ("SAPLSMTR_NAVIGATION", 100)
+        self.transaction = "SESSION_MANAGER"
+        self.title = None
+        self.fields = {}
+        self.status = ""
+        self.message = ("", "", "")
+        self.focus = None
+        # Valeurs du popup d'aide F4 ouvert (None si aucun) et première ligne affichée
+        self.popup = None
+        self.popup_top = 0
+        # Session fermée (CloseSession) : ses poignées sont périmées
+        self.closed = False
+
+    @property
+    def busy(self):
+        return time.monotonic() < self.busy_until
+
+    @property
+    def Busy(self):
+        self._backend.call()
+        if self.closed:
+            raise SimulatedComError(f"Session fermée : {self.Id}")
+        return self.busy
+
+    @property
+    def Info(self):
+        self._backend.call()
+        return SimInfo(self)
+
+    def findById(self, control_id, raise_error=True):
+        self._backend.call()
+        if self.closed:
+            raise SimulatedComError(f"Session fermée : {self.Id}")
+        if self.busy:
+            raise SimulatedComError("La session est occupée.")
+        if self._backend.draw(self._backend.com_error_rate):
+            raise SimulatedComError(f"Erreur COM simulée sur {control_id}")
+        return self.find(control_id, raise_error)
+
+    FindById = findById
+
+    def find(self, control_id, raise_error=True):
+        if self.popup is not None and (control_id in (F4_POPUP, F4_AREA) or self.popup_value(control_id) is not None):
+            return SimControl(self, control_id, self.screen)
+        if self.popup is not None and self._backend.f4_grid and control_id == SIM_F4_GRID:
+            return SimF4Grid(self, control_id, self.screen)
+        if control_id in SIM_COMMON_CONTROLS or control_id in SIM_SCREENS.get(self.screen, ("", ()))[1]:
+            return SimControl(self, control_id, self.screen)
+        if control_id == self._backend.quantity_field and self.screen == ("/SCWM/SAPLUI_PACKING", 200):
+            return SimControl(self, control_id, self.screen)
+        if raise_error:
+            raise SimulatedComError(f"Contrôle introuvable : {control_id}")
+        return None
+
+    def popup_value(self, control_id):
+        """Valeur affichée par la ligne 'control_id' du popup F4 en liste, None si elle n'existe pas."""
+        match = SIM_F4_LABEL.fullmatch(control_id)
+        if self.popup is None or self._backend.f4_grid or not match or int(match.group(1)) != F4_VALUE_COLUMN:
+            return None
+        row = int(match.group(2)) - F4_FIRST_ROW
+        if not 0 <= row < self._backend.f4_page_size:
+            return None
+        row += self.popup_top
+        return self.popup[row] if row < len(self.popup) else None
+
+    def window_title(self):
+        return self.title or SIM_SCREENS.get(self.screen, (self.transaction, ()))[0]
+
+    def set_status(self, text, msg_type="", msg_id="", number=""):
+        self.status = text
+        self.message = (msg_type, msg_id, number)
+
+    def goto(self, transaction):
+        self.fields = {}
+        self.popup = None
+        self.transaction = transaction.upper()
+        if transaction.lower() == "/scwm/pack":
+            self.screen = ("/SCWM/R_PACKING", 1000)
+            self.title = None
+        else:
+            self.screen = ("SAPLSIM", 100)
+            self.title = transaction.upper()
+
+    def send_vkey(self, key):
+        self._backend.roundtrip(self)
+        okcode = self.fields.pop("wnd[0]/tbar[0]/okcd", "").strip()
+        if self.popup is not None:
+            # Popup F4 : Entrée ou F12 le referment
+            if key in (0, 12):
+                self.popup = None
+            return
+        if key == 4:
+            if self.focus in SIM_F4_VALUES:
+                self.popup = list(SIM_F4_VALUES[self.focus])
+                self.popup_top = 0
+            else:
+                self.set_status("No input help is available", "E", "SIMPACK", "006")
+        elif key == 0 and okcode:
+            self.run_okcode(okcode)
+        elif key == 8 and self.screen == ("/SCWM/R_PACKING", 1000):
+            self.screen = ("/SCWM/SAPLUI_PACKING", 200)
+            self.set_status("")
+        elif key == 8 and self.screen == ("/SCWM/SAPLUI_PACKING", 200):
+            self.create_hu()
+        elif key in (2, 3) and self.screen == ("/SCWM/SAPLUI_PACKING", 200):
+            for name in ("dest_hu", "pack_material", "dest_bin"):
+                self.fields.pop(PACK_SCREEN[name], None)
+            self.fields.pop(self._backend.quantity_field, None)
+
+    def run_okcode(self, okcode):
+        if okcode.lower().startswith("/o"):
+            if len(self.connection.sessions) >= MAX_SAP_SESSIONS:
+                self.set_status("Maximum number of sessions reached")
+                return
+            new_session = self.connection.add_session()
+            if okcode[2:]:
+                new_session.goto("/" + okcode[2:].lstrip("/"))
+        elif okcode.lower().startswith("/n"):
+            self.goto("/" + okcode[2:].lstrip("/") if okcode[2:] else "SESSION_MANAGER")
+        else:
+            self.goto(okcode)
+
+    def create_hu(self):
+        application = self.connection.application
+        hu = self.fields.get(PACK_SCREEN["dest_hu"], "").strip()
+        if not self.fields.get(PACK_SCREEN["pack_material"], "").strip():
+            self.set_status("Enter a packaging material", "E", "SIMPACK", "003")
+            return
+        if hu and hu in self.connection.created_hus:
+            self.set_status(f"HU {hu} already exists", "E", "SIMPACK", "002")
+            return
+        if self._backend.draw(self._backend.error_rate):
+            self.set_status(f"HU {hu} is currently locked by another user", "E", "MC", "601")
+            return
+        quantity = int(self.fields.pop(self._backend.quantity_field, "") or 1)
+        if quantity > 1:
+            if hu:
+                self.set_status("Quantity is only allowed for HUs without number", "E", "SIMPACK", "004")
+                return
+            for _ in range(quantity):
+                self.connection.created_hus.add(application.new_hu_number())
+            self.set_status(f"{quantity} HUs were constructed", "S", "SIMPACK", "005")
+            return
+        hu = hu or application.new_hu_number()
+        self.connection.created_hus.add(hu)
+        self.fields.pop(PACK_SCREEN["dest_hu"], None)
+        self.set_status(f"HU {hu} was constructed", "S", "SIMPACK", "001")
+
+class SimControl:
+    """Contrôle simulé ; une référence devient périmée quand l'écran de la session change."""
+    def __init__(self, session, control_id, screen):
+        self._session = session
+        self._backend = session._backend
+        self.Id = control_id
+        self._screen = screen
+
+    def _check(self):
+        self._backend.call()
+        if self.Id.startswith(F4_POPUP) and self._session.popup is None:
+            raise SimulatedComError(f"Référence périmée : {self.Id}")
+        if self.Id not in SIM_COMMON_CONTROLS and self._session.screen != self._screen:
+            raise SimulatedComError(f"Référence périmée : {self.Id}")
+
+    @property
+    def Text(self):
+        self._check()
+        if self.Id == "wnd[0]":
+            return self._session.window_title()
+        if self.Id == "wnd[0]/sbar":
+            return self._session.status
+        if self.Id.startswith(F4_POPUP):
+            return self._session.popup_value(self.Id) or ""
+        return self._session.fields.get(self.Id, "")
+
+    @Text.setter
+    def Text(self, value):
+        self._check()
+        self._session.fields[self.Id] = value
+
+    text = Text
+
+    # Barre de statut : type (S, W, E, A, I), classe et numéro du message
+    def _message(self, position):
+        self._check()
+        return self._session.message[position] if self.Id == "wnd[0]/sbar" else ""
+
+    MessageType = property(lambda self: self._message(0))
+    MessageId = property(lambda self: self._message(1))
+    MessageNumber = property(lambda self: self._message(2))
+
+    def sendVKey(self, key):
+        self._check()
+        self._session.send_vkey(key)
+
+    SendVKey = sendVKey
+
+    def setFocus(self):
+        self._check()
+        self._session.focus = self.Id
+
+    SetFocus = setFocus
+
+    def maximize(self):
+        self._check()
+
+    # Zone du popup F4 : barre de défilement de la liste, grille en mode f4_grid
+    @property
+    def verticalScrollbar(self):
+        self._check()
+        return SimScrollbar(self._session)
+
+    VerticalScrollbar = verticalScrollbar
+
+    def findAllByName(self, name, type_name):
+        self._check()
+        grids = []
+        if self.Id == F4_AREA and self._backend.f4_grid and name == "shell":
+            grids.append(SimF4Grid(self._session, SIM_F4_GRID, self._screen))
+        return SimCollection(self._backend, grids)
+
+    FindAllByName = findAllByName
+
+class SimScrollbar:
+    """Barre de défilement vertical de la liste du popup F4 : Position va de 0 à Maximum par pas de PageSize."""
+    def __init__(self, session):
+        self._session = session
+        self._backend = session._backend
+
+    @property
+    def Maximum(self):
+        self._backend.call()
+        return max(len(self._session.popup or ()) - self._backend.f4_page_size, 0)
+
+    @property
+    def PageSize(self):
+        self._backend.call()
+        return self._backend.f4_page_size
+
+    @property
+    def Position(self):
+        self._backend.call()
+        return self._session.popup_top
+
+    @Position.setter
+    def Position(self, value):
+        maximum = self.Maximum
+        self._backend.roundtrip(self._session)
+        self._session.popup_top = min(max(int(value), 0), maximum)
+
+class SimF4Grid(SimControl):
+    """Grille ALV du popup F4 : une colonne VALUE ; seules les lignes de la page affichée sont chargées."""
+    @property
+    def RowCount(self):
+        self._check()
+        return len(self._session.popup)
+
+    @property
+    def VisibleRowCount(self):
+        self._check()
+        return self._backend.f4_page_size
+
+    @property
+    def ColumnOrder(self):
+        self._check()
+        return SimCollection(self._backend, ["VALUE"])
+
+    @property
+    def firstVisibleRow(self):
+        self._check()
+        return self._session.popup_top
+
+    @firstVisibleRow.setter
+    def firstVisibleRow(self, value):
+        self._check()
+        self._backend.roundtrip(self._session)
+        self._session.popup_top = min(max(int(value), 0), max(len(self._session.popup) - 1, 0))
+
+    FirstVisibleRow = firstVisibleRow
+
+    def getCellValue(self, row, column):
+        self._check()
+        top = self._session.popup_top
+        if column != "VALUE" or not top <= row < min(top + self._backend.f4_page_size, len(self._session.popup)):
+            raise SimulatedComError(f"Cellule non chargée : {row}, {column}")
+        return self._session.popup[row]
+
+    GetCellValue = getCellValue
+
+BACKENDS = {
+    "com": ComBackend,
+    "simulator": SimulatorBackend,
+}
+_backend = None
+
+def create_backend(name, options=None):
+    """Instancie le backend 'name' ("com" ou "simulator") avec ses options (dict de chaînes ou de valeurs)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend SAP inconnu : '{name}' (disponibles : {', '.join(BACKENDS)})")
+    if name != "simulator":
+        return BACKENDS[name]()
+    options = dict(options or {})
+    kwargs = {}
+    for key in ("call_latency", "roundtrip_latency", "error_rate", "com_error_rate", "saplogon_delay"):
+        if key in options:
+            kwargs[key] = float(options[key])
+    if options.get("saplogon_exit_code") not in (None, ""):
+        kwargs["saplogon_exit_code"] = int(options["saplogon_exit_code"])
+    if "saplogon_running" in options:
+        kwargs["saplogon_running"] = str(options["saplogon_running"]).strip().lower() in ("1", "true", "yes", "on")
+    if "seed" in options:
+        kwargs["seed"] = int(options["seed"])
+    if options.get("quantity_field"):
+        kwargs["quantity_field"] = options["quantity_field"]
+    if "f4_page_size" in options:
+        kwargs["f4_page_size"] = int(options["f4_page_size"])
+    if "f4_grid" in options:
+        kwargs["f4_grid"] = str(options["f4_grid"]).strip().lower() in ("1", "true", "yes", "on")
+    return SimulatorBackend(**kwargs)
+
+def load_backend(name=None):
+    """
+    Crée le backend 'name', ou celui de [SAP] backend dans config.ini (COM par défaut).
+    Les options du simulateur sont lues dans la section [Simulator].
+    """
+    config = get_config()
+    return create_backend(name or config.get("SAP", "backend", fallback="com"), config.section("Simulator"))
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+def get_backend():
+    """Backend courant, créé depuis config.ini au premier appel."""
+    global _backend
+    if _backend is None:
+        _backend = load_backend()
+    return _backend
+
+def sap_errors():
+    """Exceptions d'un traitement SAP interrompu (erreur COM du backend, délai dépassé, écran inattendu)."""
+    return (RuntimeError, TimeoutError, get_backend().com_error)
+
+#
+# ---- INSTRUMENTATION DES APPELS SAP ----
+#
+class SapTracer:
+    """
+    Enregistre la durée de chaque appel de scripting (findById, lecture/écriture de Text, sendVKey...)
+    et de chaque création d'HU dans un tampon circulaire en mémoire, avec des statistiques par opération.
+    Export au format Chrome trace (chrome://tracing, Perfetto) ou JSON brut.
+    """
+    def __init__(self, capacity=100000):
+        self.enabled = False
+        self.events = collections.deque(maxlen=capacity)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self._stats = {}
+
+    def record(self, op, target, start, duration, result=None):
+        event = (op, target, start, duration, threading.get_ident(), result)
+        with self._lock:
+            self.events.append(event)
+            stats = self._stats.get((op, target))
+            if stats is None:
+                self._stats[(op, target)] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+
+    def slowest(self, limit=10):
+        """Renvoie les 'limit' opérations au temps cumulé le plus élevé : [(op, cible, nombre, moyenne, max)]."""
+        with self._lock:
+            rows = [(op, target, count, total / count, worst) for (op, target), (count, total, worst) in self._stats.items()]
+        rows.sort(key=lambda row: row[2] * row[3], reverse=True)
+        return rows[:limit]
+
+    def throughput(self, window=60.0):
+        """Nombre d'HU créées par minute sur les 'window' dernières secondes."""
+        since = time.perf_counter() - window
+        with self._lock:
+            created = sum(1 for op, _, start, _, _, result in self.events
+                          if op == "HU" and start >= since and result and is_hu_created(result))
+        return created * 60.0 / window
+
+    def export_chrome_trace(self, path):
+        with self._lock:
+            events = list(self.events)
+        trace = []
+        for op, target, start, duration, thread_id, result in events:
+            args = {"target": target}
+            if result is not None:
+                args["result"] = result
+            trace.append({
+                "name": op,
+                "cat": "sap",
+                "ph": "X",
+                "ts": round((start - self._origin) * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": thread_id,
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def export_json(self, path):
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "events": [
+                    {"op": op, "target": target, "start_s": round(start - self._origin, 6),
+                     "duration_ms": round(duration * 1000, 3), "thread": thread_id, "result": result}
+                    for op, target, start, duration, thread_id, result in events
+                ],
+                "stats": [
+                    {"op": op, "target": target, "count": count, "mean_ms": round(mean * 1000, 3), "max_ms": round(worst * 1000, 3)}
+                    for op, target, count, mean, worst in self.slowest(limit=None)
+                ],
+            }, f, indent=2, ensure_ascii=False)
+
+TRACER = SapTracer()
+
+# Valeurs renvoyées telles quelles par les objets tracés (tout le reste est un objet COM à envelopper)
+TRACE_PLAIN_TYPES = (str, int, float, bool, bytes, type(None))
+
+class TracedObject:
+    """Enveloppe d'un objet de scripting SAP qui chronomètre chaque accès et chaque appel."""
+    def __init__(self, inner, label, tracer):
+        object.__setattr__(self, "_inner", inner)
+        object.__setattr__(self, "_label", label)
+        object.__setattr__(self, "_tracer", tracer)
+
+    def _wrap(self, value, label):
+        if isinstance(value, TRACE_PLAIN_TYPES):
+            return value
+        return TracedObject(value, label, self._tracer)
+
+    def __getattr__(self, name):
+        start = time.perf_counter()
+        value = getattr(self._inner, name)
+        if isinstance(value, (types.MethodType, types.BuiltinMethodType)):
+            return self._traced_method(name, value)
+        duration = time.perf_counter() - start
+        # Le texte de la barre de statut est conservé avec l'événement
+        result = value if name.lower() == "text" and self._label.endswith("sbar") else None
+        self._tracer.record(f"get {name}", self._label, start, duration, result)
+        return self._wrap(value, f"{self._label}.{name}")
+
+    def _traced_method(self, name, method):
+        def call(*args):
+            start = time.perf_counter()
+            try:
+                value = method(*args)
+            finally:
+                target = args[0] if args and name.lower() == "findbyid" else self._label
+                self._tracer.record(f"{name}({args[0]})" if name.lower() == "sendvkey" and args else name,
+                                    target, start, time.perf_counter() - start)
+            label = args[0] if name.lower() == "findbyid" and args else f"{self._label}.{name}"
+            return self._wrap(value, label)
+        return call
+
+    def __setattr__(self, name, value):
+        start = time.perf_counter()
+        try:
+            setattr(self._inner, name, value)
+        finally:
+            self._tracer.record(f"set {name}", self._label, start, time.perf_counter() - start)
+
+    def __call__(self, *args):
+        # Collections COM : connection.Children(i)
+        start = time.perf_counter()
+        try:
+            value = self._inner(*args)
+        finally:
+            self._tracer.record("item", self._label, start, time.perf_counter() - start)
+        return self._wrap(value, f"{self._label}({', '.join(map(str, args))})")
+
+class TracingBackend(SapBackend):
+    """Backend qui enveloppe un autre backend pour tracer tous les objets de scripting qu'il renvoie."""
+    name = "tracing"
+
+    def __init__(self, inner, tracer=TRACER):
+        self.inner = inner
+        self.tracer = tracer
+
+    @property
+    def com_error(self):
+        return self.inner.com_error
+
+    @property
+    def status_messages(self):
+        return self.inner.status_messages
+
+    def init_thread(self):
+        self.inner.init_thread()
+
+    def release_thread(self):
+        self.inner.release_thread()
+
+    def get_gui_object(self):
+        start = time.perf_counter()
+        try:
+            gui = self.inner.get_gui_object()
+        finally:
+            self.tracer.record("GetObject", "SAPGUI", start, time.perf_counter() - start)
+        return TracedObject(gui, "SAPGUI", self.tracer)
+
+    def start_saplogon(self, saplogon_path):
+        return self.inner.start_saplogon(saplogon_path)
+
+    def is_saplogon_running(self, saplogon_path):
+        return self.inner.is_saplogon_running(saplogon_path)
+
+def set_tracing(enabled):
+    """
+    Active ou désactive la trace des appels SAP. Hors trace, le backend n'est pas enveloppé
+    et le seul surcoût est un test de TRACER.enabled par HU. Les poignées déjà mises
+    en cache par les SapConnectionManager doivent être oubliées (reset()) après le changement.
+    """
+    backend = get_backend()
+    if enabled and not isinstance(backend, TracingBackend):
+        set_backend(TracingBackend(backend))
+    elif not enabled and isinstance(backend, TracingBackend):
+        set_backend(backend.inner)
+    TRACER.enabled = enabled
+
+#
+# ---- ATTENTES PILOTÉES PAR L'ÉTAT DE LA SESSION ----
+#
+# Temps cumulé passé en pause dans wait_until (toutes threads confondues), pour les benchmarks
+WAIT_STATS = {"sleep_time": 0.0, "sleeps": 0}
+_wait_stats_lock = threading.Lock()
+
+class RoundtripEstimate:
+    """
+    Durée estimée d'un aller-retour serveur d'une session (moyenne mobile exponentielle),
+    tenue à jour par wait_session_idle. Une par session et par thread qui la pilote
+    (voir ControlCache.roundtrip) : elle n'est ni partagée ni protégée par un verrou.
     """
-    SapGuiAuto = None
-    start_time = time.time()
+    def __init__(self):
+        self.value = 0.0
+
+    def observe(self, duration):
+        self.value += ROUNDTRIP_EWMA_ALPHA * (duration - self.value)
+
+    def shorten(self):
+        """La session était déjà libre au premier sondage : l'aller-retour a duré moins que prévu."""
+        self.value *= ROUNDTRIP_SHORTEN
+
+def wait_until(predicate, timeout=WAIT_TIMEOUT, description="la condition",
+               poll_min=WAIT_POLL_MIN, poll_max=WAIT_POLL_MAX, first_delay=0.0):
+    """
+    Évalue 'predicate' jusqu'à ce qu'il renvoie une valeur vraie et la retourne.
+    Après un premier échec, la première pause dure 'first_delay' (au moins poll_min) ;
+    l'intervalle de sondage double ensuite à chaque essai (de poll_min à poll_max).
+    Une erreur COM pendant l'évaluation (session occupée, contrôle absent) compte comme un échec.
+    Lève TimeoutError si la condition n'est pas remplie après 'timeout' secondes.
+    """
+    deadline = time.monotonic() + timeout
+    delay = max(first_delay, poll_min)
+    # Après une première pause plus longue, le sondage reprend à poll_min
+    restart = first_delay > poll_min
     while True:
         try:
-            SapGuiAuto = win32com.client.GetObject("SAPGUI")
-            break
-        except pythoncom.com_error:
-            time.sleep(1)
-            if (time.time() - start_time) > timeout:
-                return None
-    return SapGuiAuto
+            result = predicate()
+        except get_backend().com_error:
+            result = None
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Timeout : {description} non atteint(e) après {timeout} secondes.")
+        pause = min(delay, remaining)
+        time.sleep(pause)
+        with _wait_stats_lock:
+            WAIT_STATS["sleep_time"] += pause
+            WAIT_STATS["sleeps"] += 1
+        if restart:
+            delay, restart = poll_min, False
+        else:
+            delay = min(delay * 2, poll_max)
+
+def wait_session_idle(session, timeout=WAIT_TIMEOUT, roundtrip=None):
+    """
+    Attend que la session ne soit plus occupée (session.Busy à False).
+    Avec 'roundtrip' (RoundtripEstimate de la session), une session occupée est d'abord laissée
+    ROUNDTRIP_FIRST_WAIT fois la durée habituelle d'un aller-retour, puis sondée de près :
+    l'attente suit la latence du serveur au lieu de la dépasser d'un intervalle de sondage qui double.
+    La durée n'est mesurée que si la session était encore occupée au premier sondage ; sinon
+    l'aller-retour a été plus court que prévu et l'estimation est réduite (ROUNDTRIP_SHORTEN),
+    pour qu'une attente exceptionnelle ne ralentisse pas les suivantes.
+    """
+    first_delay = ROUNDTRIP_FIRST_WAIT * roundtrip.value if roundtrip else 0.0
+    start = time.monotonic()
+    checks = []
+
+    def idle():
+        checks.append(None)
+        return not session.Busy
+
+    wait_until(idle, timeout, "la fin du traitement de la session", first_delay=first_delay)
+    if roundtrip is None or len(checks) == 1:
+        # Session déjà libre : rien à mesurer
+        return
+    if first_delay and len(checks) == 2:
+        roundtrip.shorten()
+    else:
+        roundtrip.observe(time.monotonic() - start)
+
+def wait_for_control(session, control_id, timeout=WAIT_TIMEOUT):
+    """Attend que le contrôle 'control_id' soit présent dans une session libre, puis le renvoie."""
+    return wait_until(
+        lambda: not session.Busy and session.findById(control_id, False),
+        timeout,
+        f"l'apparition du contrôle '{control_id}'"
+    )
+
+def get_sap_gui_object(timeout=SAPLOGON_TIMEOUT, process=None, saplogon_path=None):
+    """
+    Tente de récupérer l'objet SAPGUI (ScriptingEngine) pendant 'timeout' secondes,
+    avec un sondage rapide au début puis espacé (50 ms à 500 ms).
+    Si 'process' (SAP Logon lancé par nous) s'arrête avant l'enregistrement sans qu'un autre
+    SAP Logon tourne, lève RuntimeError sans attendre la fin du délai.
+    Retourne l'objet si disponible, sinon None après expiration.
+    """
+    backend = get_backend()
+    watched = [process]
+
+    def registered():
+        if watched[0] is not None and watched[0].poll() is not None:
+            # SAP Logon est mono-instance : un second lancement rend la main à celui qui tourne déjà
+            if saplogon_path and backend.is_saplogon_running(saplogon_path):
+                watched[0] = None
+            else:
+                raise RuntimeError(f"SAP Logon s'est arrêté avant d'être disponible (code de sortie {watched[0].poll()}).")
+        return backend.get_gui_object()
+
+    try:
+        return wait_until(registered, timeout, "l'enregistrement de SAPGUI", poll_min=0.05, poll_max=0.5)
+    except TimeoutError:
+        return None
+
+def discover_sap_gui(saplogon_path, timeout=SAPLOGON_TIMEOUT):
+    """
+    Renvoie l'objet SAPGUI dès qu'il est enregistré :
+    - déjà enregistré : retour immédiat ;
+    - SAP Logon présent dans la table des processus mais pas encore enregistré : on attend, sans le relancer ;
+    - sinon SAP Logon est lancé et son processus est surveillé (arrêt prématuré => RuntimeError immédiate).
+    Lève FileNotFoundError si saplogon.exe est introuvable et TimeoutError après 'timeout' secondes.
+    """
+    backend = get_backend()
+    try:
+        return backend.get_gui_object()
+    except backend.com_error:
+        pass
+
+    process = None
+    if not backend.is_saplogon_running(saplogon_path):
+        try:
+            process = backend.start_saplogon(saplogon_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Impossible de trouver saplogon.exe : {saplogon_path}")
+
+    sap_gui = get_sap_gui_object(timeout, process, saplogon_path)
+    if not sap_gui:
+        raise TimeoutError(f"Timeout : SAP GUI ne s'est pas lancé dans les {timeout} secondes.")
+    return sap_gui
 
 def find_or_open_connection(saplogon_path, sap_env):
     """
     Lance SAP Logon si nécessaire, récupère la connexion SSO vers 'sap_env'.
     Renvoie (connection, application) ou lève une exception en cas d'erreur.
     """
+    SapGuiAuto = discover_sap_gui(saplogon_path, get_config().get_float("SAP", "saplogon_timeout", fallback=SAPLOGON_TIMEOUT))
+
+    application = SapGuiAuto.GetScriptingEngine
+    if not application:
+        raise RuntimeError("Impossible d'obtenir la ScriptingEngine de SAPGUI.")
+
+    connection = lookup_connection(application, sap_env)
+    if not connection:
+        try:
+            connection = application.OpenConnection(sap_env, True)
+        except Exception as e:
+            raise RuntimeError(f"Impossible d'ouvrir la connexion '{sap_env}' : {e}")
+
+    return connection, application
+
+def lookup_connection(application, sap_env):
+    """Renvoie la connexion déjà ouverte vers 'sap_env' (nom ou description), ou None."""
+    for i in range(application.Children.Count):
+        conn = application.Children(i)
+        conn_name = getattr(conn, "Name", "")
+        conn_desc = getattr(conn, "Description", "")
+        if sap_env in conn_name or sap_env in conn_desc:
+            return conn
+    return None
+
+def find_connection(sap_env):
+    """
+    Comme find_or_open_connection, sans rien lancer : renvoie (connection, application) si SAP GUI
+    est enregistré et a déjà une connexion vers 'sap_env', lève RuntimeError sinon.
+    Sert aux rafraîchissements en arrière-plan, qui ne doivent pas relancer SAP fermé par l'utilisateur.
+    """
+    backend = get_backend()
     try:
-        SapGuiAuto = win32com.client.GetObject("SAPGUI")
-    except pythoncom.com_error:
-        SapGuiAuto = None
+        application = backend.get_gui_object().GetScriptingEngine
+    except backend.com_error:
+        raise RuntimeError("SAP GUI n'est pas lancé.")
+    connection = lookup_connection(application, sap_env) if application else None
+    if not connection:
+        raise RuntimeError(f"Aucune connexion ouverte vers '{sap_env}'.")
+    return connection, application
+
+#
+# ---- POOL DE CONNEXIONS / SESSIONS ----
+#
+class SapConnectionManager:
+    """
+    Connexion SAP partagée par toute l'application.
+    Met en cache la ScriptingEngine, la connexion vers 'sap_env' et les sessions déjà
+    résolues. Les objets COM n'étant valides que dans l'appartement qui les a obtenus,
+    le cache est tenu séparément pour chaque thread.
+    Une poignée périmée (SAP fermé, session fermée) est détectée et résolue à nouveau.
+    """
+    def __init__(self, saplogon_path, sap_env):
+        self.saplogon_path = saplogon_path
+        self.sap_env = sap_env
+        self._generation = 0
+        self._local = threading.local()
+
+    def configure(self, saplogon_path, sap_env):
+        """Change le chemin saplogon / l'environnement ; les caches de toutes les threads sont invalidés."""
+        if (saplogon_path, sap_env) != (self.saplogon_path, self.sap_env):
+            self.saplogon_path = saplogon_path
+            self.sap_env = sap_env
+            self._generation += 1
+
+    def invalidate(self):
+        """Oublie les poignées mises en cache par la thread courante."""
+        self._local.generation = None
+
+    def reset(self):
+        """Oublie les poignées mises en cache par toutes les threads (ex. après un changement de backend)."""
+        self._generation += 1
+
+    def _cache(self):
+        cache = self._local
+        if getattr(cache, "generation", None) != self._generation:
+            cache.generation = self._generation
+            cache.connection = None
+            cache.application = None
+            cache.sessions = {}
+        return cache
+
+    def get_connection(self, open_missing=True):
+        """
+        Renvoie (connection, application), en ne refaisant la recherche que si le cache est périmé.
+        Avec 'open_missing' faux, SAP Logon n'est pas lancé ni la connexion ouverte (find_connection).
+        """
+        cache = self._cache()
+        if cache.connection is not None:
+            try:
+                cache.connection.Children.Count
+                return cache.connection, cache.application
+            except get_backend().com_error:
+                cache.connection = None
+                cache.sessions = {}
+        if open_missing:
+            cache.connection, cache.application = find_or_open_connection(self.saplogon_path, self.sap_env)
+        else:
+            cache.connection, cache.application = find_connection(self.sap_env)
+        return cache.connection, cache.application
+
+    def get_session(self, session_id):
+        """Renvoie la session d'Id 'session_id' (ex. "/app/con[0]/ses[1]") depuis le cache si elle est encore vivante."""
+        cache = self._cache()
+        session = cache.sessions.get(session_id)
+        if session is not None:
+            try:
+                session.Busy
+                return session
+            except get_backend().com_error:
+                del cache.sessions[session_id]
+        _, application = self.get_connection()
+        session = application.findById(session_id)
+        cache.sessions[session_id] = session
+        return session
+
+    def close_session(self, session_id):
+        """Ferme la session 'session_id' et l'oublie du cache de la thread courante."""
+        connection, _ = self.get_connection()
+        self._cache().sessions.pop(session_id, None)
+        connection.CloseSession(session_id)
+
+class SapEnvironments:
+    """
+    Un SapConnectionManager par profil d'environnement, créé à la première demande :
+    chaque environnement a sa propre connexion et ses sessions en cache, et peut être
+    piloté en même temps que les autres depuis des threads différentes.
+    """
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, name=None):
+        name = name or DEFAULT_ENV_PROFILE
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = self._pools[name] = SapConnectionManager(*load_env_profile(name))
+        return pool
+
+    def reset(self):
+        """Oublie les poignées mises en cache pour tous les environnements."""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.reset()
+
+def open_new_session(connection, transaction_code=""):
+    """
+    Ouvre une nouvelle session avec /o <transaction> depuis la PREMIÈRE session existante.
+    Renvoie la nouvelle session une fois sa fenêtre principale disponible
+    et la première session de nouveau libre.
+    """
+    nb_sessions = connection.Children.Count
+    if nb_sessions == 0:
+        raise RuntimeError("Aucune session existante pour effectuer l'ouverture /o.")
+    if nb_sessions >= MAX_SAP_SESSIONS:
+        raise RuntimeError(f"Nombre maximal de sessions SAP atteint ({MAX_SAP_SESSIONS}).")
+    session = connection.Children(0)
+    wait_session_idle(session)
+    if transaction_code.startswith("/n"):
+        transaction_code = "/o" + transaction_code[2:]
+    elif not transaction_code.startswith("/o"):
+        transaction_code = "/o" + transaction_code.lstrip("/")
+    session.findById("wnd[0]/tbar[0]/okcd").text = transaction_code
+    session.findById("wnd[0]").sendVKey(0)
+    try:
+        nb_after = wait_until(
+            lambda: connection.Children.Count > nb_sessions and connection.Children.Count,
+            description="l'ouverture de la nouvelle session"
+        )
+    except TimeoutError:
+        raise RuntimeError("La nouvelle session n'a pas été créée malgré /o.")
+    new_sess = connection.Children(nb_after - 1)
+    wait_for_control(new_sess, "wnd[0]")
+    wait_session_idle(session)
+    return new_sess
+
+def launch_sap_transaction(sap_pool, transaction_code, session_choice, sessions_map):
+    """
+    Lance la transaction dans la session choisie.
+    - session_choice = "Nouvelle session" => on utilise /o <transaction> dans la PREMIÈRE session existante.
+    - Sinon, on lance dans la session spécifiée par sessions_map.
+    """
+    connection, _ = sap_pool.get_connection()
+    nb_sessions = connection.Children.Count
+
+    if session_choice == "Nouvelle session":
+        new_sess = open_new_session(connection, transaction_code)
+        new_sess.findById("wnd[0]").maximize()
+    else:
+        if session_choice not in sessions_map:
+            raise ValueError(f"La session '{session_choice}' n'existe pas.")
+        idx = sessions_map[session_choice]
+        if idx < 0 or idx >= nb_sessions:
+            raise IndexError(f"La session d'index {idx} n'existe pas (il y a {nb_sessions} session(s)).")
+        session = connection.Children(idx)
+        if not transaction_code.startswith("/"):
+            transaction_code = "/n" + transaction_code
+        wait_session_idle(session)
+        session.findById("wnd[0]").maximize()
+        session.findById("wnd[0]/tbar[0]/okcd").text = transaction_code
+        session.findById("wnd[0]").sendVKey(0)
+        wait_session_idle(session)
+
+def list_sessions(connection):
+    """
+    Renvoie [(index, Id de session, titre de la fenêtre principale)] pour chaque session de la connexion.
+    Les titres sont relus à chaque appel : ils changent aussi au sein d'une transaction (écran suivant).
+    """
+    sessions = []
+    for i in range(connection.Children.Count):
+        sess = connection.Children(i)
+        try:
+            wnd_title = sess.findById("wnd[0]").Text
+        except:
+            wnd_title = "(Sans titre)"
+        sessions.append((i, sess.Id, wnd_title))
+    return sessions
+
+def session_choices(sessions):
+    """Renvoie (libellés, sessions_map) pour une liste de list_sessions(), "Nouvelle session" en dernier."""
+    sessions_display = []
+    sessions_map = {}
+    for i, _, wnd_title in sessions:
+        display_name = f"Session {i} - {wnd_title}"
+        sessions_display.append(display_name)
+        sessions_map[display_name] = i
+    sessions_display.append("Nouvelle session")
+    return sessions_display, sessions_map
+
+#
+# ---- MESSAGES DE LA BARRE DE STATUT ----
+#
+# Résultat d'une validation, déduit du message de la barre de statut
+STATUS_SUCCESS = "success"
+STATUS_RETRY = "retry"          # erreur passagère (objet verrouillé...) : nouvelle tentative
+STATUS_DUPLICATE = "duplicate"  # HU déjà existante
+STATUS_FATAL = "fatal"
+
+# (classe de message, numéro) -> résultat ; complété par la section [StatusMessages] de config.ini
+# sous la forme "classe numéro = résultat" (ex. "/scwm/hu_wm 012 = duplicate")
+STATUS_MESSAGES = {
+    ("MC", "601"): STATUS_RETRY,            # objet verrouillé par un autre utilisateur
+    ("/SCWM/HU_WM", "012"): STATUS_DUPLICATE,  # HU déjà existante
+}
+# Messages du simulateur (SimulatorBackend.status_messages), reconnus seulement sur ce backend
+SIM_STATUS_MESSAGES = {
+    ("SIMPACK", "001"): STATUS_SUCCESS,
+    ("SIMPACK", "002"): STATUS_DUPLICATE,
+    ("SIMPACK", "005"): STATUS_SUCCESS,
+}
+# Repli sur le texte (anglais) pour un message sans type, ou d'erreur absent de la table
+STATUS_TEXT_PATTERNS = (
+    ("was constructed", STATUS_SUCCESS),
+    ("were constructed", STATUS_SUCCESS),
+    ("already exists", STATUS_DUPLICATE),
+    ("locked", STATUS_RETRY),
+)
+# Table construite par get_status_table : (messages du backend, table)
+_status_table = None
+
+def status_key(msg_id, number):
+    number = str(number).strip()
+    return msg_id.strip().upper(), number.zfill(3) if number.isdigit() else number
+
+def get_status_table():
+    """
+    Table (classe, numéro) -> résultat : STATUS_MESSAGES, complétée par les messages propres
+    au backend courant (status_messages) puis par [StatusMessages], qui reste prioritaire.
+    Construite une fois, et de nouveau seulement si le backend apporte d'autres messages.
+    """
+    global _status_table
+    messages = get_backend().status_messages
+    if _status_table is None or _status_table[0] is not messages:
+        table = {status_key(*key): outcome for key, outcome in STATUS_MESSAGES.items()}
+        table.update((status_key(*key), outcome) for key, outcome in messages.items())
+        outcomes = (STATUS_SUCCESS, STATUS_RETRY, STATUS_DUPLICATE, STATUS_FATAL)
+        for key, outcome in get_config().section("StatusMessages").items():
+            msg_id, _, number = key.strip().rpartition(" ")
+            if msg_id and outcome.strip().lower() in outcomes:
+                table[status_key(msg_id, number)] = outcome.strip().lower()
+        _status_table = (messages, table)
+    return _status_table[1]
+
+def classify_status(text, msg_type="", msg_id="", number=""):
+    """
+    Résultat d'un message de la barre de statut. La classe et le numéro du message sont cherchés
+    dans la table ; à défaut, un message de type S est un succès, et pour les autres types
+    on se rabat sur le texte avant de conclure à une erreur définitive.
+    Sans type de message, seul le texte compte (un statut vide est retenté).
+    """
+    if msg_type:
+        outcome = get_status_table().get(status_key(msg_id, number))
+        if outcome:
+            return outcome
+        if msg_type == "S":
+            return STATUS_SUCCESS
+    elif not text:
+        return STATUS_RETRY
+    for pattern, outcome in STATUS_TEXT_PATTERNS:
+        if pattern in text:
+            return outcome
+    return STATUS_FATAL
+
+class SapStatus(str):
+    """
+    Texte de la barre de statut, accompagné du type, de la classe et du numéro du message
+    et du résultat déduit (outcome). Reste une chaîne pour les logs, le journal et les rapports.
+    """
+    def __new__(cls, text, msg_type="", msg_id="", number="", outcome=None):
+        status = super().__new__(cls, text)
+        status.type = msg_type
+        status.msg_id = msg_id
+        status.number = number
+        status.outcome = outcome or classify_status(text, msg_type, msg_id, number)
+        return status
+
+def read_status(sbar, text=None):
+    """
+    Lit la barre de statut 'sbar' et renvoie un SapStatus ('text' évite de relire le texte).
+    La classe et le numéro sont lus pour tous les types : [StatusMessages] peut reclasser un message S.
+    """
+    if text is None:
+        text = sbar.Text
+    try:
+        return SapStatus(text, sbar.MessageType, sbar.MessageId, sbar.MessageNumber)
+    except (AttributeError, get_backend().com_error):
+        return SapStatus(text)
+
+def status_outcome(status):
+    """Résultat d'un statut : SapStatus, ou simple texte (journal, anciennes entrées)."""
+    return status.outcome if isinstance(status, SapStatus) else classify_status(status)
+
+def is_hu_created(status):
+    """Indique si le message de la barre de statut correspond à une HU (ou des HU, en masse) créée(s)."""
+    return status_outcome(status) == STATUS_SUCCESS
+
+#
+# ---- CRÉATION DES HU (/scwm/pack) ----
+#
+class ControlCache:
+    """
+    Cache des références de contrôles d'une session, par id (ou nom logique de 'screen_map').
+    Chaque findById est un appel COM inter-processus : on ne le fait qu'une fois par écran.
+    sync() relit le programme et le numéro de dynpro et vide le cache s'ils ont changé ;
+    on l'appelle après chaque navigation (ouverture de l'écran, retour F2, erreur).
+    """
+    def __init__(self, session, screen_map=None):
+        self.session = session
+        self.screen_map = screen_map or {}
+        self._controls = {}
+        self._screen = None
+        # Compteurs : appels findById effectués / évités
+        self.lookups = 0
+        self.hits = 0
+        # Durée des allers-retours de cette session, pour wait_idle
+        self.roundtrip = RoundtripEstimate()
+
+    def wait_idle(self, timeout=WAIT_TIMEOUT):
+        """Attend la fin du traitement de la session (wait_session_idle), en suivant sa latence."""
+        wait_session_idle(self.session, timeout, self.roundtrip)
+
+    def sync(self):
+        info = self.session.Info
+        screen = (info.Program, info.ScreenNumber)
+        if screen != self._screen:
+            self._controls.clear()
+            self._screen = screen
+
+    def invalidate(self):
+        self._controls.clear()
+        self._screen = None
+
+    def find(self, name):
+        control_id = self.screen_map.get(name, name)
+        control = self._controls.get(control_id)
+        if control is None:
+            control = self.session.findById(control_id)
+            self._controls[control_id] = control
+            self.lookups += 1
+        else:
+            self.hits += 1
+        return control
+
+    def set_text(self, name, value):
+        """Renseigne un champ ; une référence périmée est résolue à nouveau une fois."""
+        try:
+            self.find(name).Text = value
+        except get_backend().com_error:
+            self.invalidate()
+            self.find(name).Text = value
+
+    def send_vkey(self, key):
+        try:
+            self.find("wnd[0]").sendVKey(key)
+        except get_backend().com_error:
+            self.invalidate()
+            self.find("wnd[0]").sendVKey(key)
+
+    def status(self):
+        try:
+            return read_status(self.find("wnd[0]/sbar"))
+        except get_backend().com_error:
+            self.invalidate()
+            return read_status(self.find("wnd[0]/sbar"))
+
+def open_pack_screen(session, wc, sb):
+    """
+    Lance /n/scwm/pack dans la session, renseigne le poste de travail et l'emplacement
+    puis valide l'écran de sélection. Lève RuntimeError si un champ n'est pas accessible.
+    Renvoie le ControlCache de la session, positionné sur l'onglet scanner.
+    """
+    controls = ControlCache(session, PACK_SCREEN)
+    wait_session_idle(session)
+    session.findById(PACK_SCREEN["okcode"]).text = "/n/scwm/pack"
+    session.findById(PACK_SCREEN["window"]).sendVKey(0)
+    wait_for_control(session, PACK_SCREEN["work_center"])
+    controls.sync()
+
+    try:
+        controls.set_text("work_center", wc)
+    except Exception as e:
+        raise RuntimeError(f"Erreur lors du remplissage des champs wc: {e}")
+    try:
+        controls.set_text("storage_bin", sb)
+    except Exception as e:
+        raise RuntimeError(f"Erreur lors du remplissage des champs sb: {e}")
+    try:
+        controls.send_vkey(8)
+        wait_for_control(session, PACK_SCREEN["dest_hu"])
+    except Exception as e:
+        raise RuntimeError(f"Erreur lors du click: {e}")
+    controls.sync()
+    return controls
+
+def create_one_hu(controls, hu, hu_type, sb, quantity_field=None, quantity=1):
+    """
+    Crée une HU depuis l'onglet scanner de /scwm/pack et renvoie la barre de statut (SapStatus).
+    'controls' est le ControlCache renvoyé par open_pack_screen.
+    En cas d'échec, on revient en arrière (F2) pour libérer l'écran, sauf pour une HU déjà existante :
+    seul le numéro est refusé et il sera remplacé par le suivant.
+    La barre de statut est lue une seule fois, quand la session est libre : deux HU de suite
+    peuvent donner le même message, il ne sert à rien d'attendre qu'il change.
+    Le type d'emballage et l'emplacement sont réécrits à chaque HU : que l'onglet scanner
+    les garde après F8 n'a pas pu être vérifié sur EWM.
+    Avec 'quantity_field', 'quantity' HU sans numéro sont créées en une seule validation.
+    """
+    traced = TRACER.enabled
+    start = time.perf_counter() if traced else 0
+    if quantity_field:
+        controls.set_text(quantity_field, str(quantity))
+    controls.set_text("dest_hu", hu)
+    controls.set_text("pack_material", hu_type)
+    controls.set_text("dest_bin", sb)
+    controls.send_vkey(8)
+    controls.wait_idle()
+    status = controls.status()
+    if status.outcome not in (STATUS_SUCCESS, STATUS_DUPLICATE):
+        controls.send_vkey(2)
+        controls.wait_idle()
+        controls.sync()
+    if traced:
+        target = hu or ("(sans numéro)" if quantity == 1 else f"(sans numéro) x{quantity}")
+        TRACER.record("HU", target, start, time.perf_counter() - start, status)
+    return status
+
+def hu_creator(on_timing=None):
+    """
+    Renvoie create_one_hu, chronométrée si 'on_timing' est fourni :
+    on_timing(durée en secondes) est rappelé après chaque appel, dans la thread de la session.
+    """
+    if on_timing is None:
+        return create_one_hu
+
+    def timed_create_one_hu(*args):
+        start = time.perf_counter()
+        try:
+            return create_one_hu(*args)
+        finally:
+            on_timing(time.perf_counter() - start)
+    return timed_create_one_hu
+
+def iter_hu_tokens(lines):
+    """Générateur : découpe des lignes de texte en numéros de HU (séparés par virgules ou retours à la ligne)."""
+    for line in lines:
+        for token in line.split(","):
+            token = token.strip()
+            if token:
+                yield token
+
+def has_bulk_field(controls, quantity_field):
+    """Indique si l'écran courant propose le champ de quantité 'quantity_field' (création en masse)."""
+    return bool(quantity_field) and controls.session.findById(quantity_field, False) is not None
+
+def probe_bulk_mode(session, hu_iter, wc, sb, quantity_field):
+    """
+    Indique si create_hu_batch créera les HU de 'hu_iter' en masse : la première HU n'a pas de numéro
+    et l'écran scanner ouvert dans 'session' propose 'quantity_field'. Renvoie (en masse, hu_iter, controls),
+    'hu_iter' reprenant à sa première HU et 'controls' étant le ControlCache de l'écran scanner ouvert
+    pour le vérifier (None s'il ne l'a pas été), à passer à create_hu_batch qui ne le rouvre pas.
+    À appeler avant open_worker_sessions : la création en masse n'utilise que la première session,
+    les autres resteraient ouvertes pour rien.
+    """
+    hu_iter = iter(hu_iter)
+    first = next(hu_iter, None)
+    if first is None:
+        return False, hu_iter, None
+    hu_iter = itertools.chain([first], hu_iter)
+    if not quantity_field or first:
+        return False, hu_iter, None
+    controls = open_pack_screen(session, wc, sb)
+    return has_bulk_field(controls, quantity_field), hu_iter, controls
+
+def create_hu_bulk(controls, hu_iter, hu_type, sb, quantity_field, bulk_size=HU_BULK_SIZE, job=None, on_timing=None):
+    """
+    Générateur : crée les HU de 'hu_iter' par paquets de 'bulk_size' et renvoie les (hu, status) dans l'ordre.
+    Un paquet de HU sans numéro est créé en une seule validation grâce au champ 'quantity_field' ;
+    un paquet contenant des HU numérotées est traité HU par HU. 'on_timing' : voir hu_creator.
+    """
+    create = hu_creator(on_timing)
+    hu_iter = iter(hu_iter)
+    hu_errors = (TimeoutError, get_backend().com_error)
+    while True:
+        if job:
+            job.check_cancelled()
+        chunk = list(itertools.islice(hu_iter, bulk_size))
+        if not chunk:
+            return
+        if any(chunk):
+            for hu in chunk:
+                try:
+                    status = create(controls, hu, hu_type, sb)
+                except hu_errors as e:
+                    status = hu_error_status(controls, e)
+                yield hu, status
+            continue
+        try:
+            status = create(controls, "", hu_type, sb, quantity_field, len(chunk))
+        except hu_errors as e:
+            status = hu_error_status(controls, e)
+        for hu in chunk:
+            yield hu, status
+
+def hu_error_status(controls, e):
+    """
+    Statut à renvoyer pour une HU dont la création a levé 'e' (délai dépassé, erreur COM) :
+    l'HU est à retenter (STATUS_RETRY) et les poignées de 'controls' sont résolues à nouveau.
+    """
+    controls.invalidate()
+    try:
+        controls.sync()
+    except (TimeoutError, get_backend().com_error):
+        pass
+    return SapStatus(f"Erreur : {e}", outcome=STATUS_RETRY)
+
+def open_worker_sessions(sap_pool, session, nb_parallel):
+    """
+    Renvoie les Ids des sessions de travail : 'session' (une fois libre) + des sessions ouvertes avec /o,
+    sans dépasser 'nb_parallel' ni la limite SAP de sessions par connexion.
+    Les sessions ouvertes ici (toutes sauf la première) sont à refermer avec close_worker_sessions ;
+    si une ouverture échoue, celles déjà ouvertes sont refermées avant de propager l'erreur.
+    """
+    connection, _ = sap_pool.get_connection()
+    wait_session_idle(session)
+    session_ids = [session.Id]
+    try:
+        while len(session_ids) < min(nb_parallel, MAX_SAP_SESSIONS) and connection.Children.Count < MAX_SAP_SESSIONS:
+            session_ids.append(open_new_session(connection).Id)
+    except BaseException:
+        close_worker_sessions(sap_pool, session_ids)
+        raise
+    return session_ids
+
+def close_worker_sessions(sap_pool, session_ids, keep_first=True):
+    """
+    Referme les sessions ouvertes par open_worker_sessions ; celles déjà fermées sont ignorées.
+    La première (celle de l'utilisateur) est gardée, sauf si 'keep_first' est faux.
+    """
+    for session_id in session_ids[1 if keep_first else 0:]:
+        try:
+            sap_pool.close_session(session_id)
+        except (RuntimeError, get_backend().com_error):
+            pass
+
+def create_hu_parallel(sap_pool, session_ids, hu_iter, hu_type, wc, sb, job=None, errors=None, on_timing=None):
+    """
+    Générateur : répartit les HU de 'hu_iter' entre plusieurs sessions SAP (une thread par session)
+    et renvoie les (hu, status) dans l'ordre d'entrée, au fil de l'eau.
+    Chaque thread ouvre son propre appartement COM, retrouve sa session par son Id
+    et son propre écran /scwm/pack, puis prend les HU dans une file commune.
+    'hu_iter' n'est lu qu'au rythme du traitement (quelques HU d'avance par session).
+    Si 'job' est fourni, l'alimentation s'arrête dès que la tâche est annulée.
+    Les messages des sessions qui se sont arrêtées sont ajoutés à 'errors'.
+    'on_timing' : voir hu_creator.
+    """
+    create = hu_creator(on_timing)
+    pending = queue.Queue()
+    done = queue.Queue()
+    if errors is None:
+        errors = []
+
+    def worker(session_id):
+        backend = get_backend()
+        hu_errors = (TimeoutError, backend.com_error)
+        initialized = False
+        try:
+            backend.init_thread()
+            initialized = True
+            session = sap_pool.get_session(session_id)
+            controls = open_pack_screen(session, wc, sb)
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                i, hu = item
+                try:
+                    status = create(controls, hu, hu_type, sb)
+                except hu_errors as e:
+                    # Erreur propre à cette HU : elle est à retenter, la session continue
+                    status = hu_error_status(controls, e)
+                except Exception as e:
+                    done.put((i, hu, SapStatus(f"Erreur : {e}", outcome=STATUS_RETRY)))
+                    raise
+                done.put((i, hu, status))
+        except Exception as e:
+            errors.append(f"{session_id} : {e}")
+        finally:
+            # Signale la fin de la thread au générateur
+            done.put(None)
+            if initialized:
+                backend.release_thread()
+
+    for sid in session_ids:
+        threading.Thread(target=worker, args=(sid,), daemon=True).start()
+
+    source = enumerate(hu_iter)
+    exhausted = False
+    running = len(session_ids)
+    capacity = 2 * len(session_ids)
+    nb_in = nb_done = next_out = 0
+    ready = {}
+    while True:
+        # Alimente la file avec quelques HU d'avance par session
+        while not exhausted and running and nb_in - nb_done < capacity:
+            item = None if job and job.cancelled else next(source, None)
+            if item is None:
+                exhausted = True
+                for _ in session_ids:
+                    pending.put(None)
+                break
+            pending.put(item)
+            nb_in += 1
+        if exhausted and nb_done == nb_in:
+            break
+
+        message = done.get()
+        if message is None:
+            running -= 1
+            if running == 0:
+                # Plus aucune session : les HU restantes ne seront pas traitées
+                while True:
+                    try:
+                        item = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        i, hu = item
+                        ready[i] = (hu, SapStatus("Non traitée (aucune session disponible)", outcome=STATUS_RETRY))
+                        nb_done += 1
+                if not exhausted:
+                    exhausted = True
+                    for i, hu in source:
+                        ready[i] = (hu, SapStatus("Non traitée (aucune session disponible)", outcome=STATUS_RETRY))
+                        nb_in += 1
+                        nb_done += 1
+        else:
+            i, hu, status = message
+            ready[i] = (hu, status)
+            nb_done += 1
+
+        while next_out in ready:
+            yield ready.pop(next_out)
+            next_out += 1
+
+    while next_out in ready:
+        yield ready.pop(next_out)
+        next_out += 1
+
+def create_hu_batch(sap_pool, session_ids, hu_iter, hu_type, wc, sb, job=None, errors=None,
+                    quantity_field=None, bulk_size=HU_BULK_SIZE, on_timing=None, controls=None):
+    """
+    Générateur : crée les HU de 'hu_iter' et renvoie les (hu, status) dans l'ordre d'entrée.
+    Un lot de HU sans numéro (la première HU n'a pas de numéro) est créé en masse dans la première
+    session (create_hu_bulk) si 'quantity_field' est présent sur l'écran scanner ; les autres sessions
+    ne servent pas (voir probe_bulk_mode pour ne pas les ouvrir). Sinon, avec une seule
+    session, le traitement se fait dans la thread appelante, et avec plusieurs il est réparti par
+    create_hu_parallel.
+    'on_timing(durée)' est rappelé après chaque création (voir hu_creator).
+    'controls' : écran scanner déjà ouvert dans la première session (probe_bulk_mode), réutilisé
+    par la création en masse ou dans une seule session.
+    Lève JobCancelled si 'job' est annulé.
+    """
+    hu_iter = iter(hu_iter)
+    first = next(hu_iter, None)
+    if first is None:
+        return
+    hu_iter = itertools.chain([first], hu_iter)
+    if quantity_field and not first:
+        if controls is None:
+            controls = open_pack_screen(sap_pool.get_session(session_ids[0]), wc, sb)
+        if has_bulk_field(controls, quantity_field):
+            yield from create_hu_bulk(controls, hu_iter, hu_type, sb, quantity_field, bulk_size, job, on_timing)
+            return
+
+    if len(session_ids) > 1:
+        yield from create_hu_parallel(sap_pool, session_ids, hu_iter, hu_type, wc, sb, job, errors, on_timing)
+        if job:
+            job.check_cancelled()
+        return
+
+    if controls is None:
+        controls = open_pack_screen(sap_pool.get_session(session_ids[0]), wc, sb)
+    create = hu_creator(on_timing)
+    hu_errors = (TimeoutError, get_backend().com_error)
+    for hu in hu_iter:
+        if job:
+            job.check_cancelled()
+        try:
+            status = create(controls, hu, hu_type, sb)
+        except hu_errors as e:
+            status = hu_error_status(controls, e)
+        yield hu, status
+
+#
+# ---- VALEURS DE L'ÉCRAN D'EMBALLAGE (chargées depuis SAP, cache local) ----
+#
+def read_f4_grid(grid):
+    """Lit la première colonne d'une aide F4 en grille ALV ; renvoie (valeurs triées sans doublon, complète)."""
+    column = grid.ColumnOrder(0)
+    row_count = grid.RowCount
+    page = max(grid.VisibleRowCount, 1)
+    values = set()
+    for row in range(min(row_count, F4_MAX_ROWS)):
+        # La grille ne charge que les lignes affichées : on la fait défiler page par page
+        if row % page == 0:
+            grid.firstVisibleRow = row
+        value = grid.GetCellValue(row, column).strip()
+        if value:
+            values.add(value)
+    return sorted(values), row_count <= F4_MAX_ROWS
+
+def read_f4_list(session, column):
+    """
+    Lit la colonne 'column' d'une aide F4 en liste : seules les lignes affichées existent,
+    la liste est donc parcourue page par page (verticalScrollbar).
+    Renvoie (valeurs triées sans doublon, complète).
+    """
+    values = set()
+    while True:
+        for row in range(F4_FIRST_ROW, F4_FIRST_ROW + F4_MAX_ROWS):
+            label = session.findById(F4_LIST_LABEL.format(column=column, row=row), False)
+            if label is None:
+                break
+            value = label.Text.strip()
+            if value:
+                values.add(value)
+        scrollbar = session.findById(F4_AREA).verticalScrollbar
+        position = scrollbar.Position
+        if position >= scrollbar.Maximum:
+            return sorted(values), bool(values)
+        if len(values) >= F4_MAX_ROWS:
+            return sorted(values), False
+        scrollbar.Position = position + max(scrollbar.PageSize, 1)
+        wait_session_idle(session)
+        if session.findById(F4_AREA).verticalScrollbar.Position <= position:
+            # La liste ne défile plus : on ne sait pas si tout a été lu
+            return sorted(values), False
+
+def read_f4_values(session, field_id, column=F4_VALUE_COLUMN):
+    """
+    Ouvre l'aide F4 du champ 'field_id', lit toutes ses valeurs (grille ALV, ou colonne 'column'
+    d'une liste) puis referme le popup. Renvoie (valeurs triées sans doublon, complète) :
+    'complète' est faux quand la liste n'a pas pu être lue jusqu'au bout, ou est vide.
+    """
+    session.findById(field_id).setFocus()
+    session.findById(PACK_SCREEN["window"]).sendVKey(4)
+    popup = wait_for_control(session, F4_POPUP)
+    try:
+        grids = session.findById(F4_AREA).findAllByName("shell", "GuiShell")
+        if grids.Count:
+            return read_f4_grid(grids(0))
+        return read_f4_list(session, column)
+    finally:
+        popup.sendVKey(12)
+        wait_session_idle(session)
+
+def fetch_pack_values_f4(session, wc="", sb=""):
+    """
+    Lit par l'aide F4 de /scwm/pack les postes de travail et les emplacements (écran de sélection),
+    puis les matériaux d'emballage (onglet scanner, ouvert avec 'wc' et 'sb' s'ils sont valides,
+    sinon avec les premières valeurs lues).
+    Renvoie {"work_center": [...], "storage_bin": [...], "hu_type": [...], "incomplete": [...]},
+    "incomplete" nommant les listes qui n'ont pas pu être lues en entier.
+    """
+    wait_session_idle(session)
+    session.findById(PACK_SCREEN["okcode"]).text = "/n/scwm/pack"
+    session.findById(PACK_SCREEN["window"]).sendVKey(0)
+    wait_for_control(session, PACK_SCREEN["work_center"])
+    values = {"work_center": [], "storage_bin": [], "hu_type": [], "incomplete": []}
+
+    def read(key, field):
+        values[key], complete = read_f4_values(session, PACK_SCREEN[field])
+        if not complete:
+            values["incomplete"].append(key)
+
+    read("work_center", "work_center")
+    read("storage_bin", "storage_bin")
+    wc = wc if wc in values["work_center"] else next(iter(values["work_center"]), "")
+    sb = sb if sb in values["storage_bin"] else next(iter(values["storage_bin"]), "")
+    if wc and sb:
+        open_pack_screen(session, wc, sb)
+        read("hu_type", "pack_material")
+    else:
+        values["incomplete"].append("hu_type")
+    return values
+
+# Chargeurs de valeurs disponibles ([HU] pack_values_source) : fonction(session, wc, sb) -> dict
+PACK_VALUE_FETCHERS = {
+    "f4": fetch_pack_values_f4,
+}
+
+class PackValuesCache:
+    """
+    Cache local (JSON) des valeurs de l'écran d'emballage lues dans SAP, par environnement.
+    Une entrée plus vieille que 'ttl' secondes est ignorée.
+    """
+    def __init__(self, path=PACK_VALUES_FILE, ttl=PACK_VALUES_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, env):
+        """Renvoie les valeurs de l'environnement 'env', ou None si elles sont absentes ou expirées."""
+        entry = self._read().get(env)
+        if not entry or entry.get("format") != PACK_VALUES_FORMAT or time.time() - entry.get("fetched_at", 0) > self.ttl:
+            return None
+        return entry.get("values")
+
+    def put(self, env, values):
+        data = self._read()
+        data[env] = {"format": PACK_VALUES_FORMAT, "fetched_at": time.time(), "values": values}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".pack_values-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+def load_pack_values(job, sap_pool, source, wc="", sb="", cache=None):
+    """
+    Tâche (SapExecutor) : lit les valeurs de l'écran d'emballage avec le chargeur 'source'
+    (PACK_VALUE_FETCHERS) dans une session ouverte pour l'occasion puis refermée,
+    les enregistre dans 'cache' et les renvoie.
+    Le chargement part de l'ouverture de la fenêtre HU, sans action de l'utilisateur :
+    ses sessions ne doivent pas quitter la transaction qu'il y a ouverte.
+    """
+    if source not in PACK_VALUE_FETCHERS:
+        raise ValueError(f"Chargeur de valeurs inconnu : '{source}' (disponibles : {', '.join(PACK_VALUE_FETCHERS)})")
+    connection, _ = sap_pool.get_connection()
+    session = open_new_session(connection)
+    try:
+        values = PACK_VALUE_FETCHERS[source](session, wc, sb)
+    finally:
+        sap_pool.close_session(session.Id)
+    if cache is not None:
+        cache.put(sap_pool.sap_env, values)
+    return values
+
+def check_pack_values(values, **fields):
+    """
+    Compare les champs ('work_center', 'storage_bin', 'hu_type') aux listes lues dans SAP.
+    Renvoie (invalides, douteux) : une valeur absente d'une liste complète est invalide ;
+    absente d'une liste peut-être incomplète (values["incomplete"]), elle est seulement douteuse.
+    Un champ sans liste connue est accepté.
+    """
+    incomplete = set(values.get("incomplete", ()))
+    missing = [key for key, value in fields.items() if values.get(key) and value not in values[key]]
+    return [key for key in missing if key not in incomplete], [key for key in missing if key in incomplete]
+
+# Libellés des champs vérifiés par check_pack_values
+PACK_VALUE_LABELS = {"work_center": "Work Center", "storage_bin": "Storage BIN", "hu_type": "HU Type"}
+
+#
+# ---- JOURNAL DES LOTS DE HU (reprise après incident) ----
+#
+class HUJournal:
+    """
+    Journal local en ajout seul (JSONL) : une ligne par tentative de création d'HU,
+    avec ses paramètres, le texte de la barre de statut et le résultat.
+    Chaque ligne est écrite dès le résultat connu, ce qui permet de reprendre
+    un lot interrompu sans refaire les HU déjà créées.
+    """
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    @staticmethod
+    def key(index, hu):
+        # Les HU sans numéro (PAC0012) sont repérées par leur position dans le lot
+        return hu if hu else f"#{index}"
+
+    def record(self, batch, index, hu, hu_type, wc, sb, status, created, attempt):
+        entry = {
+            "batch": batch,
+            "index": index,
+            "hu": hu,
+            "hu_type": hu_type,
+            "work_center": wc,
+            "storage_bin": sb,
+            "status": status,
+            "outcome": status_outcome(status),
+            "created": created,
+            "attempt": attempt,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def entries(self, batch=None):
+        """Générateur : relit les entrées du journal (d'un lot donné si 'batch' est précisé)."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    continue
+                if batch is None or entry.get("batch") == batch:
+                    yield entry
+
+    def completed(self, batch):
+        """Renvoie les clés des HU déjà créées dans le lot 'batch'."""
+        return {self.key(e["index"], e["hu"]) for e in self.entries(batch) if e.get("created")}
+
+    def last_batch(self, prefix=""):
+        last = None
+        for entry in self.entries():
+            if entry.get("batch", "").startswith(prefix):
+                last = entry["batch"]
+        return last
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class HUIndex:
+    """
+    Index local des HU déjà créées, ou signalées existantes par SAP, tous lots confondus :
+    un fichier texte trié (une HU par ligne), chargé une fois en mémoire sous forme d'ensemble.
+    Les HU sans numéro (PAC0012) n'y figurent pas.
+    """
+    def __init__(self, path=HU_INDEX_FILE):
+        self.path = path
+        self._hus = None
+        self._added = False
+
+    @staticmethod
+    def key(hu):
+        """Forme normalisée d'un numéro de HU : majuscules, sans les zéros de tête d'un numéro purement numérique."""
+        hu = hu.strip().upper()
+        return (hu.lstrip("0") or "0") if hu.isdigit() else hu
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def load(self):
+        if self._hus is None:
+            self._hus = self._read()
+        return self._hus
+
+    def __contains__(self, hu):
+        return self.key(hu) in self.load()
+
+    def __len__(self):
+        return len(self.load())
+
+    def add(self, hu):
+        if hu:
+            self.load().add(self.key(hu))
+            self._added = True
+
+    def save(self):
+        """
+        Écrit l'index trié (fichier temporaire + renommage atomique), fusionné avec le fichier
+        actuel pour garder les HU ajoutées entre-temps par un autre processus.
+        """
+        if not self._added:
+            return
+        hus = self._read() | self.load()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".hu_index-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(hu + "\n" for hu in sorted(hus))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._hus = hus
+        self._added = False
+
+def filter_hu_input(hu_iter, pattern=None, index=None, rejected=None):
+    """
+    Générateur : ne laisse passer, en une seule passe sur la saisie, que les HU à envoyer à SAP :
+    numéro conforme à 'pattern' (expression régulière compilée), absent des lignes précédentes
+    et de l'index local 'index'. Les HU écartées sont ajoutées à 'rejected' en tuples (hu, raison) ;
+    les HU sans numéro passent toujours.
+    """
+    known = index.load() if index is not None else ()
+    seen = set()
+    for hu in hu_iter:
+        if not hu:
+            yield hu
+            continue
+        key = HUIndex.key(hu)
+        if pattern is not None and not pattern.fullmatch(hu):
+            reason = "format invalide"
+        elif key in seen:
+            reason = "doublon dans la saisie"
+        elif key in known:
+            reason = "déjà créée (index local)"
+        else:
+            seen.add(key)
+            yield hu
+            continue
+        if rejected is not None:
+            rejected.append((hu, reason))
+
+def get_hu_pattern(config):
+    """Expression régulière [HU] hu_pattern compilée (None si vide) ; lève ValueError si elle est invalide."""
+    pattern = config.get("HU", "hu_pattern", fallback="")
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"[HU] hu_pattern invalide ({pattern}) : {e}")
+
+# Résultat d'une HU remonté par run_hu_creation à la fenêtre (job.progress)
+HUProgress = collections.namedtuple("HUProgress", "index hu status created attempt")
+
+def new_batch_id(prefix):
+    return f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+def run_journaled_batch(sap_pool, session_ids, hu_iter, hu_type, wc, sb, journal, batch,
+                        resume=False, max_retries=HU_MAX_RETRIES, retry_backoff=HU_RETRY_BACKOFF,
+                        job=None, errors=None, quantity_field=None, bulk_size=HU_BULK_SIZE, controls=None):
+    """
+    Générateur : crée les HU de 'hu_iter' en inscrivant chaque résultat dans 'journal' sous le lot 'batch'
+    et renvoie des tuples (index, hu, status, created, attempt). 'controls' : voir create_hu_batch.
+    Avec 'resume', les HU déjà créées dans ce lot sont ignorées. Les HU en échec passager
+    (STATUS_RETRY : objet verrouillé, session arrêtée) sont retentées jusqu'à 'max_retries' fois,
+    après un délai doublé à chaque tentative ; les erreurs définitives ne sont pas retentées.
+    """
+    completed = journal.completed(batch) if resume else set()
+    indexes = collections.deque()
+
+    def todo():
+        for index, hu in enumerate(hu_iter):
+            if journal.key(index, hu) not in completed:
+                indexes.append(index)
+                yield hu
+
+    pending = todo()
+    failed = []
+    for attempt in range(max_retries + 1):
+        if attempt:
+            delay = retry_backoff * 2 ** (attempt - 1)
+            if job:
+                job.wait(delay)
+                job.check_cancelled()
+            else:
+                time.sleep(delay)
+            retry_list, failed = failed, []
+            indexes.extend(index for index, _ in retry_list)
+            pending = (hu for _, hu in retry_list)
+        for hu, status in create_hu_batch(sap_pool, session_ids, pending, hu_type, wc, sb, job, errors,
+                                          quantity_field, bulk_size, controls=controls):
+            index = indexes.popleft()
+            created = is_hu_created(status)
+            journal.record(batch, index, hu, hu_type, wc, sb, status, created, attempt)
+            if status_outcome(status) == STATUS_RETRY:
+                failed.append((index, hu))
+            yield index, hu, status, created, attempt
+        if not failed:
+            break
+
+def run_hu_creation(job, sap_pool, session_choice, sessions_map,
+                    hu_list, hu_type, wc, sb, nb_parallel=1, resume=False,
+                    quantity_field=None, bulk_size=HU_BULK_SIZE, hu_index=None, journal_path=JOURNAL_FILE):
+    """
+    Tâche complète de création des HU, exécutée par le SapExecutor.
+    Les messages de log (texte) et le résultat de chaque HU (HUProgress) sont remontés par job.progress();
+    lève JobCancelled si la tâche est annulée.
+    Chaque HU est inscrite au journal 'journal_path' ; avec 'resume', le dernier lot lancé depuis
+    l'interface est repris en ignorant les HU déjà créées.
+    Avec 'quantity_field', les HU sans numéro sont créées en masse si l'écran le permet.
+    Les HU créées ou déjà existantes dans SAP sont ajoutées à 'hu_index', enregistré en fin de tâche.
+    Avec 'session_choice' à None, la tâche ouvre sa propre session et la referme à la fin
+    (environnement autre que celui de la fenêtre, où aucune session n'a été choisie).
+    """
+    # Récupération de la session sélectionnée dans la fenêtre HU
+    connection, _ = sap_pool.get_connection()
+    nb_sessions = connection.Children.Count
+    if session_choice is None:
+        try:
+            session = open_new_session(connection)
+        except RuntimeError as e:
+            job.progress(str(e))
+            return
+    elif session_choice == "Nouvelle session":
+        if nb_sessions == 0:
+            job.progress("Aucune session existante pour effectuer l'ouverture /o.")
+            return
+        session = connection.Children(0)
+    else:
+        if session_choice not in sessions_map:
+            job.progress(f"La session '{session_choice}' n'existe pas.")
+            return
+        idx = sessions_map[session_choice]
+        if idx < 0 or idx >= nb_sessions:
+            job.progress(f"La session d'index {idx} n'existe pas.")
+            return
+        session = connection.Children(idx)
+
+    journal = HUJournal(journal_path)
+    batch = journal.last_batch("GUI") if resume else None
+    if batch:
+        job.progress(f"Reprise du lot {batch} : les HU déjà créées sont ignorées.")
+    else:
+        batch = new_batch_id("GUI")
+
+    session_ids = [session.Id]
+    errors = []
+    try:
+        bulk, hu_list, controls = probe_bulk_mode(session, hu_list, wc, sb, quantity_field)
+        if bulk:
+            job.progress("Création en masse dans une seule session.")
+            nb_parallel = 1
+        session_ids = open_worker_sessions(sap_pool, session, nb_parallel)
+        if len(session_ids) > 1:
+            job.progress(f"Création répartie sur {len(session_ids)} session(s)...")
+        for index, hu, status, created, attempt in run_journaled_batch(
+            sap_pool, session_ids, hu_list, hu_type, wc, sb, journal, batch,
+            resume=resume, job=job, errors=errors,
+            quantity_field=quantity_field, bulk_size=bulk_size, controls=controls
+        ):
+            if hu_index is not None and status_outcome(status) in (STATUS_SUCCESS, STATUS_DUPLICATE):
+                hu_index.add(hu)
+            job.progress(HUProgress(index, hu, status, created, attempt))
+    except sap_errors() as e:
+        job.progress(str(e))
+    finally:
+        journal.close()
+        if hu_index is not None:
+            hu_index.save()
+        close_worker_sessions(sap_pool, session_ids, keep_first=session_choice is not None)
+    for error in errors:
+        job.progress(f"Session arrêtée {error}")
+
+#
+# ---- MACROS DE TRANSACTIONS (déclaration, compilation, rejeu) ----
+#
+# Une macro est une transaction, des étapes jouées une fois à l'ouverture (setup)
+# et des étapes jouées pour chaque ligne (steps), enregistrées dans MACRO_FILE :
+#   {"sbup": {"transaction": "/n/scwm/sbup",
+#             "fields": {"hu": "wnd[0]/usr/ctxtP_HUIDENT"},
+#             "setup": [{"set": "wnd[0]/usr/ctxtP_LGNUM", "value": "1075"}, {"key": 8}],
+#             "steps": [{"set": "hu", "value": "{HU}"}, {"key": 0},
+#                       {"wait": "idle"}, {"assert": ["success"], "on_error": "back"}]}}
+# - set : renseigne un champ (Id, nom de 'fields' ou de PACK_SCREEN) ; {colonne} est remplacé par la ligne CSV,
+#   {{ et }} donnent des accolades littérales
+# - key : touche virtuelle (0 = Entrée, 8 = F8...) ; press : clic sur un bouton
+# - wait : "idle" ou Id d'un contrôle à attendre (timeout facultatif, en secondes)
+# - assert : résultats acceptés du message de statut ; sinon la ligne s'arrête (F2 si on_error = "back")
+MACRO_OPS = ("set", "key", "press", "wait", "assert")
+
+class MacroError(ValueError):
+    """Macro invalide ou introuvable."""
+
+class MacroPlan:
+    """Macro compilée : étapes validées, Ids des contrôles résolus et colonnes CSV utilisées."""
+    def __init__(self, name, transaction, setup, steps, columns):
+        self.name = name
+        self.transaction = transaction
+        self.setup = setup
+        self.steps = steps
+        self.columns = columns
+
+    def check_columns(self, header):
+        missing = sorted(self.columns - set(header))
+        if missing:
+            raise MacroError(f"Macro '{self.name}' : colonne(s) absente(s) du fichier : {', '.join(missing)}")
+
+def compile_macro(name, definition):
+    """Valide la macro 'definition' (dict de MACRO_FILE) et renvoie son MacroPlan ; lève MacroError."""
+    fields = definition.get("fields", {})
+    setup, setup_columns = compile_macro_steps(name, "setup", definition.get("setup", []), fields)
+    if setup_columns:
+        raise MacroError(f"Macro '{name}' : les étapes 'setup' ne peuvent pas utiliser de colonne ({', '.join(sorted(setup_columns))}).")
+    steps, columns = compile_macro_steps(name, "steps", definition.get("steps", []), fields)
+    if not steps:
+        raise MacroError(f"Macro '{name}' : aucune étape.")
+    return MacroPlan(name, definition.get("transaction", ""), setup, steps, columns)
+
+def compile_macro_steps(name, part, definition_steps, fields):
+    """Compile la liste d'étapes 'part' d'une macro ; renvoie (étapes compilées, colonnes utilisées)."""
+    formatter = string.Formatter()
+    steps = []
+    columns = set()
+
+    def control(value):
+        return fields.get(value, PACK_SCREEN.get(value, value))
+
+    for number, step in enumerate(definition_steps, 1):
+        where = f"Macro '{name}', {part}, étape {number}"
+        ops = [op for op in MACRO_OPS if op in step] if isinstance(step, dict) else []
+        if len(ops) != 1:
+            raise MacroError(f"{where} : une seule action parmi {', '.join(MACRO_OPS)} est attendue.")
+        op = ops[0]
+        if op == "set":
+            if "value" not in step:
+                raise MacroError(f"{where} : 'value' manquant.")
+            value = str(step["value"])
+            try:
+                names = [field for _, field, _, _ in formatter.parse(value) if field is not None]
+            except ValueError as e:
+                raise MacroError(f"{where} : valeur invalide ({e}).")
+            if "" in names:
+                raise MacroError(f"{where} : '{{}}' doit nommer une colonne.")
+            columns.update(names)
+            # Sans colonne, la valeur est fixe : ses accolades doublées ({{, }}) sont résolues ici
+            steps.append(("set", control(step["set"]), value if names else value.format_map({}), bool(names)))
+        elif op == "key":
+            try:
+                key = int(step["key"])
+            except (TypeError, ValueError):
+                raise MacroError(f"{where} : touche invalide '{step['key']}'.")
+            if not 0 <= key <= 99:
+                raise MacroError(f"{where} : touche invalide '{key}'.")
+            steps.append(("key", key))
+        elif op == "press":
+            steps.append(("press", control(step["press"])))
+        elif op == "wait":
+            target = step["wait"]
+            steps.append(("wait", target if target == "idle" else control(target),
+                          float(step.get("timeout", WAIT_TIMEOUT))))
+        else:
+            outcomes = step["assert"]
+            outcomes = [outcomes] if isinstance(outcomes, str) else outcomes
+            unknown = set(outcomes) - {STATUS_SUCCESS, STATUS_RETRY, STATUS_DUPLICATE, STATUS_FATAL}
+            if unknown or not outcomes:
+                raise MacroError(f"{where} : résultat(s) inconnu(s) : {', '.join(sorted(unknown)) or '(aucun)'}.")
+            on_error = step.get("on_error", "stop")
+            if on_error not in ("stop", "back"):
+                raise MacroError(f"{where} : on_error doit valoir 'stop' ou 'back'.")
+            steps.append(("assert", frozenset(outcomes), on_error))
+    return steps, columns
+
+def load_macros(path=MACRO_FILE):
+    """Renvoie les définitions de macros de 'path' ({nom: définition}), vide si le fichier n'existe pas."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_macro(name, path=MACRO_FILE):
+    """Charge et compile la macro 'name' ; lève MacroError si elle est absente ou invalide."""
+    macros = load_macros(path)
+    if name not in macros:
+        raise MacroError(f"Macro '{name}' introuvable dans {path} (disponibles : {', '.join(sorted(macros)) or 'aucune'}).")
+    return compile_macro(name, macros[name])
+
+def save_macro(name, definition, path=MACRO_FILE):
+    """Valide puis enregistre la macro 'name' dans 'path' (fichier temporaire + renommage atomique)."""
+    compile_macro(name, definition)
+    macros = load_macros(path)
+    macros[name] = definition
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".macros-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(macros, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+# Lignes utiles d'un script enregistré par SAP GUI (Personnaliser la présentation locale > Enregistrement de script)
+VBS_SET_TEXT = re.compile(r'session\.findById\("([^"]+)"\)\.text\s*=\s*"((?:[^"]|"")*)"', re.IGNORECASE)
+VBS_SEND_VKEY = re.compile(r'session\.findById\("([^"]+)"\)\.sendVKey\s+(\d+)', re.IGNORECASE)
+VBS_PRESS = re.compile(r'session\.findById\("([^"]+)"\)\.press\b', re.IGNORECASE)
+# Toute autre action sur un contrôle ; seules celles sans effet sur la saisie sont ignorées
+VBS_ACTION = re.compile(r'session\.findById\("[^"]+"\)\.(\w+)', re.IGNORECASE)
+VBS_IGNORED_ACTIONS = ("caretposition", "setfocus", "maximize", "resizeworkingpane")
+
+def import_vbs_macro(lines):
+    """
+    Convertit un script VBS enregistré par SAP GUI en définition de macro.
+    Seules les saisies de texte, touches et clics sont gardées ; la position du curseur, le focus
+    et la taille de la fenêtre sont ignorés. Toute autre action (sélection, double-clic...) ne peut
+    pas être rejouée : MacroError est levée avec les lignes concernées.
+    Une transaction saisie dans le champ de commande puis validée devient la transaction de la macro.
+    Les valeurs enregistrées sont littérales : leurs accolades sont doublées pour ne pas devenir des colonnes.
+    """
+    steps = []
+    unsupported = []
+    for number, line in enumerate(lines, 1):
+        match = VBS_SET_TEXT.search(line)
+        if match:
+            value = match.group(2).replace('""', '"').replace("{", "{{").replace("}", "}}")
+            steps.append({"set": match.group(1), "value": value})
+            continue
+        match = VBS_SEND_VKEY.search(line)
+        if match:
+            steps.append({"key": int(match.group(2))})
+            continue
+        match = VBS_PRESS.search(line)
+        if match:
+            steps.append({"press": match.group(1)})
+            continue
+        match = VBS_ACTION.search(line)
+        if match and match.group(1).lower() not in VBS_IGNORED_ACTIONS:
+            unsupported.append(f"ligne {number} : {line.strip()}")
+    if unsupported:
+        raise MacroError("Actions non prises en charge dans le script VBS :\n" + "\n".join(unsupported))
+    transaction = ""
+    if len(steps) >= 2 and steps[0].get("set") == PACK_SCREEN["okcode"] and steps[1].get("key") == 0:
+        transaction = steps[0]["value"].replace("{{", "{").replace("}}", "}")
+        steps = steps[2:]
+    return {"transaction": transaction, "steps": steps}
+
+def run_macro(session, plan, rows, job=None):
+    """
+    Générateur : lance la transaction de 'plan' dans 'session' puis rejoue ses étapes pour chaque
+    ligne de 'rows' (dicts colonne -> valeur). Renvoie des tuples (index, ligne, SapStatus).
+    Les références de contrôles sont gardées par un ControlCache d'une ligne à l'autre.
+    Lève RuntimeError si la transaction ou les étapes 'setup' échouent.
+    """
+    controls = ControlCache(session, PACK_SCREEN)
+    start_macro(controls, plan)
+    for index, row in enumerate(rows):
+        if job:
+            job.check_cancelled()
+        try:
+            status = run_macro_steps(controls, plan.steps, row)
+        except (TimeoutError, get_backend().com_error) as e:
+            controls.invalidate()
+            status = SapStatus(f"Erreur : {e}", outcome=STATUS_FATAL)
+        yield index, row, status
+
+def start_macro(controls, plan):
+    """Lance la transaction de 'plan' et joue ses étapes 'setup' ; lève RuntimeError en cas d'échec."""
+    try:
+        controls.wait_idle()
+        if plan.transaction:
+            controls.set_text("okcode", plan.transaction)
+            controls.send_vkey(0)
+            controls.wait_idle()
+        controls.sync()
+        status = run_macro_steps(controls, plan.setup, {})
+    except (TimeoutError, get_backend().com_error) as e:
+        raise RuntimeError(f"Macro '{plan.name}' : ouverture impossible : {e}")
+    if plan.setup and status.outcome == STATUS_FATAL:
+        raise RuntimeError(f"Macro '{plan.name}' : ouverture impossible : {status}")
+
+def run_macro_steps(controls, steps, row):
+    """Joue des étapes compilées pour la ligne 'row' et renvoie la barre de statut (SapStatus)."""
+    session = controls.session
+    status = None
+    for step in steps:
+        op = step[0]
+        if op == "set":
+            _, control_id, value, templated = step
+            controls.set_text(control_id, value.format_map(row) if templated else value)
+            status = None
+        elif op in ("key", "press"):
+            if op == "key":
+                controls.send_vkey(step[1])
+            else:
+                controls.find(step[1]).press()
+            controls.wait_idle()
+            controls.sync()
+            status = None
+        elif op == "wait":
+            _, target, timeout = step
+            if target == "idle":
+                controls.wait_idle(timeout)
+            else:
+                wait_for_control(session, target, timeout)
+                controls.sync()
+            status = None
+        else:
+            _, outcomes, on_error = step
+            status = controls.status()
+            if status.outcome not in outcomes:
+                if on_error == "back":
+                    controls.send_vkey(2)
+                    controls.wait_idle()
+                    controls.sync()
+                return status
+    return status if status is not None else controls.status()
+
+#
+# ---- PLANIFICATEUR DE TÂCHES MULTI-TRANSACTIONS ----
+#
+# Lissage de la latence observée par session (moyenne mobile exponentielle)
+SCHEDULER_EWMA_ALPHA = 0.3
+
+def job_key(row):
+    """Transaction (et macro) que la tâche 'row' doit trouver ouverte dans sa session."""
+    return row.get("macro", "").strip(), normalize_transaction(row.get("transaction", ""))
+
+def normalize_transaction(transaction_code):
+    transaction_code = transaction_code.strip()
+    if transaction_code and not transaction_code.startswith("/"):
+        transaction_code = "/n" + transaction_code
+    return transaction_code
+
+class SessionLane:
+    """
+    File de travail d'une session pour le planificateur : tâches affectées et non terminées,
+    latence observée (EWMA) et dernière transaction affectée.
+    Elle n'est modifiée que par le générateur run_schedule ; seule 'pending' est partagée avec la thread.
+    """
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.pending = queue.Queue()
+        self.in_flight = 0
+        self.latency = None
+        self.last_key = None
+        self.done = 0
+        self.busy_time = 0.0
+        self.alive = True
+
+    def cost(self, key, default_latency):
+        """Temps estimé avant la fin d'une nouvelle tâche 'key' sur cette session."""
+        latency = self.latency if self.latency is not None else default_latency
+        # Changer de transaction coûte environ une tâche de plus
+        switch = latency if key != self.last_key else 0.0
+        return (self.in_flight + 1) * latency + switch
+
+    def observe(self, duration):
+        self.done += 1
+        self.busy_time += duration
+        if self.latency is None:
+            self.latency = duration
+        else:
+            self.latency += SCHEDULER_EWMA_ALPHA * (duration - self.latency)
+
+def run_scheduled_job(controls, row, plans, state):
+    """
+    Exécute la tâche 'row' dans la session de 'controls' et renvoie la barre de statut (SapStatus).
+    Avec une colonne 'macro', la macro est ouverte si elle ne l'est pas déjà ('state') puis rejouée
+    sur la ligne ; sinon la transaction est simplement lancée.
+    """
+    macro, transaction = job_key(row)
+    if macro:
+        plan = plans[macro]
+        if state.get("key") != (macro, transaction):
+            state["key"] = None
+            if transaction and transaction != plan.transaction:
+                plan = MacroPlan(plan.name, transaction, plan.setup, plan.steps, plan.columns)
+            start_macro(controls, plan)
+            state["key"] = (macro, transaction)
+        return run_macro_steps(controls, plan.steps, row)
+    state["key"] = None
+    controls.set_text("okcode", transaction)
+    controls.send_vkey(0)
+    controls.wait_idle()
+    controls.sync()
+    status = controls.status()
+    if not status:
+        # Pas de message : la transaction est ouverte
+        return SapStatus(f"Transaction {transaction} lancée", outcome=STATUS_SUCCESS)
+    return status
+
+def load_job_plans(rows, macros_path=MACRO_FILE):
+    """Compile une fois chaque macro citée par les tâches ; lève MacroError si l'une est absente ou invalide."""
+    macros = load_macros(macros_path)
+    plans = {}
+    for row in rows:
+        name = row.get("macro", "").strip()
+        if name and name not in plans:
+            if name not in macros:
+                raise MacroError(f"Macro '{name}' introuvable dans {macros_path}.")
+            plans[name] = compile_macro(name, macros[name])
+            plans[name].check_columns(row)
+        if not name and not row.get("transaction", "").strip():
+            raise MacroError("Chaque tâche doit avoir une colonne 'transaction' ou 'macro' renseignée.")
+    return plans
+
+def run_schedule(sap_pool, session_ids, rows, plans, job=None, errors=None):
+    """
+    Générateur : répartit les tâches 'rows' (dicts avec 'transaction', 'macro' facultative et paramètres)
+    entre les sessions 'session_ids' (MAX_SAP_SESSIONS au plus), une thread et une file par session.
+    Chaque tâche va à la session dont la fin estimée est la plus proche (tâches en cours x latence
+    observée, plus un changement de transaction) ; les sessions rapides reçoivent donc plus de tâches.
+    Si une session s'arrête, la tâche en cours est rendue à retenter (STATUS_RETRY) et ses tâches
+    en attente sont redistribuées aux sessions restantes.
+    Renvoie des tuples (index, ligne, Id de session, SapStatus, durée) dans l'ordre de fin.
+    """
+    done = queue.Queue()
+    if errors is None:
+        errors = []
+    lanes = [SessionLane(sid) for sid in session_ids[:MAX_SAP_SESSIONS]]
+
+    def worker(lane):
+        backend = get_backend()
+        initialized = False
+        try:
+            backend.init_thread()
+            initialized = True
+            controls = ControlCache(sap_pool.get_session(lane.session_id), PACK_SCREEN)
+            state = {}
+            while True:
+                item = lane.pending.get()
+                if item is None:
+                    return
+                index, row = item
+                start = time.perf_counter()
+                try:
+                    status = run_scheduled_job(controls, row, plans, state)
+                except (TimeoutError, RuntimeError, backend.com_error) as e:
+                    controls.invalidate()
+                    state.clear()
+                    status = SapStatus(f"Erreur : {e}", outcome=STATUS_FATAL)
+                except Exception as e:
+                    # Session arrêtée : on ne sait pas où en est la tâche, elle est rendue à retenter
+                    status = SapStatus(f"Interrompue (session arrêtée) : {e}", outcome=STATUS_RETRY)
+                    done.put((lane, index, row, status, time.perf_counter() - start))
+                    raise
+                done.put((lane, index, row, status, time.perf_counter() - start))
+        except Exception as e:
+            errors.append(f"{lane.session_id} : {e}")
+        finally:
+            done.put((lane, None, None, None, None))
+            if initialized:
+                backend.release_thread()
+
+    for lane in lanes:
+        threading.Thread(target=worker, args=(lane,), daemon=True).start()
+
+    def assign(item):
+        key = job_key(item[1])
+        known = [lane.latency for lane in lanes if lane.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        lane = min((lane for lane in lanes if lane.alive), key=lambda lane: lane.cost(key, default_latency))
+        lane.in_flight += 1
+        lane.last_key = key
+        lane.pending.put(item)
+
+    unassigned = SapStatus("Non traitée (aucune session disponible)", outcome=STATUS_RETRY)
+    source = enumerate(rows)
+    exhausted = False
+    running = len(lanes)
+    capacity = 2 * len(lanes)
+    in_flight = 0
+    try:
+        while True:
+            while not exhausted and running and in_flight < capacity:
+                item = None if job and job.cancelled else next(source, None)
+                if item is None:
+                    exhausted = True
+                    break
+                assign(item)
+                in_flight += 1
+            if exhausted and in_flight == 0:
+                break
+            if running == 0:
+                break
+
+            lane, index, row, status, duration = done.get()
+            if index is None:
+                # Thread arrêtée : ses tâches en attente passent aux sessions restantes
+                lane.alive = False
+                running -= 1
+                orphans = []
+                while True:
+                    try:
+                        orphans.append(lane.pending.get_nowait())
+                    except queue.Empty:
+                        break
+                lane.in_flight -= len(orphans)
+                for item in orphans:
+                    if running:
+                        assign(item)
+                    else:
+                        in_flight -= 1
+                        yield item[0], item[1], None, unassigned, 0.0
+                if running == 0 and not exhausted:
+                    exhausted = True
+                    for index, row in source:
+                        yield index, row, None, unassigned, 0.0
+                continue
+            lane.in_flight -= 1
+            in_flight -= 1
+            lane.observe(duration)
+            yield index, row, lane.session_id, status, duration
+    finally:
+        # Les files ne reçoivent la fin qu'ici : une tâche redistribuée ne passe jamais après elle
+        for lane in lanes:
+            lane.pending.put(None)
+
+    if job:
+        job.check_cancelled()
+
+def schedule_summary(results, wall_time):
+    """Résumé d'un run du planificateur : débit global et, par session, nombre de tâches et latence moyenne."""
+    per_session = {}
+    nb_ok = 0
+    for _, _, session_id, status, duration in results:
+        if status.outcome == STATUS_SUCCESS:
+            nb_ok += 1
+        count, total = per_session.get(session_id, (0, 0.0))
+        per_session[session_id] = (count + 1, total + duration)
+    return {
+        "jobs": len(results),
+        "succeeded": nb_ok,
+        "failed": len(results) - nb_ok,
+        "wall_time_s": round(wall_time, 3),
+        "jobs_per_second": round(len(results) / wall_time, 2) if wall_time else 0.0,
+        "sessions": {
+            str(session_id): {"jobs": count, "mean_ms": round(total / count * 1000, 3)}
+            for session_id, (count, total) in per_session.items()
+        },
+    }
+
+def run_schedule_file(job, sap_pool, path, nb_sessions, macros_path=MACRO_FILE):
+    """
+    Tâche du SapExecutor : exécute le fichier de tâches 'path' sur 'nb_sessions' sessions
+    (la première existante plus des sessions ouvertes avec /o) et renvoie le résumé (schedule_summary).
+    """
+    rows = list(iter_csv_rows(path))
+    if not rows:
+        raise ValueError(f"Aucune tâche dans {path}.")
+    plans = load_job_plans(rows, macros_path)
+    connection, _ = sap_pool.get_connection()
+    if connection.Children.Count == 0:
+        raise RuntimeError("Aucune session SAP ouverte.")
+    session = connection.Children(0)
+    session_ids = [session.Id]
+    errors = []
+    try:
+        session_ids = open_worker_sessions(sap_pool, session, nb_sessions)
+        job.progress(f"{len(rows)} tâche(s) réparties sur {len(session_ids)} session(s)...")
+        start = time.monotonic()
+        results = list(run_schedule(sap_pool, session_ids, rows, plans, job, errors))
+    finally:
+        close_worker_sessions(sap_pool, session_ids)
+    summary = schedule_summary(results, time.monotonic() - start)
+    summary["errors"] = errors
+    return summary
+
+#
+# ---- EXÉCUTION DES TÂCHES SAP EN ARRIÈRE-PLAN ----
+#
+class JobCancelled(Exception):
+    """Levée dans une tâche lorsque son annulation a été demandée."""
+
+class SapJob:
+    """
+    Tâche soumise au SapExecutor. La fonction reçoit la tâche en premier argument
+    pour remonter sa progression (progress) et tester l'annulation (cancelled).
+    """
+    def __init__(self, executor, func, args, kwargs, on_done, on_error, on_progress):
+        self.executor = executor
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled("Tâche annulée.")
+
+    def wait(self, delay):
+        """Attend 'delay' secondes, ou moins si la tâche est annulée entre-temps."""
+        self._cancel_event.wait(delay)
+
+    def progress(self, value):
+        if self.on_progress:
+            self.executor.post(self.on_progress, value)
+
+class SapExecutor:
+    """
+    Thread de travail unique, avec son propre appartement COM, qui exécute les tâches SAP
+    dans l'ordre de soumission. Les callbacks (on_done, on_error, on_progress) sont
+    rappelés dans la thread Tk via after(), jamais depuis la thread de travail.
+    """
+    POLL_MS = 50
+
+    def __init__(self, root):
+        self.root = root
+        self._jobs = queue.Queue()
+        self._callbacks = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sap-executor", daemon=True)
+        self._thread.start()
+        self.root.after(self.POLL_MS, self._dispatch)
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None, **kwargs):
+        """Ajoute une tâche à la file et renvoie le SapJob correspondant (pour l'annuler)."""
+        job = SapJob(self, func, args, kwargs, on_done, on_error, on_progress)
+        self._jobs.put(job)
+        return job
+
+    def post(self, callback, *args):
+        """Programme l'appel de 'callback' dans la thread Tk."""
+        self._callbacks.put((callback, args))
+
+    def shutdown(self):
+        self._jobs.put(None)
+
+    def _run(self):
+        backend = get_backend()
+        try:
+            backend.init_thread()
+            init_error = None
+        except Exception as e:
+            # Backend inutilisable (ex. pywin32 absent) : chaque tâche échouera avec cette erreur
+            init_error = e
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                try:
+                    if init_error:
+                        raise init_error
+                    job.check_cancelled()
+                    result = job.func(job, *job.args, **job.kwargs)
+                except Exception as e:
+                    if job.on_error:
+                        self.post(job.on_error, e)
+                else:
+                    if job.on_done:
+                        self.post(job.on_done, result)
+        finally:
+            if init_error is None:
+                backend.release_thread()
+
+    def _dispatch(self):
+        while True:
+            try:
+                callback, args = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except tk.TclError:
+                # La fenêtre destinataire a été fermée entre-temps
+                pass
+            except Exception:
+                # Une erreur dans un callback ne doit pas arrêter la distribution des suivants
+                self.root.report_callback_exception(*sys.exc_info())
+        self.root.after(self.POLL_MS, self._dispatch)
+
+#
+# ---- INVENTAIRE DES SESSIONS SAP ----
+#
+class SessionInventory:
+    """
+    Liste des sessions SAP partagée par les fenêtres, tenue à jour en arrière-plan.
+    Les abonnés ne sont rappelés que si la liste a changé, ou si SAP devient indisponible ('error').
+    Seul un rafraîchissement demandé avec 'connect' (démarrage, bouton, changement d'environnement)
+    peut lancer SAP Logon et ouvrir la connexion ; le rafraîchissement périodique se contente
+    de la connexion existante, et signale SAP indisponible si l'utilisateur l'a fermé.
+    """
+    def __init__(self, root, executor, sap_pool, interval=5.0):
+        self.root = root
+        self.executor = executor
+        self.sap_pool = sap_pool
+        self.interval_ms = int(interval * 1000)
+        self.sessions = []
+        self.loaded = False
+        self.error = None
+        self._listeners = []
+        self._pending = False
+        self._connect_requested = False
+
+    def subscribe(self, callback):
+        """Abonne 'callback(sessions)' ; il est rappelé tout de suite si la liste est déjà connue."""
+        self._listeners.append(callback)
+        if self.loaded:
+            callback(self.sessions)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def start(self):
+        """Lance le rafraîchissement périodique."""
+        if self.interval_ms > 0:
+            self.root.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        self.refresh()
+        self.root.after(self.interval_ms, self._tick)
 
-    if not SapGuiAuto:
-        try:
-            subprocess.Popen([saplogon_path])
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Impossible de trouver saplogon.exe : {saplogon_path}")
+    def refresh(self, on_error=None, connect=False):
+        """
+        Programme un rafraîchissement ; les demandes faites pendant qu'un autre est en attente sont regroupées.
+        Avec 'connect', SAP Logon est lancé et la connexion ouverte si besoin.
+        """
+        self._connect_requested = self._connect_requested or connect
+        if self._pending:
+            return
+        self._pending = True
+        connect = self._connect_requested
+        self._connect_requested = False
+        self.executor.submit(
+            lambda job: list_sessions(self.sap_pool.get_connection(open_missing=connect)[0]),
+            on_done=self._apply,
+            on_error=lambda e: self._on_error(e, on_error)
+        )
 
-        SapGuiAuto = get_sap_gui_object(timeout=30)
-        if not SapGuiAuto:
-            raise TimeoutError("Timeout : SAP GUI ne s'est pas lancé dans les 30 secondes.")
+    def _apply(self, sessions):
+        self._pending = False
+        recovered = self.error is not None
+        self.error = None
+        self._notify(sessions, force=recovered)
+        if self._connect_requested:
+            self.refresh(connect=True)
 
-    application = SapGuiAuto.GetScriptingEngine
-    if not application:
-        raise RuntimeError("Impossible d'obtenir la ScriptingEngine de SAPGUI.")
+    def _on_error(self, e, on_error):
+        self._pending = False
+        changed = self.error is None or str(e) != str(self.error)
+        self.error = e
+        # Les abonnés ne sont rappelés qu'au changement d'erreur, pas à chaque rafraîchissement périodique
+        self._notify([], force=changed)
+        if on_error:
+            on_error(e)
+        if self._connect_requested:
+            self.refresh(connect=True)
 
-    connection = None
-    for i in range(application.Children.Count):
-        conn = application.Children(i)
-        conn_name = getattr(conn, "Name", "")
-        conn_desc = getattr(conn, "Description", "")
-        if sap_env in conn_name or sap_env in conn_desc:
-            connection = conn
-            break
+    def _notify(self, sessions, force=False):
+        if self.loaded and sessions == self.sessions and not force:
+            return
+        self.sessions = sessions
+        self.loaded = True
+        for callback in list(self._listeners):
+            callback(sessions)
 
-    if not connection:
+#
+# ---- INTERFACE GRAPHIQUE (tkinter) ----
+#
+def get_file_logger(name, path, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """Logger 'name' écrivant dans 'path' (fichiers tournants), configuré au premier appel."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+class BufferedTextLog:
+    """
+    Journal affiché dans un widget Text, rendu par images toutes les 'interval_ms' millisecondes :
+    les lignes reçues entre deux images sont insérées en une seule fois, et le widget ne garde
+    que les 'max_lines' dernières lignes (tampon circulaire). Toutes les lignes, affichées ou non,
+    sont écrites dans 'file_logger' s'il est fourni. 'on_flush' est rappelé à chaque image.
+    """
+    def __init__(self, widget, interval_ms=LOG_FRAME_MS, max_lines=LOG_MAX_LINES, file_logger=None, on_flush=None):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.max_lines = max_lines
+        self.file_logger = file_logger
+        self.on_flush = on_flush
+        self._lines = collections.deque(maxlen=max_lines)
+        self._line_count = 0
+        self._scheduled = False
+
+    def write(self, message, display=True):
+        """Ajoute une ligne au log ; avec display=False, elle ne va que dans le fichier (et déclenche on_flush)."""
+        if self.file_logger:
+            self.file_logger.info(message)
+        if display:
+            self._lines.append(message)
+        if not self._scheduled:
+            self._scheduled = True
+            self.widget.after(self.interval_ms, self.flush)
+
+    def flush(self):
+        self._scheduled = False
         try:
-            connection = application.OpenConnection(sap_env, True)
-        except Exception as e:
-            raise RuntimeError(f"Impossible d'ouvrir la connexion '{sap_env}' : {e}")
+            if self._lines:
+                text = "\n".join(self._lines) + "\n"
+                self._lines.clear()
+                self.widget.insert(tk.END, text)
+                self._line_count += text.count("\n")
+                excess = self._line_count - self.max_lines
+                if excess > 0:
+                    self.widget.delete("1.0", f"{excess + 1}.0")
+                    self._line_count -= excess
+                self.widget.see(tk.END)
+            if self.on_flush:
+                self.on_flush()
+        except tk.TclError:
+            # Fenêtre fermée entre-temps
+            pass
 
-    return connection, application
+    def clear(self):
+        self._lines.clear()
+        self._line_count = 0
+        self.widget.delete("1.0", tk.END)
 
-def launch_sap_transaction(saplogon_path, sap_env, transaction_code, session_choice, sessions_map):
+class EnvironmentContext:
     """
-    Lance la transaction dans la session choisie.
-    - session_choice = "Nouvelle session" => on utilise /o <transaction> dans la PREMIÈRE session existante.
-    - Sinon, on lance dans la session spécifiée par sessions_map.
+    Profil d'environnement ouvert dans l'interface : sa connexion (SapConnectionManager),
+    son propre SapExecutor (thread et appartement COM séparés, pour travailler en même temps
+    que les autres environnements) et son inventaire des sessions.
     """
-    connection, _ = find_or_open_connection(saplogon_path, sap_env)
-    nb_sessions = connection.Children.Count
+    def __init__(self, root, name, sap_pool, refresh_interval):
+        self.name = name
+        self.sap_pool = sap_pool
+        self.executor = SapExecutor(root)
+        self.session_inventory = SessionInventory(root, self.executor, sap_pool, interval=refresh_interval)
+        self._watching = False
 
-    if session_choice == "Nouvelle session":
-        if nb_sessions == 0:
-            raise RuntimeError("Aucune session existante pour effectuer l'ouverture /o.")
-        session = connection.Children(0)
-        if transaction_code.startswith("/n"):
-            transaction_code = "/o" + transaction_code[2:]
-        elif not transaction_code.startswith("/o"):
-            transaction_code = "/o" + transaction_code.lstrip("/")
-        session.findById("wnd[0]/tbar[0]/okcd").text = transaction_code
-        session.findById("wnd[0]").sendVKey(0)
-        time.sleep(2)
-        nb_after = connection.Children.Count
-        if nb_after <= nb_sessions:
-            raise RuntimeError("La nouvelle session n'a pas été créée malgré /o.")
-        new_sess = connection.Children(nb_after - 1)
-        new_sess.findById("wnd[0]").maximize()
-    else:
-        if session_choice not in sessions_map:
-            raise ValueError(f"La session '{session_choice}' n'existe pas.")
-        idx = sessions_map[session_choice]
-        if idx < 0 or idx >= nb_sessions:
-            raise IndexError(f"La session d'index {idx} n'existe pas (il y a {nb_sessions} session(s)).")
-        session = connection.Children(idx)
-        if not transaction_code.startswith("/"):
-            transaction_code = "/n" + transaction_code
-        session.findById("wnd[0]").maximize()
-        session.findById("wnd[0]/tbar[0]/okcd").text = transaction_code
-        session.findById("wnd[0]").sendVKey(0)
+    def watch_sessions(self):
+        """Lance (une seule fois) le rafraîchissement périodique de la liste des sessions."""
+        if not self._watching:
+            self._watching = True
+            self.session_inventory.start()
 
-#
-# ---- INTERFACE GRAPHIQUE (tkinter) ----
-#
 class MainApp(tk.Tk):
-    def __init__(self):
+    """
+    Fenêtre principale. Elle s'affiche sans attendre SAP : la recherche de SAP GUI et de la connexion
+    se fait en arrière-plan (SapExecutor) et son état est affiché dans la barre du bas.
+    Avec 'startup_report', les temps de démarrage sont écrits dans ce fichier (JSON)
+    puis l'application se ferme, pour mesurer le démarrage d'un build.
+    executor, sap_pool et session_inventory sont ceux de l'environnement courant (self.env).
+    """
+    def __init__(self, startup_report=None):
         super().__init__()
+        self.startup_report = startup_report
+        self.startup_times = {}
+        self.mark_startup("tk_ready")
 
         self.title("SAP Auto")
-        self.geometry("800x250")
+        self.geometry("800x320")
 
         # Charger config
         self.saplogon_path, self.sap_env, self.tx_list, self.version_app = load_config()
@@ -168,8 +3295,52 @@ class MainApp(tk.Tk):
         # sessions_map : { "Session 0 - TitreFenetre" : 0, ... }
         self.sessions_map = {}
 
+        # Tous les appels COM passent par la thread de l'executor de l'environnement pour ne pas figer la fenêtre ;
+        # connexion SAP et sessions mises en cache par environnement, partagées avec la fenêtre HU
+        self.environments = SapEnvironments()
+        self.env_contexts = {}
+        self.use_environment(DEFAULT_ENV_PROFILE)
+
         self.create_menu_bar()
         self.create_main_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.quit_application)
+        # Premier passage de la boucle d'événements : la fenêtre est affichée
+        self.after_idle(lambda: self.mark_startup("window_shown"))
+
+    def open_environment(self, name):
+        """Renvoie le contexte du profil 'name', créé à la première demande."""
+        if name not in self.env_contexts:
+            self.env_contexts[name] = EnvironmentContext(
+                self, name, self.environments.get(name),
+                get_config().get_float("App", "session_refresh_interval", fallback=5.0)
+            )
+        return self.env_contexts[name]
+
+    def use_environment(self, name):
+        """Fait du profil 'name' l'environnement de la fenêtre principale et des fenêtres ouvertes ensuite."""
+        self.env = self.open_environment(name)
+        self.executor = self.env.executor
+        self.sap_pool = self.env.sap_pool
+        self.session_inventory = self.env.session_inventory
+
+    def mark_startup(self, step):
+        """Note le temps écoulé (ms) depuis le chargement du module ; écrit le rapport quand tout est mesuré."""
+        if step in self.startup_times:
+            return
+        self.startup_times[step] = round((time.perf_counter() - STARTUP_T0) * 1000, 1)
+        if not self.startup_report or "window_shown" not in self.startup_times:
+            return
+        if "sap_ready" not in self.startup_times and "sap_error" not in self.startup_times:
+            return
+        report = {
+            "version": self.version_app,
+            "frozen": getattr(sys, "frozen", False),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - self.startup_times[step] / 1000)),
+            "times_ms": self.startup_times,
+        }
+        with open(self.startup_report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.quit_application()
 
     def create_menu_bar(self):
         menubar = tk.Menu(self)
@@ -185,6 +3356,12 @@ class MainApp(tk.Tk):
         config_menu.add_command(label="Modifier", command=self.show_config_window)
         menubar.add_cascade(label="Configuration", menu=config_menu)
 
+        # Menu Outils
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="Statistiques SAP", command=self.open_stats_window)
+        tools_menu.add_command(label="Exécuter un fichier de tâches...", command=self.open_schedule_file)
+        menubar.add_cascade(label="Outils", menu=tools_menu)
+
         # Menu Help
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="Aide", command=self.show_help)
@@ -196,7 +3373,39 @@ class MainApp(tk.Tk):
     def open_hu_creation_window(self):
         HUCreationWindow(self)
 
+    def open_stats_window(self):
+        StatsWindow(self)
+
+    def open_schedule_file(self):
+        """Exécute un fichier de tâches (CSV : transaction, macro, paramètres) en arrière-plan sur plusieurs sessions."""
+        path = filedialog.askopenfilename(title="Fichier de tâches", filetypes=[("CSV", "*.csv"), ("Tous les fichiers", "*.*")])
+        if not path:
+            return
+        nb_sessions = get_config().get_int("App", "scheduler_sessions", fallback=3)
+        self.executor.submit(
+            run_schedule_file,
+            self.sap_pool,
+            path,
+            nb_sessions,
+            on_done=self.on_schedule_done,
+            on_error=lambda e: messagebox.showerror("Erreur", f"Exécution du fichier de tâches impossible : {e}")
+        )
+
+    def on_schedule_done(self, summary):
+        lines = [
+            f"{summary['jobs']} tâche(s) : {summary['succeeded']} en succès, {summary['failed']} en échec.",
+            f"{summary['jobs_per_second']} tâche(s)/s en {summary['wall_time_s']} s.",
+        ]
+        for session_id, stats in summary["sessions"].items():
+            lines.append(f"{session_id} : {stats['jobs']} tâche(s), {stats['mean_ms']} ms en moyenne")
+        lines.extend(f"Session arrêtée {error}" for error in summary["errors"])
+        messagebox.showinfo("Fichier de tâches", "\n".join(lines))
+        self.session_inventory.refresh()
+
     def quit_application(self):
+        for context in self.env_contexts.values():
+            context.executor.shutdown()
+        get_config().flush()
         self.destroy()
 
     def show_config_window(self):
@@ -219,6 +3428,7 @@ class MainApp(tk.Tk):
         def save_conf():
             self.saplogon_path = entry_path.get()
             self.sap_env = entry_env.get()
+            self.environments.get(DEFAULT_ENV_PROFILE).configure(self.saplogon_path, self.sap_env)
             save_config(self.saplogon_path, self.sap_env, self.tx_list, self.version_app)
             messagebox.showinfo("Info", "Configuration mise à jour.")
             config_win.destroy()
@@ -234,6 +3444,8 @@ class MainApp(tk.Tk):
             "2) Sélectionnez une transaction à lancer dans la liste déroulante ou choisissez 'Créer des HU' dans le menu Fichier.\n"
             "3) Pour lancer une transaction, choisissez la session ou optez pour 'Nouvelle session'.\n"
             "4) Dans la fenêtre 'Créer des HU', renseignez les champs et lancez la création.\n"
+            "5) Les environnements déclarés dans config.ini ([Env:NOM], clé sap_environment) se choisissent "
+            "en haut de la fenêtre ; transactions et HU peuvent être lancées sur plusieurs à la fois.\n"
         )
         messagebox.showinfo("Aide", msg)
 
@@ -243,6 +3455,14 @@ class MainApp(tk.Tk):
     def create_main_widgets(self):
         tk.Label(self, text="Lancement d'une transaction SAP", font=("Arial", 14, "bold")).pack(pady=10)
 
+        frame_env = tk.Frame(self)
+        frame_env.pack(pady=5)
+        tk.Label(frame_env, text="Environnement :").pack(side=tk.LEFT, padx=5)
+        self.combo_env = ttk.Combobox(frame_env, values=env_profiles(), state="readonly", width=30)
+        self.combo_env.set(self.env.name)
+        self.combo_env.bind("<<ComboboxSelected>>", self.on_env_selected)
+        self.combo_env.pack(side=tk.LEFT)
+
         frame_tx = tk.Frame(self)
         frame_tx.pack(pady=5)
 
@@ -265,43 +3485,56 @@ class MainApp(tk.Tk):
         refresh_btn = tk.Button(frame_sessions, text="Rafraîchir sessions", command=self.refresh_sessions)
         refresh_btn.pack(side=tk.LEFT, padx=5)
 
-        # Au lancement, on charge la liste des sessions
-        self.refresh_sessions()
+        frame_launch = tk.Frame(self)
+        frame_launch.pack(pady=10)
+        launch_btn = tk.Button(frame_launch, text="Lancer la transaction", bg="green", fg="white", command=self.on_launch_click)
+        launch_btn.pack(side=tk.LEFT, padx=5)
+        if len(env_profiles()) > 1:
+            tk.Button(frame_launch, text="Lancer dans tous les environnements",
+                      command=self.on_launch_all_click).pack(side=tk.LEFT, padx=5)
+
+        # État de la connexion SAP, recherchée en arrière-plan
+        self.label_sap = tk.Label(self, text="SAP : recherche de SAP GUI...", fg="gray", anchor="w")
+        self.label_sap.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=2)
 
-        launch_btn = tk.Button(self, text="Lancer la transaction", bg="green", fg="white", command=self.on_launch_click)
-        launch_btn.pack(pady=10)
+        # Au lancement, on charge la liste des sessions puis on la tient à jour en arrière-plan
+        self.session_inventory.subscribe(self.on_sessions_loaded)
+        self.session_inventory.refresh(on_error=self.on_discovery_error, connect=True)
+        self.env.watch_sessions()
+
+    def on_env_selected(self, _=None):
+        name = self.combo_env.get()
+        if name == self.env.name:
+            return
+        self.session_inventory.unsubscribe(self.on_sessions_loaded)
+        self.use_environment(name)
+        self.label_sap.config(text=f"SAP : connexion à {self.sap_pool.sap_env}...", fg="gray")
+        self.session_inventory.subscribe(self.on_sessions_loaded)
+        self.session_inventory.refresh(connect=True)
+        self.env.watch_sessions()
 
     def refresh_sessions(self):
         """Met à jour la liste des sessions en affichant "Session i - <titre>" puis ajoute "Nouvelle session"."""
-        try:
-            connection, _ = find_or_open_connection(self.saplogon_path, self.sap_env)
-            nb_sessions = connection.Children.Count
+        self.session_inventory.refresh(on_error=self.on_sessions_error, connect=True)
 
-            sessions_display = []
-            self.sessions_map = {}
+    def on_sessions_loaded(self, sessions):
+        sessions_display, self.sessions_map = session_choices(sessions)
+        current = self.combo_session.get()
+        self.combo_session['values'] = sessions_display
+        if current not in sessions_display:
+            self.combo_session.set(sessions_display[0])
+        error = self.session_inventory.error
+        if error is None:
+            self.label_sap.config(text=f"SAP : connecté à {self.sap_pool.sap_env} - {len(sessions)} session(s)", fg="dark green")
+            self.mark_startup("sap_ready")
+        else:
+            self.label_sap.config(text=f"SAP : indisponible - {error} (Rafraîchir sessions pour réessayer)", fg="red")
 
-            for i in range(nb_sessions):
-                sess = connection.Children(i)
-                try:
-                    wnd_title = sess.findById("wnd[0]").Text
-                except:
-                    wnd_title = "(Sans titre)"
-                display_name = f"Session {i} - {wnd_title}"
-                sessions_display.append(display_name)
-                self.sessions_map[display_name] = i
-
-            sessions_display.append("Nouvelle session")
-            self.combo_session['values'] = sessions_display
-
-            if sessions_display:
-                self.combo_session.set(sessions_display[0])
-            else:
-                self.combo_session.set("Nouvelle session")
+    def on_discovery_error(self, e):
+        self.mark_startup("sap_error")
 
-        except Exception as e:
-            self.combo_session['values'] = ["Nouvelle session"]
-            self.combo_session.set("Nouvelle session")
-            messagebox.showwarning("Attention", f"Impossible de lire la liste des sessions : {e}")
+    def on_sessions_error(self, e):
+        messagebox.showwarning("Attention", f"Impossible de lire la liste des sessions : {e}")
 
     def add_transaction_to_list(self):
         """Ajoute la transaction saisie dans la combobox à la liste, puis sauvegarde."""
@@ -322,19 +3555,115 @@ class MainApp(tk.Tk):
             messagebox.showerror("Erreur", "Veuillez saisir ou sélectionner une transaction.")
             return
 
-        try:
-            launch_sap_transaction(
-                self.saplogon_path,
-                self.sap_env,
+        sessions_map = dict(self.sessions_map)
+
+        def on_done(_):
+            messagebox.showinfo("Succès", f"La transaction {transaction_code} a été lancée.")
+            self.refresh_sessions()
+
+        def on_error(e):
+            messagebox.showerror("Erreur", f"{type(e).__name__}: {e}")
+            self.refresh_sessions()
+
+        self.executor.submit(
+            lambda job: launch_sap_transaction(
+                self.sap_pool,
                 transaction_code,
                 session_choice,
-                self.sessions_map
+                sessions_map
+            ),
+            on_done=on_done,
+            on_error=on_error
+        )
+
+    def on_launch_all_click(self):
+        """Lance la transaction dans une nouvelle session de chaque environnement, en parallèle."""
+        transaction_code = self.combo_tx.get().strip()
+        if not transaction_code:
+            messagebox.showerror("Erreur", "Veuillez saisir ou sélectionner une transaction.")
+            return
+        names = env_profiles()
+        results = {}
+
+        def finished(name, result):
+            results[name] = result
+            if len(results) == len(names):
+                messagebox.showinfo("Transaction", "\n".join(f"{n} : {results[n]}" for n in names))
+                self.refresh_sessions()
+
+        for name in names:
+            context = self.open_environment(name)
+            context.executor.submit(
+                lambda job, sap_pool=context.sap_pool: launch_sap_transaction(
+                    sap_pool, transaction_code, "Nouvelle session", {}
+                ),
+                on_done=lambda _, name=name: finished(name, f"{transaction_code} lancée"),
+                on_error=lambda e, name=name: finished(name, f"{type(e).__name__}: {e}")
             )
-            messagebox.showinfo("Succès", f"La transaction {transaction_code} a été lancée.")
-        except Exception as e:
-            messagebox.showerror("Erreur", f"{type(e).__name__}: {e}")
 
-        self.refresh_sessions()
+#
+# ---- Fenêtre des statistiques d'appels SAP ----
+#
+class StatsWindow(tk.Toplevel):
+    REFRESH_MS = 1000
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Statistiques SAP")
+        self.geometry("700x350")
+        self.parent = parent
+
+        top_frame = tk.Frame(self)
+        top_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.var_enabled = tk.BooleanVar(value=TRACER.enabled)
+        tk.Checkbutton(top_frame, text="Tracer les appels SAP", variable=self.var_enabled,
+                       command=self.on_toggle_trace).pack(side=tk.LEFT)
+        tk.Button(top_frame, text="Vider", command=TRACER.clear).pack(side=tk.LEFT, padx=5)
+        tk.Button(top_frame, text="Exporter (Chrome)", command=lambda: self.export("chrome")).pack(side=tk.LEFT, padx=5)
+        tk.Button(top_frame, text="Exporter (JSON)", command=lambda: self.export("json")).pack(side=tk.LEFT, padx=5)
+
+        self.label_summary = tk.Label(self, anchor="w")
+        self.label_summary.pack(fill=tk.X, padx=5)
+
+        # Opérations au temps cumulé le plus élevé
+        columns = ("op", "target", "count", "mean", "max")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=10)
+        for column, title, width in zip(columns, ("Opération", "Cible", "Nombre", "Moyenne (ms)", "Max (ms)"),
+                                         (120, 330, 60, 90, 80)):
+            self.tree.heading(column, text=title)
+            self.tree.column(column, width=width, anchor="w")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.refresh()
+
+    def on_toggle_trace(self):
+        set_tracing(self.var_enabled.get())
+        # Les poignées en cache ne sont pas tracées : on les fait résoudre à nouveau
+        self.parent.environments.reset()
+
+    def export(self, trace_format):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        if trace_format == "chrome":
+            TRACER.export_chrome_trace(path)
+        else:
+            TRACER.export_json(path)
+        messagebox.showinfo("Info", f"Trace exportée dans {path}", parent=self)
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        state = "active" if TRACER.enabled else "inactive"
+        self.label_summary.config(
+            text=f"Trace {state} - {len(TRACER.events)} événement(s) - "
+                 f"débit : {TRACER.throughput():.0f} HU/min (dernière minute)"
+        )
+        self.tree.delete(*self.tree.get_children())
+        for op, target, count, mean, worst in TRACER.slowest():
+            self.tree.insert("", tk.END, values=(op, target, count, f"{mean * 1000:.1f}", f"{worst * 1000:.1f}"))
+        self.after(self.REFRESH_MS, self.refresh)
 
 #
 # ---- Fenêtre de création des HU ----
@@ -342,39 +3671,38 @@ class MainApp(tk.Tk):
 class HUCreationWindow(tk.Toplevel):
     def __init__(self, parent):
         super().__init__(parent)
-        self.title("Créer des HU")
-        self.geometry("600x500")
+        self.geometry("600x540")
         self.parent = parent
+        # Environnement courant de la fenêtre principale à l'ouverture ; les autres peuvent être ajoutés au lot
+        self.env = parent.env
+        self.title(f"Créer des HU - {self.env.name}")
         
         # La fenêtre devient transitoire par rapport à la fenêtre parente
         self.transient(self.parent)
         # Capture tous les événements clavier/souris pour cette fenêtre
         self.grab_set()                         
 
-        # Charger ou initialiser la config HU dans le fichier .ini
-        self.config_parser = configparser.ConfigParser()
-        self.config_parser.read(CONFIG_FILE, encoding="utf-8")
-        if not self.config_parser.has_section("HU"):
-            self.config_parser.add_section("HU")
-            self.config_parser.set("HU", "work_center", "GPAK")
-            self.config_parser.set("HU", "storage_bin", "COOL-PACK, GR-ZONE")
-            self.config_parser.set("HU", "hu_type", "PAC0002, PAC0005, PAC0008, PAC0011, PAC0012")            
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                self.config_parser.write(f)
-
-        # Charcher et trier alphabétiquement les valeurs
-        wc_values = sorted([v.strip() for v in self.config_parser.get("HU", "work_center").split(",") if v.strip()])
-        sb_values = sorted([v.strip() for v in self.config_parser.get("HU", "storage_bin").split(",") if v.strip()])
-        ht_values = sorted([v.strip() for v in self.config_parser.get("HU", "hu_type").split(",") if v.strip()])
+        # Config HU (section [HU], valeurs par défaut si absente)
+        self.app_config = get_config()
+
+        # Charger et trier alphabétiquement les valeurs
+        wc_values = sorted(self.app_config.get_list("HU", "work_center"))
+        sb_values = sorted(self.app_config.get_list("HU", "storage_bin"))
+        ht_values = sorted(self.app_config.get_list("HU", "hu_type"))
 
         # Choix de la session
+        self.sessions_map_hu = {}
         session_frame = tk.Frame(self)
         session_frame.grid(row=0, column=0, columnspan=2, padx=5, pady=5, sticky="w")
         self.combo_session_hu = ttk.Combobox(session_frame, width=40)
         self.combo_session_hu.pack(side=tk.LEFT, padx=5)
         self.btn_refresh_sessions = tk.Button(session_frame, text="Rafraîchir sessions", command=self.refresh_sessions)
         self.btn_refresh_sessions.pack(side=tk.LEFT, padx=5)
-        self.refresh_sessions()  # initialisation
+        tk.Label(session_frame, text="Sessions parallèles:").pack(side=tk.LEFT, padx=5)
+        self.spin_parallel = tk.Spinbox(session_frame, from_=1, to=MAX_SAP_SESSIONS, width=3)
+        self.spin_parallel.pack(side=tk.LEFT)
+        # Liste des sessions déjà connue de l'inventaire partagé, mise à jour en arrière-plan
+        self.env.session_inventory.subscribe(self.on_sessions_loaded)
 
         # Création des contrôles pour Work Center
         tk.Label(self, text="Work Center:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
@@ -400,8 +3728,22 @@ class HUCreationWindow(tk.Toplevel):
         self.frame_hu_details.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="w")
         self.create_hu_detail_fields("PAC0011")
 
-        # Bouton pour lancer la création des HU
-        tk.Button(self, text="Lancer création HU", command=self.lancer_creation_hu).grid(row=5, column=0, columnspan=2, pady=10)
+        # Valeurs valides lues dans SAP (cache PACK_VALUES_FILE), chargées en arrière-plan si besoin
+        self.pack_values = {}
+        self.start_pack_values_loading()
+
+        # Boutons pour lancer / annuler la création des HU (une tâche par environnement)
+        self.current_jobs = {}
+        self.launch_targets = []
+        button_frame = tk.Frame(self)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        self.btn_launch = tk.Button(button_frame, text="Lancer création HU", command=self.lancer_creation_hu)
+        self.btn_launch.pack(side=tk.LEFT, padx=5)
+        self.btn_cancel = tk.Button(button_frame, text="Annuler", state=tk.DISABLED, command=self.cancel_creation_hu)
+        self.btn_cancel.pack(side=tk.LEFT, padx=5)
+        self.var_resume = tk.BooleanVar(value=False)
+        tk.Checkbutton(button_frame, text="Reprendre le dernier lot", variable=self.var_resume).pack(side=tk.LEFT, padx=5)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Zone de log pour afficher les status messages avec barre de défilement verticale
         self.text_log = tk.Text(self, height=10, width=70)
@@ -409,6 +3751,28 @@ class HUCreationWindow(tk.Toplevel):
         self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.text_log.yview)
         self.scrollbar.grid(row=6, column=2, sticky="ns", padx=(0,5))
         self.text_log.configure(yscrollcommand=self.scrollbar.set)
+        # Résumé du lot en cours : les HU créées ne sont que comptées, le détail est dans HU_LOG_FILE
+        self.label_counters = tk.Label(self, anchor="w")
+        self.label_counters.grid(row=7, column=0, columnspan=2, padx=5, sticky="w")
+        self.reset_counters()
+        self.hu_indexes = {}
+
+        # Autres environnements sur lesquels lancer le même lot, en parallèle
+        self.var_other_envs = {}
+        other_envs = [name for name in env_profiles() if name != self.env.name]
+        if other_envs:
+            env_frame = tk.Frame(self)
+            env_frame.grid(row=8, column=0, columnspan=2, padx=5, sticky="w")
+            tk.Label(env_frame, text="Aussi sur :").pack(side=tk.LEFT, padx=5)
+            for name in other_envs:
+                self.var_other_envs[name] = tk.BooleanVar(value=False)
+                tk.Checkbutton(env_frame, text=name, variable=self.var_other_envs[name]).pack(side=tk.LEFT)
+
+        self.log_writer = BufferedTextLog(
+            self.text_log,
+            file_logger=get_file_logger("sap_auto.hu", HU_LOG_FILE),
+            on_flush=self.update_counters
+        )
         
         # La fenêtre parente doit attendre que la fenêtre soit fermée
         self.parent.wait_window(self)  
@@ -424,9 +3788,7 @@ class HUCreationWindow(tk.Toplevel):
                 # Mise à jour de la combobox et de la config
                 self.combo_wc['values'] = sorted(values)
                 self.combo_wc.set("")
-                self.config_parser.set("HU", "work_center", ", ".join(sorted(values)))
-                with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                    self.config_parser.write(f)
+                self.app_config.remove_from_list("HU", "work_center", current_value)
             messagebox.showinfo("Info", f"'{current_value}' supprimé de Work Center.")
         return "break"
 
@@ -441,9 +3803,7 @@ class HUCreationWindow(tk.Toplevel):
                 # Mise à jour de la combobox et de la config
                 self.combo_sb['values'] = sorted(values)
                 self.combo_sb.set("")
-                self.config_parser.set("HU", "storage_bin", ", ".join(sorted(values)))
-                with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                    self.config_parser.write(f)
+                self.app_config.remove_from_list("HU", "storage_bin", current_value)
             messagebox.showinfo("Info", f"'{current_value}' supprimé de Storage BIN.")
         return "break"
 
@@ -452,7 +3812,9 @@ class HUCreationWindow(tk.Toplevel):
             widget.destroy()
         if hu_type == "PAC0012":
             tk.Label(self.frame_hu_details, text="Nombre de HU à créer:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-            self.spin_hu_number = tk.Spinbox(self.frame_hu_details, from_=1, to=100, width=5)
+            # Sans champ de quantité, chaque HU demande un cycle complet de l'écran scanner
+            max_count = HU_BULK_MAX_COUNT if self.app_config.get("HU", "bulk_quantity_field", fallback="") else 100
+            self.spin_hu_number = tk.Spinbox(self.frame_hu_details, from_=1, to=max_count, width=7)
             self.spin_hu_number.grid(row=0, column=1, padx=5, pady=5, sticky="w")
         else:
             tk.Label(self.frame_hu_details, text="Liste des numéros de HU:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
@@ -464,131 +3826,843 @@ class HUCreationWindow(tk.Toplevel):
         self.create_hu_detail_fields(hu_type)
 
     def refresh_sessions(self):
-        try:
-            connection, _ = find_or_open_connection(self.parent.saplogon_path, self.parent.sap_env)
-            nb_sessions = connection.Children.Count
+        self.env.session_inventory.refresh(on_error=self.on_sessions_error, connect=True)
 
-            sessions_display = []
-            self.sessions_map_hu = {}
+    def on_sessions_loaded(self, sessions):
+        sessions_display, self.sessions_map_hu = session_choices(sessions)
+        current = self.combo_session_hu.get()
+        self.combo_session_hu['values'] = sessions_display
+        if current not in sessions_display:
+            self.combo_session_hu.set(sessions_display[0])
 
-            for i in range(nb_sessions):
-                sess = connection.Children(i)
-                try:
-                    wnd_title = sess.findById("wnd[0]").Text
-                except:
-                    wnd_title = "(Sans titre)"
-                display_name = f"Session {i} - {wnd_title}"
-                sessions_display.append(display_name)
-                self.sessions_map_hu[display_name] = i
-
-            sessions_display.append("Nouvelle session")
-            self.combo_session_hu['values'] = sessions_display
-
-            if sessions_display:
-                self.combo_session_hu.set(sessions_display[0])
-            else:
-                self.combo_session_hu.set("Nouvelle session")
-        except Exception as e:
-            self.combo_session_hu['values'] = ["Nouvelle session"]
-            self.combo_session_hu.set("Nouvelle session")
-            self.log(f"Erreur rafraîchissement sessions: {e}")
+    def on_sessions_error(self, e):
+        self.log(f"Erreur rafraîchissement sessions: {e}")
 
     def lancer_creation_hu(self):
-        self.text_log.delete('1.0', tk.END)
-        self.update_idletasks()
+        if self.current_jobs:
+            return
+        self.log_writer.clear()
+        self.reset_counters()
         wc = self.combo_wc.get().strip()
         sb = self.combo_sb.get().strip()
         hu_type = self.combo_hu_type.get().strip()
 
+        values = {"work_center": wc, "storage_bin": sb, "hu_type": hu_type}
+        invalid, doubtful = check_pack_values(self.pack_values, **values)
+        for key in doubtful:
+            self.log(f"Attention : {PACK_VALUE_LABELS[key]} '{values[key]}' absent de la liste lue dans "
+                     f"{self.env.sap_pool.sap_env}, peut-être incomplète.")
+        if invalid:
+            for key in invalid:
+                self.log(f"{PACK_VALUE_LABELS[key]} '{values[key]}' inconnu dans {self.env.sap_pool.sap_env}.")
+            return
         self.update_hu_config(wc, sb)
 
-        try:
-            # Récupération de la session sélectionnée dans la fenêtre HU
-            connection, _ = find_or_open_connection(self.parent.saplogon_path, self.parent.sap_env)
-            session_choice = self.combo_session_hu.get().strip()
-            nb_sessions = connection.Children.Count
-            if session_choice == "Nouvelle session":
-                if nb_sessions == 0:
-                    self.log("Aucune session existante pour effectuer l'ouverture /o.")
-                    return
-                session = connection.Children(0)
-            else:
-                if session_choice not in self.sessions_map_hu:
-                    self.log(f"La session '{session_choice}' n'existe pas.")
-                    return
-                idx = self.sessions_map_hu[session_choice]
-                if idx < 0 or idx >= nb_sessions:
-                    self.log(f"La session d'index {idx} n'existe pas.")
-                    return
-                session = connection.Children(idx)
-
-            transaction_code = "/n/scwm/pack"
-            session.findById("wnd[0]/tbar[0]/okcd").text = transaction_code
-            session.findById("wnd[0]").sendVKey(0)
-            time.sleep(2)
-
-            try:
-                session.findById("wnd[0]/usr/ctxtPA_WRKST").text = wc
-            except Exception as e:
-                self.log(f"Erreur lors du remplissage des champs wc: {e}")
+        self.launch_targets = [self.env.name] + [name for name, var in self.var_other_envs.items() if var.get()]
+        # Environnement -> (HU à créer, nombre de HU)
+        hu_lists = {}
+        if hu_type == "PAC0012":
+            # HU sans numéro : seul leur nombre compte
+            nb = int(self.spin_hu_number.get())
+            hu_lists = {name: (itertools.repeat("", nb), nb) for name in self.launch_targets}
+        else:
+            raw_text = self.text_hu_list.get("1.0", tk.END).strip()
+            if not raw_text:
+                self.log("Veuillez entrer au moins un numéro de HU.")
                 return
             try:
-                session.findById("wnd[0]/usr/ctxtSOLGPLA-LOW").text = sb
-            except Exception as e:
-                self.log(f"Erreur lors du remplissage des champs sb: {e}")
+                pattern = get_hu_pattern(self.app_config)
+            except ValueError as e:
+                self.log(str(e))
                 return
-            try:
-                session.findById("wnd[0]").sendVKey(8)
-            except Exception as e:
-                self.log(f"Erreur lors du click: {e}")
+            tokens = list(iter_hu_tokens(raw_text.splitlines()))
+            for name in self.launch_targets:
+                # Chaque environnement a son propre index des HU déjà créées
+                rejected = []
+                hu_list = list(filter_hu_input(tokens, pattern, self.hu_index(name), rejected))
+                prefix = self.env_prefix(name)
+                for hu, reason in rejected:
+                    self.log(f"{prefix}HU {hu} écartée : {reason}")
+                if rejected:
+                    self.log(f"{prefix}{len(rejected)} HU écartée(s) avant envoi, {len(hu_list)} à créer.")
+                if hu_list:
+                    hu_lists[name] = (hu_list, len(hu_list))
+            if not hu_lists:
                 return
 
-            if hu_type == "PAC0012":
-                nb = int(self.spin_hu_number.get())
-                hu_list = ["" for i in range(1, nb+1)]
+        self.btn_launch.config(state=tk.DISABLED)
+        self.btn_cancel.config(state=tk.NORMAL)
+        for name, (hu_list, nb) in hu_lists.items():
+            context = self.parent.open_environment(name)
+            if name == self.env.name:
+                session_choice, sessions_map = self.combo_session_hu.get().strip(), dict(self.sessions_map_hu)
             else:
-                raw_text = self.text_hu_list.get("1.0", tk.END).strip()
-                if not raw_text:
-                    self.log("Veuillez entrer au moins un numéro de HU.")
-                    return
-                hu_list = [s.strip() for s in raw_text.replace(",", "\n").split("\n") if s.strip()]
-
-            for hu in hu_list:
-                session.FindById("wnd[0]/usr/subSUB_SCANNER:/SCWM/SAPLUI_PACKING:0200/tabsTS_SCANNER/tabpHU_CREATE/ssubSS_SCANNER:/SCWM/SAPLUI_PACKING:0202/txt/SCWM/S_PACK_VIEW_SCANNER-DEST_HU_UI").Text = hu
-                session.FindById("wnd[0]/usr/subSUB_SCANNER:/SCWM/SAPLUI_PACKING:0200/tabsTS_SCANNER/tabpHU_CREATE/ssubSS_SCANNER:/SCWM/SAPLUI_PACKING:0202/ctxt/SCWM/S_PACK_VIEW_SCANNER-DEST_PMAT_NO").Text = hu_type
-                session.FindById("wnd[0]/usr/subSUB_SCANNER:/SCWM/SAPLUI_PACKING:0200/tabsTS_SCANNER/tabpHU_CREATE/ssubSS_SCANNER:/SCWM/SAPLUI_PACKING:0202/txt/SCWM/S_PACK_VIEW_SCANNER-DEST_ID").Text = sb
-                session.findById("wnd[0]").sendVKey(8)
-                time.sleep(1)
-                status = session.findById("wnd[0]/sbar").text
-                if status[-15:] != "was constructed":
-                    session.findById("wnd[0]").sendVKey(2)
-                self.log(f"HU {hu} : {status}")
+                # La session choisie n'existe que dans l'environnement de la fenêtre : session dédiée
+                session_choice, sessions_map = None, {}
+            self.current_jobs[name] = context.executor.submit(
+                run_hu_creation,
+                context.sap_pool,
+                session_choice,
+                sessions_map,
+                hu_list,
+                hu_type,
+                wc,
+                sb,
+                min(int(self.spin_parallel.get()), nb),
+                resume=self.var_resume.get(),
+                quantity_field=self.app_config.get("HU", "bulk_quantity_field", fallback="") or None,
+                bulk_size=self.app_config.get_int("HU", "bulk_size", fallback=HU_BULK_SIZE),
+                hu_index=self.hu_index(name),
+                journal_path=env_file(JOURNAL_FILE, name),
+                on_done=lambda _, name=name: self.on_creation_finished(name),
+                on_error=lambda e, name=name: self.on_creation_error(e, name),
+                on_progress=lambda event, name=name: self.on_creation_progress(event, name)
+            )
 
-        except Exception as e:
-            self.log(f"Erreur lors de la création des HU: {e}")
+    def hu_index(self, env):
+        """Index des HU déjà créées dans l'environnement 'env', chargé une fois par fenêtre."""
+        if env not in self.hu_indexes:
+            self.hu_indexes[env] = HUIndex(env_file(HU_INDEX_FILE, env))
+        return self.hu_indexes[env]
+
+    def env_prefix(self, env):
+        """Préfixe des lignes de log quand le lot tourne sur plusieurs environnements."""
+        return f"[{env}] " if env and len(self.launch_targets) > 1 else ""
+
+    def cancel_creation_hu(self):
+        if self.current_jobs:
+            for job in self.current_jobs.values():
+                job.cancel()
+            self.log("Annulation demandée...")
+
+    def on_creation_finished(self, env=None):
+        self.current_jobs.pop(env, None)
+        if self.current_jobs:
+            return
+        self.btn_launch.config(state=tk.NORMAL)
+        self.btn_cancel.config(state=tk.DISABLED)
+
+    def on_creation_error(self, e, env=None):
+        if isinstance(e, JobCancelled):
+            self.log(f"{self.env_prefix(env)}Création des HU annulée.")
+        else:
+            self.log(f"{self.env_prefix(env)}Erreur lors de la création des HU: {e}")
+        self.on_creation_finished(env)
+
+    def on_close(self):
+        self.cancel_creation_hu()
+        self.env.session_inventory.unsubscribe(self.on_sessions_loaded)
+        self.destroy()
+
+    def start_pack_values_loading(self):
+        """Remplit les listes depuis le cache, ou lance leur lecture dans SAP en arrière-plan."""
+        source = self.app_config.get("HU", "pack_values_source", fallback="f4")
+        if not source:
+            return
+        cache = PackValuesCache(ttl=self.app_config.get_int("HU", "pack_values_ttl", fallback=PACK_VALUES_TTL))
+        values = cache.get(self.env.sap_pool.sap_env)
+        if values is not None:
+            self.on_pack_values_loaded(values)
+            return
+        self.env.executor.submit(
+            load_pack_values,
+            self.env.sap_pool,
+            source,
+            self.app_config.get("HU", "default_work_center", fallback=""),
+            self.app_config.get("HU", "default_storage_bin", fallback=""),
+            cache=cache,
+            on_done=self.on_pack_values_loaded,
+            on_error=self.on_pack_values_error
+        )
+
+    def on_pack_values_loaded(self, values):
+        self.pack_values = values
+        for combo, key in ((self.combo_wc, "work_center"), (self.combo_sb, "storage_bin"), (self.combo_hu_type, "hu_type")):
+            if values.get(key):
+                combo["values"] = values[key]
+
+    def on_pack_values_error(self, e):
+        self.log(f"Listes non vérifiées, valeurs SAP indisponibles : {e}")
 
     def update_hu_config(self, wc, sb):
-        self.config_parser.read(CONFIG_FILE, encoding="utf-8")
-        if not self.config_parser.has_section("HU"):
-            self.config_parser.add_section("HU")
-        existing_wc = self.config_parser.get("HU", "work_center", fallback="GPAK")
-        existing_sb = self.config_parser.get("HU", "storage_bin", fallback="GR-ZONE, COOL")
-        wc_list = {v.strip() for v in existing_wc.split(",") if v.strip()}
-        sb_list = {v.strip() for v in existing_sb.split(",") if v.strip()}
-        wc_list.add(wc)
-        sb_list.add(sb)
-        self.config_parser.set("HU", "work_center", ", ".join(wc_list))
-        self.config_parser.set("HU", "storage_bin", ", ".join(sb_list))
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            self.config_parser.write(f)
+        self.app_config.add_to_list("HU", "work_center", wc)
+        self.app_config.add_to_list("HU", "storage_bin", sb)
 
     def log(self, message):
-        self.text_log.insert(tk.END, message + "\n")
-        self.text_log.see(tk.END)
-        self.update_idletasks()
+        self.log_writer.write(message)
+
+    def on_creation_progress(self, event, env=None):
+        """Message texte, ou résultat d'une HU (HUProgress) : compté, et affiché seulement en cas d'échec."""
+        prefix = self.env_prefix(env)
+        if not isinstance(event, HUProgress):
+            self.log(f"{prefix}{event}")
+            return
+        if event.attempt:
+            self.counters["retried"] += 1
+        if event.created:
+            self.counters["created"] += 1
+            self._failed_indexes.discard((env, event.index))
+        else:
+            self._failed_indexes.add((env, event.index))
+        retry = f" (tentative {event.attempt + 1})" if event.attempt else ""
+        self.log_writer.write(f"{prefix}HU {event.hu or '(sans numéro)'} : {event.status}{retry}", display=not event.created)
+
+    def reset_counters(self):
+        self.counters = {"created": 0, "retried": 0}
+        self._failed_indexes = set()
+        self.update_counters()
+
+    def update_counters(self):
+        self.label_counters.config(
+            text=f"Créées : {self.counters['created']}   En échec : {len(self._failed_indexes)}   "
+                 f"Retentées : {self.counters['retried']}   (détail : {HU_LOG_FILE})"
+        )
+
+#
+# ---- LIGNE DE COMMANDE (mode batch sans interface) ----
+#
+def iter_hu_source(path, column=None):
+    """
+    Générateur : lit les numéros de HU d'un fichier TXT/CSV, ou de stdin si path vaut "-",
+    ligne par ligne, sans charger le fichier en mémoire.
+    Pour un CSV, 'column' désigne la colonne à lire (index ou nom d'en-tête, 0 par défaut).
+    """
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+    try:
+        if not path.lower().endswith(".csv"):
+            yield from iter_hu_tokens(stream)
+            return
+        first_line = stream.readline()
+        if not first_line:
+            return
+        delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+        reader = csv.reader(itertools.chain([first_line], stream), delimiter=delimiter)
+        if column is None or str(column).isdigit():
+            index = int(column or 0)
+        else:
+            header = next(reader)
+            if column not in header:
+                raise ValueError(f"Colonne '{column}' absente de l'en-tête : {', '.join(header)}")
+            index = header.index(column)
+        for row in reader:
+            if index < len(row) and row[index].strip():
+                yield row[index].strip()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def iter_csv_rows(path):
+    """Générateur : lit un CSV (séparateur ';' ou ',' détecté sur l'en-tête, stdin si path vaut "-") ligne par ligne, en dicts."""
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+    try:
+        first_line = stream.readline()
+        if not first_line:
+            return
+        delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+        for row in csv.DictReader(itertools.chain([first_line], stream), delimiter=delimiter):
+            yield {key.strip(): (value or "").strip() for key, value in row.items() if key}
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+class HUReportWriter:
+    """
+    Écrit un résultat par HU dans un rapport CSV, ou JSONL si le fichier se termine par .jsonl.
+    'fields' remplace les colonnes du rapport (ex. rapport de rejeu d'une macro).
+    """
+    FIELDS = ["index", "hu", "hu_type", "created", "outcome", "status", "attempt", "timestamp"]
+
+    def __init__(self, path, fields=None):
+        self.jsonl = path.lower().endswith(".jsonl")
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._file, fieldnames=fields or self.FIELDS, delimiter=";", extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, row):
+        if self.jsonl:
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self._csv.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+#
+# ---- BENCHMARKS (sur le simulateur) ----
+#
+def percentile(sorted_values, p):
+    """Percentile 'p' (0-100) par rang le plus proche d'une liste déjà triée."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def latency_summary(durations):
+    values = sorted(durations)
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "p99_ms": round(1000 * percentile(values, 99), 3),
+        "max_ms": round(1000 * values[-1], 3) if values else 0.0,
+    }
+
+def run_benchmark(nb_hus=1000, nb_sessions=1, nb_launches=50, nb_refreshes=50, call_latency=0.0005,
+                  roundtrip_latency=0.01, error_rate=0.0, seed=0, hu_type="PAC0011", bulk_size=0):
+    """
+    Mesure launch_sap_transaction, la lecture des sessions (rafraîchissement) et la création
+    de 'nb_hus' HU sur le simulateur. Renvoie un dict sérialisable en JSON.
+    Avec 'bulk_size', l'écran simulé propose un champ de quantité et les HU sans numéro sont créées en masse.
+    """
+    quantity_field = SIM_QUANTITY_FIELD if bulk_size else None
+    backend = SimulatorBackend(call_latency=call_latency, roundtrip_latency=roundtrip_latency,
+                               error_rate=error_rate, seed=seed, quantity_field=quantity_field)
+    previous_backend = _backend
+    set_backend(TracingBackend(backend) if TRACER.enabled else backend)
+    try:
+        sap_pool = SapConnectionManager("saplogon.exe", "BENCH")
+        connection, _ = sap_pool.get_connection()
+        results = {}
+
+        # Rafraîchissement de la liste des sessions
+        durations = []
+        for _ in range(nb_refreshes):
+            start = time.perf_counter()
+            list_sessions(sap_pool.get_connection()[0])
+            durations.append(time.perf_counter() - start)
+        results["refresh_sessions"] = latency_summary(durations)
+
+        # Lancement d'une transaction dans une session existante
+        sessions_map = {"Session 0": 0}
+        durations = []
+        calls = backend.calls
+        for _ in range(nb_launches):
+            start = time.perf_counter()
+            launch_sap_transaction(sap_pool, "/n/scwm/mon", "Session 0", sessions_map)
+            durations.append(time.perf_counter() - start)
+        results["launch_transaction"] = latency_summary(durations)
+        results["launch_transaction"]["com_calls_per_launch"] = round((backend.calls - calls) / max(nb_launches, 1), 2)
+
+        # Création des HU
+        hu_durations = []
+        durations_lock = threading.Lock()
+
+        def record_hu_duration(duration):
+            with durations_lock:
+                hu_durations.append(duration)
+
+        if hu_type == "PAC0012":
+            hu_iter = itertools.repeat("", nb_hus)
+        else:
+            hu_iter = (f"BENCH{seed:04d}{i:08d}" for i in range(nb_hus))
+        session = connection.Children(0)
+        bulk, hu_iter, controls = probe_bulk_mode(session, hu_iter, "BENCH", "BENCH-BIN", quantity_field)
+        session_ids = open_worker_sessions(sap_pool, session, 1 if bulk else nb_sessions)
+        calls, roundtrips = backend.calls, backend.roundtrips
+        sleep_time = WAIT_STATS["sleep_time"]
+        try:
+            start = time.perf_counter()
+            nb_ok = sum(is_hu_created(status) for _, status in
+                        create_hu_batch(sap_pool, session_ids, hu_iter, hu_type, "BENCH", "BENCH-BIN",
+                                        quantity_field=quantity_field,
+                                        bulk_size=bulk_size or HU_BULK_SIZE, on_timing=record_hu_duration,
+                                        controls=controls))
+            wall_time = time.perf_counter() - start
+        finally:
+            close_worker_sessions(sap_pool, session_ids)
+
+        busy_time = sum(hu_durations)
+        sleeping = WAIT_STATS["sleep_time"] - sleep_time
+        results["hu_creation"] = dict(
+            latency_summary(hu_durations),
+            sessions=len(session_ids),
+            created=nb_ok,
+            failed=nb_hus - nb_ok,
+            wall_time_s=round(wall_time, 3),
+            hus_per_second=round(nb_hus / wall_time, 2) if wall_time else 0.0,
+            com_calls_per_hu=round((backend.calls - calls) / max(nb_hus, 1), 2),
+            roundtrips_per_hu=round((backend.roundtrips - roundtrips) / max(nb_hus, 1), 2),
+            sleep_time_s=round(sleeping, 3),
+            work_time_s=round(busy_time - sleeping, 3),
+            sleep_ratio=round(sleeping / busy_time, 4) if busy_time else 0.0,
+        )
+        return results
+    finally:
+        set_backend(previous_backend)
+
+def run_bench_cli(args):
+    """Commande 'bench' : lance run_benchmark et écrit les résultats (JSON) pour le suivi des régressions."""
+    _, _, _, version_app = load_config()
+    params = {
+        "nb_hus": args.hus,
+        "nb_sessions": args.sessions,
+        "nb_launches": args.launches,
+        "nb_refreshes": args.refreshes,
+        "call_latency": args.call_latency,
+        "roundtrip_latency": args.roundtrip_latency,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+        "hu_type": args.hu_type,
+        "bulk_size": args.bulk_size,
+    }
+    report = {
+        "version": version_app,
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "params": params,
+        "results": run_benchmark(**params),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    hu = report["results"]["hu_creation"]
+    print(
+        f"{hu['hus_per_second']} HU/s sur {hu['sessions']} session(s) - "
+        f"p50 {hu['p50_ms']} ms, p95 {hu['p95_ms']} ms, p99 {hu['p99_ms']} ms - "
+        f"{hu['com_calls_per_hu']} appels COM/HU - attente {hu['sleep_ratio']:.0%} du temps",
+        file=sys.stderr
+    )
+    return 0
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="main_app", description="SAP Auto : interface graphique ou traitements batch.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="Backend SAP GUI (défaut : [SAP] backend ou com).")
+    parser.add_argument("--trace", help="Tracer les appels SAP et écrire la trace dans ce fichier à la fin.")
+    parser.add_argument("--trace-format", choices=["chrome", "json"], default="chrome", help="Format de la trace (défaut : chrome).")
+    parser.add_argument("--env", action="append",
+                        help="Profil d'environnement ([Env:NOM] de config.ini, défaut : [SAP]) ; répété, la commande "
+                             "est exécutée sur chaque environnement en parallèle.")
+    parser.add_argument("--startup-report",
+                        help="Interface : écrire les temps de démarrage (fenêtre affichée, SAP trouvé) dans ce fichier JSON puis quitter.")
+    commands = parser.add_subparsers(dest="command")
+
+    hu = commands.add_parser("hu-create", help="Créer des HU sans interface graphique (/scwm/pack).")
+    source = hu.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Fichier TXT ou CSV des numéros de HU ('-' pour stdin).")
+    source.add_argument("--count", type=int, help="Nombre de HU sans numéro à créer (ex. PAC0012).")
+    hu.add_argument("--column", help="Colonne du CSV à lire (index ou nom d'en-tête).")
+    hu.add_argument("--work-center", help="Poste de travail (défaut : [HU] default_work_center).")
+    hu.add_argument("--storage-bin", help="Emplacement (défaut : [HU] default_storage_bin).")
+    hu.add_argument("--hu-type", help="Type de HU (défaut : [HU] default_hu_type).")
+    hu.add_argument("--session", type=int, default=0, help="Index de la session SAP à utiliser (défaut : 0).")
+    hu.add_argument("--sessions", type=int, default=1, help=f"Nombre de sessions en parallèle (1 à {MAX_SAP_SESSIONS}).")
+    hu.add_argument("--report", help="Rapport par HU (.csv ou .jsonl).")
+    hu.add_argument("--journal", default=JOURNAL_FILE,
+                    help=f"Journal de reprise (défaut : {JOURNAL_FILE}, suffixé par le profil avec --env).")
+    hu.add_argument("--batch", help="Nom du lot dans le journal (défaut : horodaté).")
+    hu.add_argument("--resume", action="store_true", help="Reprendre le lot --batch en ignorant les HU déjà créées.")
+    hu.add_argument("--retries", type=int, help=f"Nouvelles tentatives des HU en échec (défaut : [HU] max_retries ou {HU_MAX_RETRIES}).")
+    hu.add_argument("--quantity-field",
+                    help="Id du champ de quantité de l'écran scanner, pour créer les HU sans numéro en masse (défaut : [HU] bulk_quantity_field).")
+    hu.add_argument("--bulk-size", type=int, help=f"HU sans numéro créées par validation (défaut : [HU] bulk_size ou {HU_BULK_SIZE}).")
+    hu.add_argument("--retry-backoff", type=float, help=f"Délai initial entre tentatives en secondes (défaut : [HU] retry_backoff ou {HU_RETRY_BACKOFF}).")
+    hu.add_argument("--index", default=HU_INDEX_FILE,
+                    help=f"Index local des HU déjà créées (défaut : {HU_INDEX_FILE}, suffixé par le profil avec --env).")
+    hu.add_argument("--no-index-check", action="store_true",
+                    help="Envoyer aussi les HU présentes dans l'index local (il reste mis à jour).")
+
+    bench = commands.add_parser("bench", help="Mesurer les performances sur le simulateur SAP.")
+    bench.add_argument("--hus", type=int, default=1000, help="Nombre de HU à créer (défaut : 1000).")
+    bench.add_argument("--sessions", type=int, default=1, help="Nombre de sessions en parallèle.")
+    bench.add_argument("--launches", type=int, default=50, help="Nombre de lancements de transaction mesurés.")
+    bench.add_argument("--refreshes", type=int, default=50, help="Nombre de lectures de la liste des sessions.")
+    bench.add_argument("--call-latency", type=float, default=0.0005, help="Latence de chaque appel COM simulé (s).")
+    bench.add_argument("--roundtrip-latency", type=float, default=0.01, help="Latence d'un aller-retour serveur simulé (s).")
+    bench.add_argument("--error-rate", type=float, default=0.0, help="Taux d'échec simulé des créations d'HU.")
+    bench.add_argument("--seed", type=int, default=0, help="Graine du simulateur.")
+    bench.add_argument("--hu-type", default="PAC0011", help="Type de HU (PAC0012 = HU sans numéro).")
+    bench.add_argument("--bulk-size", type=int, default=0,
+                       help="Création en masse des HU sans numéro, par paquets de cette taille (0 : HU par HU).")
+    bench.add_argument("--label", default="", help="Libellé du run (ex. nom de branche).")
+    bench.add_argument("--output", help="Fichier JSON des résultats (défaut : sortie standard).")
+
+    macro = commands.add_parser("macro", help=f"Macros de transactions ({MACRO_FILE}) : liste, vérification, import, rejeu.")
+    macro.add_argument("action", choices=["list", "check", "import", "run"], help="Action sur les macros.")
+    macro.add_argument("name", nargs="?", help="Nom de la macro.")
+    macro.add_argument("--input", help="CSV des lignes à rejouer (run) ou script .vbs enregistré par SAP GUI (import).")
+    macro.add_argument("--file", default=MACRO_FILE, help=f"Fichier des macros (défaut : {MACRO_FILE}).")
+    macro.add_argument("--session", type=int, default=0, help="Index de la session SAP à utiliser (défaut : 0).")
+    macro.add_argument("--report", help="Rapport par ligne (.csv ou .jsonl).")
+
+    schedule = commands.add_parser("schedule", help="Exécuter un fichier de tâches (transaction, macro, paramètres) sur plusieurs sessions.")
+    schedule.add_argument("--input", required=True, help="CSV des tâches : colonnes 'transaction' et/ou 'macro', puis les paramètres.")
+    schedule.add_argument("--macros", default=MACRO_FILE, help=f"Fichier des macros (défaut : {MACRO_FILE}).")
+    schedule.add_argument("--session", type=int, default=0, help="Index de la session SAP de départ (défaut : 0).")
+    schedule.add_argument("--sessions", type=int, default=MAX_SAP_SESSIONS,
+                          help=f"Nombre de sessions en parallèle (défaut et maximum : {MAX_SAP_SESSIONS}).")
+    schedule.add_argument("--report", help="Rapport par tâche (.csv ou .jsonl).")
+    schedule.add_argument("--summary", help="Fichier JSON du résumé (débit, tâches et latence par session).")
+    return parser
+
+def run_hu_create_cli(args):
+    """Commande 'hu-create' : crée les HU au fil de la lecture de la source et écrit le rapport. Renvoie le code retour."""
+    config = get_config()
+    env = (args.env or [None])[0]
+    saplogon_path, sap_env = load_env_profile(env)
+
+    wc = args.work_center or config.get("HU", "default_work_center", fallback="")
+    sb = args.storage_bin or config.get("HU", "default_storage_bin", fallback="")
+    hu_type = args.hu_type or config.get("HU", "default_hu_type", fallback="")
+    missing = [name for name, value in (("--work-center", wc), ("--storage-bin", sb), ("--hu-type", hu_type)) if not value]
+    if missing:
+        print(f"Paramètre(s) manquant(s) : {', '.join(missing)}", file=sys.stderr)
+        return 2
+    if args.resume and not args.batch:
+        print("--resume nécessite --batch.", file=sys.stderr)
+        return 2
+    pack_values = PackValuesCache(ttl=config.get_int("HU", "pack_values_ttl", fallback=PACK_VALUES_TTL)).get(sap_env) or {}
+    values = {"work_center": wc, "storage_bin": sb, "hu_type": hu_type}
+    invalid, doubtful = check_pack_values(pack_values, **values)
+    for key in doubtful:
+        print(f"Attention : {PACK_VALUE_LABELS[key]} '{values[key]}' absent de la liste de {sap_env} "
+              f"({PACK_VALUES_FILE}), peut-être incomplète.", file=sys.stderr)
+    if invalid:
+        for key in invalid:
+            print(f"{PACK_VALUE_LABELS[key]} '{values[key]}' inconnu dans {sap_env} ({PACK_VALUES_FILE}).", file=sys.stderr)
+        return 2
+    max_retries = args.retries if args.retries is not None else config.get_int("HU", "max_retries", fallback=HU_MAX_RETRIES)
+    retry_backoff = args.retry_backoff if args.retry_backoff is not None else config.get_float("HU", "retry_backoff", fallback=HU_RETRY_BACKOFF)
+    quantity_field = args.quantity_field or config.get("HU", "bulk_quantity_field", fallback="") or None
+    bulk_size = args.bulk_size or config.get_int("HU", "bulk_size", fallback=HU_BULK_SIZE)
+    try:
+        pattern = get_hu_pattern(config)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    hu_index = HUIndex(env_file(args.index, env))
+    rejected = []
+    if args.count is not None:
+        hu_iter = itertools.repeat("", args.count)
+    else:
+        hu_iter = filter_hu_input(iter_hu_source(args.input, args.column), pattern,
+                                  None if args.no_index_check else hu_index, rejected)
+
+    backend = get_backend()
+    backend.init_thread()
+    try:
+        try:
+            sap_pool = SapConnectionManager(saplogon_path, sap_env)
+            connection, _ = sap_pool.get_connection()
+            if args.session < 0 or args.session >= connection.Children.Count:
+                print(f"La session d'index {args.session} n'existe pas.", file=sys.stderr)
+                return 2
+            session = connection.Children(args.session)
+        except (OSError, *sap_errors()) as e:
+            print(f"Connexion SAP impossible : {e}", file=sys.stderr)
+            return 1
+
+        journal = HUJournal(env_file(args.journal, env))
+        batch = args.batch or new_batch_id("CLI")
+        report = HUReportWriter(args.report) if args.report else None
+        session_ids = [session.Id]
+        errors = []
+        failed = set()
+        nb_ok = 0
+        start = time.monotonic()
+        try:
+            bulk, hu_iter, controls = probe_bulk_mode(session, hu_iter, wc, sb, quantity_field)
+            session_ids = open_worker_sessions(sap_pool, session, 1 if bulk else args.sessions)
+            for index, hu, status, created, attempt in run_journaled_batch(
+                sap_pool, session_ids, hu_iter, hu_type, wc, sb, journal, batch,
+                resume=args.resume, max_retries=max_retries, retry_backoff=retry_backoff, errors=errors,
+                quantity_field=quantity_field, bulk_size=bulk_size, controls=controls
+            ):
+                if created:
+                    nb_ok += 1
+                    failed.discard(index)
+                else:
+                    failed.add(index)
+                if status_outcome(status) in (STATUS_SUCCESS, STATUS_DUPLICATE):
+                    hu_index.add(hu)
+                if report:
+                    report.write({
+                        "index": index,
+                        "hu": hu,
+                        "hu_type": hu_type,
+                        "created": created,
+                        "outcome": status_outcome(status),
+                        "status": status,
+                        "attempt": attempt,
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    })
+                else:
+                    print(f"HU {hu} : {status}")
+        except sap_errors() as e:
+            print(str(e), file=sys.stderr)
+            print(f"Lot interrompu : relancer avec --batch {batch} --resume pour le reprendre.", file=sys.stderr)
+            return 1
+        finally:
+            journal.close()
+            hu_index.save()
+            close_worker_sessions(sap_pool, session_ids)
+            if report:
+                report.close()
+    finally:
+        backend.release_thread()
+
+    for hu, reason in rejected:
+        print(f"HU {hu} écartée : {reason}", file=sys.stderr)
+    for error in errors:
+        print(f"Session arrêtée {error}", file=sys.stderr)
+    elapsed = time.monotonic() - start
+    print(f"Lot {batch} : {nb_ok} HU créée(s), {len(failed)} en échec, {len(rejected)} écartée(s) avant envoi, "
+          f"en {elapsed:.1f} s sur {len(session_ids)} session(s).", file=sys.stderr)
+    return 0 if not failed and not errors else 1
+
+def run_macro_cli(args):
+    """Commande 'macro' : liste, vérifie, importe ou rejoue les macros de --file. Renvoie le code retour."""
+    if args.action == "list":
+        for name, definition in sorted(load_macros(args.file).items()):
+            print(f"{name} : {definition.get('transaction') or '(sans transaction)'}, "
+                  f"{len(definition.get('setup', []))} étape(s) d'ouverture, {len(definition.get('steps', []))} étape(s) par ligne")
+        return 0
+    if not args.name:
+        print(f"'macro {args.action}' nécessite le nom de la macro.", file=sys.stderr)
+        return 2
+    try:
+        if args.action == "import":
+            if not args.input:
+                print("'macro import' nécessite --input (script .vbs enregistré par SAP GUI).", file=sys.stderr)
+                return 2
+            with open(args.input, encoding="utf-8-sig", errors="replace") as f:
+                definition = import_vbs_macro(f)
+            save_macro(args.name, definition, args.file)
+            print(f"Macro '{args.name}' enregistrée dans {args.file} : {len(definition['steps'])} étape(s).")
+            return 0
+        plan = load_macro(args.name, args.file)
+        if args.action == "check":
+            columns = ", ".join(sorted(plan.columns)) or "aucune"
+            print(f"Macro '{plan.name}' valide : {len(plan.setup)} étape(s) d'ouverture, {len(plan.steps)} par ligne, "
+                  f"colonnes utilisées : {columns}.")
+            return 0
+    except (MacroError, OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    # Rejeu sur les lignes du CSV
+    if not args.input:
+        print("'macro run' nécessite --input (CSV des lignes à rejouer).", file=sys.stderr)
+        return 2
+    rows = iter_csv_rows(args.input)
+    first = next(rows, None)
+    if first is None:
+        print("Fichier vide : rien à rejouer.", file=sys.stderr)
+        return 0
+    try:
+        plan.check_columns(first)
+    except MacroError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    saplogon_path, sap_env = load_env_profile((args.env or [None])[0])
+    backend = get_backend()
+    backend.init_thread()
+    try:
+        try:
+            sap_pool = SapConnectionManager(saplogon_path, sap_env)
+            connection, _ = sap_pool.get_connection()
+            if args.session < 0 or args.session >= connection.Children.Count:
+                print(f"La session d'index {args.session} n'existe pas.", file=sys.stderr)
+                return 2
+            session = connection.Children(args.session)
+        except (OSError, *sap_errors()) as e:
+            print(f"Connexion SAP impossible : {e}", file=sys.stderr)
+            return 1
+
+        report = HUReportWriter(args.report, ["index", "outcome", "status"] + list(first)) if args.report else None
+        nb_ok = nb_failed = 0
+        start = time.monotonic()
+        try:
+            for index, row, status in run_macro(session, plan, itertools.chain([first], rows)):
+                if status.outcome == STATUS_SUCCESS:
+                    nb_ok += 1
+                else:
+                    nb_failed += 1
+                if report:
+                    report.write(dict(row, index=index, outcome=status.outcome, status=status))
+                else:
+                    print(f"Ligne {index + 1} : {status}")
+        except sap_errors() as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        finally:
+            if report:
+                report.close()
+    finally:
+        backend.release_thread()
+    elapsed = time.monotonic() - start
+    print(f"Macro '{plan.name}' : {nb_ok} ligne(s) en succès, {nb_failed} en échec, en {elapsed:.1f} s.", file=sys.stderr)
+    return 0 if not nb_failed else 1
+
+def run_schedule_cli(args):
+    """Commande 'schedule' : exécute un fichier de tâches sur plusieurs sessions et affiche le débit. Renvoie le code retour."""
+    try:
+        rows = list(iter_csv_rows(args.input))
+        plans = load_job_plans(rows, args.macros)
+    except (MacroError, OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    if not rows:
+        print("Fichier vide : aucune tâche.", file=sys.stderr)
+        return 0
+
+    saplogon_path, sap_env = load_env_profile((args.env or [None])[0])
+    backend = get_backend()
+    backend.init_thread()
+    try:
+        try:
+            sap_pool = SapConnectionManager(saplogon_path, sap_env)
+            connection, _ = sap_pool.get_connection()
+            if args.session < 0 or args.session >= connection.Children.Count:
+                print(f"La session d'index {args.session} n'existe pas.", file=sys.stderr)
+                return 2
+            session = connection.Children(args.session)
+        except (OSError, *sap_errors()) as e:
+            print(f"Connexion SAP impossible : {e}", file=sys.stderr)
+            return 1
+
+        report = HUReportWriter(args.report, ["index", "session", "outcome", "status", "duration_ms"] + list(rows[0])) if args.report else None
+        session_ids = [session.Id]
+        errors = []
+        results = []
+        start = time.monotonic()
+        try:
+            session_ids = open_worker_sessions(sap_pool, session, args.sessions)
+            for index, row, session_id, status, duration in run_schedule(sap_pool, session_ids, rows, plans, errors=errors):
+                results.append((index, row, session_id, status, duration))
+                if report:
+                    report.write(dict(row, index=index, session=session_id, outcome=status.outcome,
+                                      status=status, duration_ms=round(duration * 1000, 1)))
+                else:
+                    print(f"Tâche {index + 1} ({session_id}) : {status}")
+        except sap_errors() as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        finally:
+            close_worker_sessions(sap_pool, session_ids)
+            if report:
+                report.close()
+    finally:
+        backend.release_thread()
+    summary = schedule_summary(results, time.monotonic() - start)
+
+    for error in errors:
+        print(f"Session arrêtée {error}", file=sys.stderr)
+    for session_id, stats in summary["sessions"].items():
+        print(f"{session_id} : {stats['jobs']} tâche(s), {stats['mean_ms']} ms en moyenne", file=sys.stderr)
+    print(f"{summary['jobs']} tâche(s), {summary['succeeded']} en succès, {summary['failed']} en échec - "
+          f"{summary['jobs_per_second']} tâche(s)/s sur {len(session_ids)} session(s).", file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0 if not summary["failed"] and not errors else 1
+
+# Profil d'environnement de la thread courante, pour EnvPrefixedStream
+_env_thread = threading.local()
+
+class EnvPrefixedStream:
+    """Flux de sortie partagé par les threads d'environnement : chaque ligne est préfixée par [profil] de la thread qui l'écrit."""
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def write(self, text):
+        name = getattr(_env_thread, "name", None)
+        if name is None:
+            return self.stream.write(text)
+        with self._lock:
+            lines = (self._pending.pop(name, "") + text).split("\n")
+            self._pending[name] = lines.pop()
+            for line in lines:
+                self.stream.write(f"[{name}] {line}\n")
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def run_cli_on_environments(command, args):
+    """
+    Exécute 'command' (run_*_cli) sur chaque profil de args.env en parallèle, une thread par environnement.
+    Les fichiers --report et --summary sont suffixés par le profil, chaque ligne affichée est préfixée
+    par [profil]. Renvoie le code retour le plus élevé.
+    """
+    codes = {}
+
+    def worker(name):
+        _env_thread.name = name
+        env_args = argparse.Namespace(**vars(args))
+        env_args.env = [name]
+        for key in ("report", "summary"):
+            if getattr(env_args, key, None):
+                setattr(env_args, key, env_file(getattr(env_args, key), name))
+        try:
+            codes[name] = command(env_args)
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}", file=sys.stderr)
+            codes[name] = 1
+
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = EnvPrefixedStream(stdout), EnvPrefixedStream(stderr)
+    try:
+        threads = [threading.Thread(target=worker, args=(name,), name=f"env-{name}") for name in args.env]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    return max(codes.values())
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.backend:
+        set_backend(load_backend(args.backend))
+    if args.trace:
+        set_tracing(True)
+
+    if args.command in ("hu-create", "bench", "macro", "schedule"):
+        if args.env:
+            args.env = list(dict.fromkeys(args.env))
+            try:
+                for name in args.env:
+                    load_env_profile(name)
+            except ValueError as e:
+                print(str(e), file=sys.stderr)
+                sys.exit(2)
+            if len(args.env) > 1 and getattr(args, "input", None) == "-":
+                print("L'entrée standard ne peut pas être lue pour plusieurs environnements.", file=sys.stderr)
+                sys.exit(2)
+        try:
+            if args.command == "hu-create":
+                command = run_hu_create_cli
+            elif args.command == "macro":
+                command = run_macro_cli
+            elif args.command == "schedule":
+                command = run_schedule_cli
+            else:
+                command = run_bench_cli
+            multi_env = command is not run_bench_cli and getattr(args, "action", "run") == "run"
+            if multi_env and args.env and len(args.env) > 1:
+                code = run_cli_on_environments(command, args)
+            else:
+                code = command(args)
+        finally:
+            if args.trace:
+                if args.trace_format == "chrome":
+                    TRACER.export_chrome_trace(args.trace)
+                else:
+                    TRACER.export_json(args.trace)
+        sys.exit(code)
 
-def main():
-    app = MainApp()
+    app = MainApp(startup_report=args.startup_report)
     app.mainloop()
 
 if __name__ == "__main__":
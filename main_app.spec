@@ -21,20 +21,18 @@ a = Analysis(
 )
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
+# Build "onedir" sans UPX : l'exécutable démarre sans décompresser l'application
+# dans un dossier temporaire à chaque lancement (mesure : main_app.exe --startup-report startup.json)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main_app',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -42,3 +40,33 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+# Même application en exécutable console, pour les commandes batch (hu-create, bench, macro, schedule) :
+# l'exécutable fenêtré n'a ni stdout ni stderr, leurs sorties y seraient perdues
+exe_cli = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='main_app_cli',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    exe_cli,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main_app',
+)
@@ -0,0 +1,52 @@
+"""Fixtures communes : chaque test tourne dans un dossier temporaire, sur le simulateur SAP."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main_app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """config.ini, journaux et index dans tmp_path ; configuration et backend remis à zéro."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main_app, "_config_store", None)
+    monkeypatch.setattr(main_app, "_status_table", None)
+    monkeypatch.setattr(main_app, "STATUS_MESSAGES", dict(main_app.STATUS_MESSAGES))
+    previous = main_app._backend
+    yield tmp_path
+    main_app.set_backend(previous)
+
+
+@pytest.fixture
+def simulator():
+    backend = main_app.SimulatorBackend()
+    main_app.set_backend(backend)
+    return backend
+
+
+@pytest.fixture
+def sap_pool(simulator):
+    return main_app.SapConnectionManager("saplogon.exe", "TEST")
+
+
+@pytest.fixture
+def session(sap_pool):
+    connection, _ = sap_pool.get_connection()
+    return connection.Children(0)
+
+
+@pytest.fixture
+def slow_simulator():
+    """Simulateur dont les sessions restent occupées après chaque sendVKey, comme SAP GUI."""
+    backend = main_app.SimulatorBackend(roundtrip_latency=0.005)
+    main_app.set_backend(backend)
+    return backend
+
+
+@pytest.fixture
+def slow_pool(slow_simulator):
+    return main_app.SapConnectionManager("saplogon.exe", "TEST")
@@ -0,0 +1,25 @@
+import main_app
+
+
+def test_benchmark_runs_with_default_latency():
+    previous = main_app.get_backend()
+    results = main_app.run_benchmark(nb_hus=10, nb_sessions=2, nb_launches=3, nb_refreshes=3)
+    assert main_app.get_backend() is previous
+    assert results["refresh_sessions"]["count"] == 3
+    assert results["launch_transaction"]["count"] == 3
+    hu = results["hu_creation"]
+    assert hu["sessions"] == 2
+    assert hu["created"] == 10 and hu["failed"] == 0
+    assert hu["count"] == 10
+    assert hu["roundtrips_per_hu"] >= 1
+
+
+def test_benchmark_bulk_creation():
+    results = main_app.run_benchmark(nb_hus=20, nb_sessions=3, nb_launches=1, nb_refreshes=1,
+                                     hu_type="PAC0012", bulk_size=10)
+    hu = results["hu_creation"]
+    assert hu["created"] == 20
+    # La création en masse n'utilise que la première session : les autres ne sont pas ouvertes
+    assert hu["sessions"] == 1
+    # Deux validations de 10 HU sans numéro
+    assert hu["count"] == 2
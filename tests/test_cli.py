@@ -0,0 +1,135 @@
+import csv
+import io
+import threading
+
+import pytest
+
+import main_app
+
+
+def run_cli(*argv):
+    with pytest.raises(SystemExit) as exit_info:
+        main_app.main(["--backend", "simulator", *argv])
+    return exit_info.value.code
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_iter_hu_source_text(isolated):
+    path = write(isolated / "hus.txt", "HU1, HU2\n\n HU3 \n")
+    assert list(main_app.iter_hu_source(path)) == ["HU1", "HU2", "HU3"]
+
+
+def test_iter_hu_source_csv_columns(isolated):
+    path = write(isolated / "hus.csv", "id;hu\n1;HU1\n2;\n3;HU3\n")
+    assert list(main_app.iter_hu_source(path, "hu")) == ["HU1", "HU3"]
+    assert list(main_app.iter_hu_source(path, "0")) == ["id", "1", "2", "3"]
+    with pytest.raises(ValueError, match="absente"):
+        list(main_app.iter_hu_source(path, "numero"))
+
+
+def test_iter_hu_source_stdin(monkeypatch):
+    monkeypatch.setattr(main_app.sys, "stdin", io.StringIO("HU1\nHU2,HU3\n"))
+    assert list(main_app.iter_hu_source("-")) == ["HU1", "HU2", "HU3"]
+
+
+def test_hu_create_writes_report_and_index(isolated, capsys):
+    path = write(isolated / "hus.txt", "HU1\nHU2\nHU3\nHU2\n")
+    code = run_cli("hu-create", "--input", path, "--work-center", "GPAK", "--storage-bin", "PACK-01",
+                   "--hu-type", "PAC0011", "--sessions", "2", "--report", "report.csv")
+    assert code == 0
+    with open(isolated / "report.csv", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f, delimiter=";"))
+    assert [row["hu"] for row in rows] == ["HU1", "HU2", "HU3"]
+    assert all(row["created"] == "True" for row in rows)
+    assert "HU HU2 écartée : doublon dans la saisie" in capsys.readouterr().err
+    assert (isolated / "hu_index.txt").read_text(encoding="utf-8").split() == ["HU1", "HU2", "HU3"]
+
+
+def test_hu_create_skips_hus_of_the_local_index(isolated, capsys):
+    (isolated / "hu_index.txt").write_text("HU1\n", encoding="utf-8")
+    path = write(isolated / "hus.txt", "HU1\nHU2\n")
+    code = run_cli("hu-create", "--input", path, "--work-center", "GPAK", "--storage-bin", "PACK-01",
+                   "--hu-type", "PAC0011")
+    captured = capsys.readouterr()
+    assert code == 0
+    assert captured.out.splitlines() == ["HU HU2 : HU HU2 was constructed"]
+    assert "1 HU créée(s), 0 en échec, 1 écartée(s)" in captured.err
+
+
+def test_hu_create_count_without_number(isolated, capsys):
+    code = run_cli("hu-create", "--count", "3", "--work-center", "GPAK", "--storage-bin", "PACK-01",
+                   "--hu-type", "PAC0012", "--report", "report.jsonl")
+    assert code == 0
+    lines = (isolated / "report.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+
+
+def test_hu_create_requires_parameters(isolated, capsys):
+    code = run_cli("hu-create", "--count", "1")
+    assert code == 2
+    assert "--work-center" in capsys.readouterr().err
+
+
+def test_hu_create_runs_on_each_environment(isolated, capsys):
+    write(isolated / "config.ini", "[Env:QW1]\nsap_environment = QW1 - Qualité\n")
+    path = write(isolated / "hus.txt", "HU1\nHU2\n")
+    code = run_cli("--env", "SAP", "--env", "QW1", "hu-create", "--input", path, "--work-center", "GPAK",
+                   "--storage-bin", "PACK-01", "--hu-type", "PAC0011", "--report", "report.csv")
+    captured = capsys.readouterr()
+    assert code == 0
+    # Un résumé par environnement, préfixé par le profil
+    summaries = sorted(line for line in captured.err.splitlines() if "HU créée(s)" in line)
+    assert [line[:6] for line in summaries] == ["[QW1] ", "[SAP] "]
+    assert all("2 HU créée(s), 0 en échec" in line for line in summaries)
+    # Rapports, index et connexions propres à chaque environnement
+    for report in ("report.csv", "report.QW1.csv"):
+        with open(isolated / report, encoding="utf-8") as f:
+            assert [row["hu"] for row in csv.DictReader(f, delimiter=";")] == ["HU1", "HU2"]
+    assert (isolated / "hu_index.QW1.txt").read_text(encoding="utf-8").split() == ["HU1", "HU2"]
+    connections = main_app.get_backend().application.connections
+    assert sorted(connection.Description for connection in connections) == sorted(
+        [main_app.DEFAULT_CONFIG["SAP"]["sap_environment"], "QW1 - Qualité"])
+
+
+def test_environments_return_the_highest_code(isolated, capsys):
+    write(isolated / "config.ini", "[Env:QW1]\nsap_environment = QW1 - Qualité\n")
+    args = main_app.argparse.Namespace(env=["SAP", "QW1"], report="report.csv", summary=None)
+    seen = {}
+
+    def command(env_args):
+        seen[env_args.env[0]] = env_args.report
+        print("terminé")
+        if env_args.env[0] == "QW1":
+            raise RuntimeError("connexion perdue")
+        return 0
+
+    assert main_app.run_cli_on_environments(command, args) == 1
+    assert seen == {"SAP": "report.csv", "QW1": "report.QW1.csv"}
+    captured = capsys.readouterr()
+    assert sorted(captured.out.splitlines()) == ["[QW1] terminé", "[SAP] terminé"]
+    assert captured.err == "[QW1] RuntimeError: connexion perdue\n"
+
+
+@pytest.mark.parametrize("argv, expected", [
+    (["hu-create", "--count", "2", "--hu-type", "PAC0012", "--sessions", "2"], 0),
+    (["hu-create", "--count", "2", "--hu-type", "PAC0012", "--session", "5"], 2),
+    (["schedule", "--input", "tasks.csv", "--sessions", "2"], 0),
+])
+def test_cli_releases_every_initialized_thread(isolated, monkeypatch, argv, expected):
+    write(isolated / "tasks.csv", "transaction\n/n/scwm/mon\n/n/scwm/mon\n")
+    calls = []
+
+    def record(call):
+        # Seule la thread de la commande compte : celles des sessions se libèrent de leur côté
+        return lambda self: calls.append(call) if threading.current_thread() is threading.main_thread() else None
+
+    monkeypatch.setattr(main_app.SimulatorBackend, "init_thread", record("init"), raising=False)
+    monkeypatch.setattr(main_app.SimulatorBackend, "release_thread", record("release"), raising=False)
+    code = run_cli(*argv, "--work-center", "GPAK", "--storage-bin", "PACK-01") if argv[0] == "hu-create" \
+        else run_cli(*argv)
+    assert code == expected
+    assert calls == ["init", "release"]
@@ -0,0 +1,96 @@
+import configparser
+
+import pytest
+
+import main_app
+from main_app import ConfigStore
+
+
+def read_ini(path):
+    parser = configparser.ConfigParser()
+    parser.read(path, encoding="utf-8")
+    return parser
+
+
+def test_missing_config_is_created_with_defaults(isolated):
+    path = isolated / "config.ini"
+    ConfigStore(str(path))
+    assert read_ini(path).get("HU", "pack_values_source") == main_app.DEFAULT_CONFIG["HU"]["pack_values_source"]
+
+
+def test_changes_are_written_on_flush_only(isolated, monkeypatch):
+    monkeypatch.setattr(ConfigStore, "FLUSH_DELAY", 60)
+    path = isolated / "config.ini"
+    config = ConfigStore(str(path))
+    config.set("HU", "default_work_center", "GPAK")
+    config.add_to_list("HU", "work_center", "GPAK")
+    config.add_to_list("HU", "work_center", "RPAK")
+    assert not read_ini(path).has_option("HU", "default_work_center")
+    config.flush()
+    written = read_ini(path)
+    assert written.get("HU", "default_work_center") == "GPAK"
+    assert written.get("HU", "work_center").endswith("GPAK, RPAK")
+    assert not list(isolated.glob(".config-*"))
+
+
+def test_unchanged_value_does_not_schedule_a_flush(isolated):
+    config = ConfigStore(str(isolated / "config.ini"))
+    config.set("HU", "x", "1")
+    config.flush()
+    config.set("HU", "x", "1")
+    assert config._timer is None
+
+
+def test_delayed_flush_groups_changes(isolated, monkeypatch):
+    monkeypatch.setattr(ConfigStore, "FLUSH_DELAY", 0.01)
+    path = isolated / "config.ini"
+    config = ConfigStore(str(path))
+    for value in range(5):
+        config.set("HU", "x", str(value))
+    config._timer.join(1)
+    assert read_ini(path).get("HU", "x") == "4"
+
+
+def test_lists_keep_order_without_duplicates(isolated):
+    config = ConfigStore(str(isolated / "config.ini"))
+    config.set_list("Transactions", "favorites", ["b", "a", "b", " ", "c"])
+    assert config.get_list("Transactions", "favorites") == ["b", "a", "c"]
+    assert not config.add_to_list("Transactions", "favorites", "a")
+    assert config.remove_from_list("Transactions", "favorites", "a")
+    assert config.get_list("Transactions", "favorites") == ["b", "c"]
+
+
+ENV_CONFIG = """[SAP]
+saplogon_path = C:\\SAP\\saplogon.exe
+sap_environment = PW1 - Production
+
+[Env:QW1]
+sap_environment = QW1 - Qualité
+
+[Env:DW1]
+saplogon_path = D:\\SAP\\saplogon.exe
+sap_environment = DW1 - Développement
+
+[Env:VIDE]
+saplogon_path = D:\\SAP\\saplogon.exe
+"""
+
+
+def test_env_profiles_fall_back_on_the_sap_section(isolated):
+    (isolated / "config.ini").write_text(ENV_CONFIG, encoding="utf-8")
+    assert main_app.env_profiles() == ["SAP", "QW1", "DW1", "VIDE"]
+    assert main_app.load_env_profile() == ("C:\\SAP\\saplogon.exe", "PW1 - Production")
+    assert main_app.load_env_profile("SAP") == main_app.load_env_profile()
+    # saplogon_path reprise de [SAP] quand le profil ne la donne pas
+    assert main_app.load_env_profile("QW1") == ("C:\\SAP\\saplogon.exe", "QW1 - Qualité")
+    assert main_app.load_env_profile("DW1") == ("D:\\SAP\\saplogon.exe", "DW1 - Développement")
+    for name in ("VIDE", "ABSENT"):
+        with pytest.raises(ValueError, match=name):
+            main_app.load_env_profile(name)
+
+
+def test_env_file_suffixes_non_default_profiles():
+    assert main_app.env_file("hu_index.txt") == "hu_index.txt"
+    assert main_app.env_file("hu_index.txt", "SAP") == "hu_index.txt"
+    assert main_app.env_file("hu_index.txt", "QW1") == "hu_index.QW1.txt"
+    assert main_app.env_file("rapport", "Q W/1") == "rapport.Q_W_1"
@@ -0,0 +1,49 @@
+import pytest
+
+import main_app
+
+
+def test_connection_is_resolved_again_after_saplogon_restart(sap_pool, simulator):
+    connection, _ = sap_pool.get_connection()
+    assert sap_pool.get_connection()[0] is connection
+    simulator.stop_saplogon()
+    # La poignée en cache est périmée : SAP Logon est relancé et la connexion rouverte
+    fresh, _ = sap_pool.get_connection()
+    assert fresh is not connection
+    assert simulator.saplogon_running
+    assert fresh.Children.Count == 1
+
+
+def test_session_is_resolved_again_after_saplogon_restart(sap_pool, simulator):
+    session_id = "/app/con[0]/ses[0]"
+    session = sap_pool.get_session(session_id)
+    assert sap_pool.get_session(session_id) is session
+    simulator.stop_saplogon()
+    fresh = sap_pool.get_session(session_id)
+    assert fresh is not session
+    assert fresh.Id == session_id and not fresh.Busy
+    assert sap_pool.get_session(session_id) is fresh
+
+
+def test_session_closed_behind_the_manager_is_not_returned(sap_pool, simulator):
+    connection, _ = sap_pool.get_connection()
+    session_id = connection.add_session().Id
+    session = sap_pool.get_session(session_id)
+    connection.CloseSession(session_id)
+    assert session.closed
+    # La session n'existe plus : l'erreur COM de findById remonte au lieu de la poignée périmée
+    with pytest.raises(simulator.com_error):
+        sap_pool.get_session(session_id)
+    assert sap_pool.get_session("/app/con[0]/ses[0]") is connection.Children(0)
+
+
+def test_liveness_probe_does_not_swallow_other_errors(sap_pool, monkeypatch):
+    session_id = "/app/con[0]/ses[0]"
+    sap_pool.get_session(session_id)
+
+    def broken(self):
+        raise AttributeError("Busy")
+
+    monkeypatch.setattr(main_app.SimSession, "Busy", property(broken))
+    with pytest.raises(AttributeError, match="Busy"):
+        sap_pool.get_session(session_id)
@@ -0,0 +1,44 @@
+import main_app
+
+
+class StaleControl:
+    """Référence de contrôle périmée : tout accès lève une erreur COM."""
+    def __getattr__(self, name):
+        raise main_app.SimulatedComError(f"Référence périmée : {name}")
+
+
+def count_find_by_id(monkeypatch):
+    counter = []
+    find_by_id = main_app.SimSession.findById
+
+    def counted(self, control_id, raise_error=True):
+        counter.append(control_id)
+        return find_by_id(self, control_id, raise_error)
+
+    monkeypatch.setattr(main_app.SimSession, "findById", counted)
+    return counter
+
+
+def test_control_cache_saves_lookups_per_hu(session, monkeypatch):
+    controls = main_app.open_pack_screen(session, "GPAK", "PACK-01")
+    lookups = count_find_by_id(monkeypatch)
+    for i in range(10):
+        main_app.create_one_hu(controls, f"HU{i}", "PAC0011", "PACK-01")
+    # dest_hu, pack_material, dest_bin, wnd[0] et wnd[0]/sbar ne sont résolus qu'une fois
+    assert len(lookups) == 5
+    assert controls.hits == 10 * 5 - 5
+
+    # Sans cache (une référence résolue à chaque usage), 5 findById par HU
+    del lookups[:]
+    for i in range(10):
+        controls.invalidate()
+        main_app.create_one_hu(controls, f"HUX{i}", "PAC0011", "PACK-01")
+    assert len(lookups) == 10 * 5
+
+
+def test_status_resolves_stale_status_bar_again(session):
+    controls = main_app.open_pack_screen(session, "GPAK", "PACK-01")
+    main_app.create_one_hu(controls, "HU1", "PAC0011", "PACK-01")
+    controls._controls["wnd[0]/sbar"] = StaleControl()
+    assert controls.status() == "HU HU1 was constructed"
+    assert not isinstance(controls.find("wnd[0]/sbar"), StaleControl)
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+import main_app
+
+
+def use_simulator(**options):
+    backend = main_app.SimulatorBackend(**options)
+    main_app.set_backend(backend)
+    return backend
+
+
+def test_saplogon_exit_is_reported_without_waiting():
+    use_simulator(saplogon_running=False, saplogon_exit_code=1)
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="code de sortie 1"):
+        main_app.discover_sap_gui("saplogon.exe", timeout=5)
+    assert time.monotonic() - start < 1
+
+
+def test_delayed_registration_is_awaited():
+    backend = use_simulator(saplogon_running=False, saplogon_delay=0.2)
+    start = time.monotonic()
+    sap_gui = main_app.discover_sap_gui("saplogon.exe", timeout=5)
+    elapsed = time.monotonic() - start
+    assert sap_gui.GetScriptingEngine is backend.application
+    assert 0.2 <= elapsed < 1.5
+
+
+def test_running_saplogon_is_not_started_again(monkeypatch):
+    backend = use_simulator()
+    # SAP Logon tourne mais SAPGUI n'est pas encore enregistré
+    backend._registered_at = time.monotonic() + 0.1
+    started = []
+    monkeypatch.setattr(backend, "start_saplogon", lambda path: started.append(path))
+    assert main_app.discover_sap_gui("saplogon.exe", timeout=5).GetScriptingEngine is backend.application
+    assert started == []
+
+
+def test_discovery_times_out():
+    backend = use_simulator(saplogon_running=False, saplogon_delay=10)
+    with pytest.raises(TimeoutError):
+        main_app.discover_sap_gui("saplogon.exe", timeout=0.2)
+    assert backend.saplogon_running
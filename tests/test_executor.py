@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+import main_app
+from main_app import JobCancelled, SapExecutor
+
+
+class FakeRoot:
+    """Remplace Tk : after() garde le rappel, pump() joue ceux dus comme le ferait la boucle Tk."""
+    def __init__(self):
+        self.scheduled = []
+        self.reported = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+    def pump(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for callback in scheduled:
+            callback()
+
+    def pump_until(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "callbacks non reçus"
+            self.pump()
+            time.sleep(0.005)
+
+    def report_callback_exception(self, exc_type, exc_value, traceback):
+        self.reported.append(exc_value)
+
+
+@pytest.fixture
+def executor(simulator):
+    root = FakeRoot()
+    executor = SapExecutor(root)
+    yield executor
+    executor.shutdown()
+
+
+def test_callbacks_run_in_tk_thread_through_after(executor):
+    root = executor.root
+    released = threading.Event()
+    calls = []
+
+    def task(job, count):
+        for i in range(count):
+            job.progress(i)
+        released.wait(1)
+        return threading.get_ident()
+
+    executor.submit(task, 3,
+                    on_progress=lambda value: calls.append(("progress", value, threading.get_ident())),
+                    on_done=lambda worker: calls.append(("done", worker, threading.get_ident())))
+    time.sleep(0.02)
+    # Rien n'est rappelé depuis la thread de travail : tout attend la distribution par after()
+    assert calls == []
+    released.set()
+    root.pump_until(lambda: any(call[0] == "done" for call in calls))
+    test_thread = threading.get_ident()
+    assert [call[:2] for call in calls[:3]] == [("progress", 0), ("progress", 1), ("progress", 2)]
+    assert all(call[2] == test_thread for call in calls)
+    assert calls[3][1] != test_thread
+    # La distribution est reprogrammée à chaque passage
+    assert len(root.scheduled) == 1
+
+
+def test_errors_and_cancellation_reach_on_error(executor):
+    root = executor.root
+    results = []
+    job = executor.submit(lambda job: time.sleep(0.05), on_done=lambda _: results.append("premier"))
+    cancelled = executor.submit(lambda job: results.append("exécutée"),
+                                on_error=lambda e: results.append(type(e)))
+    cancelled.cancel()
+
+    def fail(job):
+        raise RuntimeError("SAP indisponible")
+
+    executor.submit(fail, on_error=lambda e: results.append(str(e)))
+    root.pump_until(lambda: len(results) == 3)
+    # Ordre de soumission ; la tâche annulée avant son tour n'est pas exécutée
+    assert results == ["premier", JobCancelled, "SAP indisponible"]
+    assert not job.cancelled
+
+
+def test_failing_callback_does_not_stop_dispatch(executor):
+    root = executor.root
+    results = []
+
+    def broken(_):
+        raise ValueError("callback en erreur")
+
+    def closed_window(_):
+        raise main_app.tk.TclError("invalid command name")
+
+    executor.post(broken, None)
+    executor.post(closed_window, None)
+    executor.post(results.append, "suivant")
+    root.pump()
+    assert results == ["suivant"]
+    assert [str(e) for e in root.reported] == ["callback en erreur"]
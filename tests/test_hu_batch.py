@@ -0,0 +1,194 @@
+import collections
+import time
+
+import pytest
+
+import main_app
+from main_app import STATUS_DUPLICATE, STATUS_FATAL, STATUS_RETRY, STATUS_SUCCESS
+
+
+@pytest.fixture
+def failing_hus(monkeypatch):
+    """HU dont la validation lève une erreur COM (comme un délai dépassé côté SAP GUI)."""
+    failing = set()
+    create_hu = main_app.SimSession.create_hu
+
+    def flaky_create_hu(self):
+        if self.fields.get(main_app.PACK_SCREEN["dest_hu"], "") in failing:
+            raise main_app.SimulatedComError("Délai dépassé simulé")
+        create_hu(self)
+
+    monkeypatch.setattr(main_app.SimSession, "create_hu", flaky_create_hu)
+    return failing
+
+
+def open_sessions(sap_pool, session, nb):
+    return main_app.open_worker_sessions(sap_pool, session, nb)
+
+
+def test_parallel_batch_keeps_sessions_running_after_hu_errors(sap_pool, session, failing_hus):
+    failing_hus.update({"HU5", "HU6", "HU7"})
+    session_ids = open_sessions(sap_pool, session, 3)
+    hus = [f"HU{i}" for i in range(30)]
+    errors = []
+    try:
+        results = list(main_app.create_hu_batch(sap_pool, session_ids, hus, "PAC0011", "GPAK", "PACK-01",
+                                                 errors=errors))
+    finally:
+        main_app.close_worker_sessions(sap_pool, session_ids)
+    assert [hu for hu, _ in results] == hus
+    outcomes = {hu: main_app.status_outcome(status) for hu, status in results}
+    assert {hu for hu, outcome in outcomes.items() if outcome == STATUS_RETRY} == failing_hus
+    assert sum(outcome == STATUS_SUCCESS for outcome in outcomes.values()) == 27
+    assert errors == []
+
+
+def test_serial_batch_keeps_going_after_hu_errors(sap_pool, session, failing_hus):
+    failing_hus.add("HU1")
+    results = list(main_app.create_hu_batch(sap_pool, [session.Id], ["HU0", "HU1", "HU2"],
+                                            "PAC0011", "GPAK", "PACK-01"))
+    assert [main_app.status_outcome(status) for _, status in results] == [STATUS_SUCCESS, STATUS_RETRY, STATUS_SUCCESS]
+
+
+@pytest.fixture
+def bulk_simulator(simulator, monkeypatch):
+    """Simulateur avec champ de quantité ; 'validations' compte les créations par session."""
+    simulator.quantity_field = main_app.SIM_QUANTITY_FIELD
+    simulator.validations = collections.Counter()
+    create_hu = main_app.SimSession.create_hu
+
+    def counted_create_hu(self):
+        simulator.validations[self.Id] += 1
+        create_hu(self)
+
+    monkeypatch.setattr(main_app.SimSession, "create_hu", counted_create_hu)
+    return simulator
+
+
+def test_numbered_hus_are_spread_across_sessions_with_bulk_field(sap_pool, session, bulk_simulator):
+    session_ids = open_sessions(sap_pool, session, 3)
+    hus = [f"HU{i}" for i in range(30)]
+    try:
+        results = list(main_app.create_hu_batch(sap_pool, session_ids, hus, "PAC0011", "GPAK", "PACK-01",
+                                                 quantity_field=main_app.SIM_QUANTITY_FIELD, bulk_size=10))
+    finally:
+        main_app.close_worker_sessions(sap_pool, session_ids)
+    assert [hu for hu, _ in results] == hus
+    assert all(main_app.is_hu_created(status) for _, status in results)
+    assert set(bulk_simulator.validations) == set(session_ids)
+    assert sum(bulk_simulator.validations.values()) == 30
+
+
+def test_unnumbered_hus_are_created_in_bulk(sap_pool, session, bulk_simulator):
+    results = list(main_app.create_hu_batch(sap_pool, [session.Id], [""] * 25, "PAC0012", "GPAK", "PACK-01",
+                                             quantity_field=main_app.SIM_QUANTITY_FIELD, bulk_size=10))
+    assert len(results) == 25
+    assert all(main_app.is_hu_created(status) for _, status in results)
+    # 3 validations (10 + 10 + 5) au lieu de 25
+    assert bulk_simulator.validations[session.Id] == 3
+    connection, _ = sap_pool.get_connection()
+    assert len(connection.created_hus) == 25
+
+
+def test_bulk_mode_is_probed_before_opening_worker_sessions(sap_pool, session, bulk_simulator):
+    bulk, hu_iter, controls = main_app.probe_bulk_mode(session, iter([""] * 5), "GPAK", "PACK-01",
+                                                       main_app.SIM_QUANTITY_FIELD)
+    assert bulk and list(hu_iter) == [""] * 5
+    assert controls.session is session
+    bulk, hu_iter, controls = main_app.probe_bulk_mode(session, ["HU0", ""], "GPAK", "PACK-01",
+                                                       main_app.SIM_QUANTITY_FIELD)
+    assert not bulk and list(hu_iter) == ["HU0", ""] and controls is None
+    bulk_simulator.quantity_field = None
+    assert not main_app.probe_bulk_mode(session, [""], "GPAK", "PACK-01", main_app.SIM_QUANTITY_FIELD)[0]
+
+
+def test_probed_pack_screen_is_not_opened_again(sap_pool, session, bulk_simulator, monkeypatch):
+    opened = []
+    open_pack_screen = main_app.open_pack_screen
+
+    def counted_open_pack_screen(session, *args):
+        opened.append(session.Id)
+        return open_pack_screen(session, *args)
+
+    monkeypatch.setattr(main_app, "open_pack_screen", counted_open_pack_screen)
+    bulk, hu_iter, controls = main_app.probe_bulk_mode(session, [""] * 12, "GPAK", "PACK-01",
+                                                       main_app.SIM_QUANTITY_FIELD)
+    results = list(main_app.create_hu_batch(sap_pool, [session.Id], hu_iter, "PAC0012", "GPAK", "PACK-01",
+                                             quantity_field=main_app.SIM_QUANTITY_FIELD, bulk_size=10,
+                                             controls=controls))
+    assert all(main_app.is_hu_created(status) for _, status in results) and len(results) == 12
+    assert opened == [session.Id]
+    assert bulk_simulator.validations[session.Id] == 2
+
+
+def test_empty_batch(sap_pool, session):
+    assert list(main_app.create_hu_batch(sap_pool, [session.Id], [], "PAC0011", "GPAK", "PACK-01")) == []
+
+
+def test_status_read_once_session_is_idle(sap_pool, session):
+    controls = main_app.open_pack_screen(session, "GPAK", "PACK-01")
+    session.connection.created_hus.add("HUDUP")
+    start = time.perf_counter()
+    statuses = [main_app.create_one_hu(controls, hu, "PAC0011", "PACK-01") for hu in ("HUDUP", "HUDUP", "HUNEW")]
+    # Un même message deux fois de suite n'est pas attendu jusqu'à ce qu'il change
+    assert time.perf_counter() - start < 0.3
+    assert [main_app.status_outcome(status) for status in statuses] == [STATUS_DUPLICATE, STATUS_DUPLICATE,
+                                                                         STATUS_SUCCESS]
+    assert statuses[2] == "HU HUNEW was constructed"
+
+
+class ProgressJob:
+    """Tâche minimale pour appeler run_hu_creation hors du SapExecutor."""
+    cancelled = False
+
+    def __init__(self):
+        self.messages = []
+
+    def progress(self, value):
+        self.messages.append(value)
+
+    def check_cancelled(self):
+        pass
+
+
+def test_sessions_already_opened_are_closed_when_opening_fails(sap_pool, session, monkeypatch):
+    open_new_session = main_app.open_new_session
+    opened = []
+
+    def failing_open(connection, transaction_code=""):
+        if len(opened) == 2:
+            raise main_app.SimulatedComError("Ouverture refusée")
+        opened.append(open_new_session(connection, transaction_code))
+        return opened[-1]
+
+    monkeypatch.setattr(main_app, "open_new_session", failing_open)
+    with pytest.raises(main_app.SimulatedComError):
+        main_app.open_worker_sessions(sap_pool, session, 4)
+    connection, _ = sap_pool.get_connection()
+    assert [s.Id for s in connection.sessions] == [session.Id]
+
+
+def test_hu_creation_reports_com_errors_and_closes_its_session(sap_pool, session, isolated, monkeypatch):
+    def failing_batch(*args, **kwargs):
+        raise main_app.SimulatedComError("Erreur COM simulée")
+        yield
+
+    monkeypatch.setattr(main_app, "run_journaled_batch", failing_batch)
+    job = ProgressJob()
+    main_app.run_hu_creation(job, sap_pool, None, {}, ["HU1"], "PAC0011", "GPAK", "PACK-01", nb_parallel=2,
+                             journal_path=str(isolated / "journal.jsonl"))
+    assert job.messages[-1] == "Erreur COM simulée"
+    connection, _ = sap_pool.get_connection()
+    # La session dédiée et la session de travail ont été refermées
+    assert [s.Id for s in connection.sessions] == [session.Id]
+
+
+def test_fatal_error_costs_one_validation_and_one_back(sap_pool, session, simulator):
+    controls = main_app.open_pack_screen(session, "GPAK", "PACK-01")
+    roundtrips = simulator.roundtrips
+    status = main_app.create_one_hu(controls, "HU1", "", "PACK-01")
+    assert status.outcome == STATUS_FATAL
+    # F8 puis F2, sans nouvelle tentative
+    assert simulator.roundtrips - roundtrips == 2
+    # Tous les champs sont réécrits : l'HU suivante passe après le retour arrière
+    assert main_app.is_hu_created(main_app.create_one_hu(controls, "HU2", "PAC0011", "PACK-01"))
@@ -0,0 +1,53 @@
+import re
+
+import main_app
+from main_app import HUIndex, filter_hu_input
+
+
+def test_filter_hu_input_rejects_format_duplicates_and_known(isolated):
+    index = HUIndex()
+    index.add("000123")
+    rejected = []
+    hus = ["HU1", "hu1", "bad hu", "123", "", "HU2", ""]
+    kept = list(filter_hu_input(hus, re.compile("[0-9A-Za-z]{1,20}"), index, rejected))
+    assert kept == ["HU1", "", "HU2", ""]
+    assert rejected == [
+        ("hu1", "doublon dans la saisie"),
+        ("bad hu", "format invalide"),
+        ("123", "déjà créée (index local)"),
+    ]
+
+
+def test_filter_hu_input_is_lazy():
+    source = iter(["A", "B", "C"])
+    filtered = filter_hu_input(source)
+    assert next(filtered) == "A"
+    assert next(source) == "B"
+
+
+def test_hu_index_key_normalization():
+    assert HUIndex.key(" 00042 ") == "42"
+    assert HUIndex.key("000") == "0"
+    assert HUIndex.key("abc01") == "ABC01"
+
+
+def test_hu_index_save_merges_with_other_writers(isolated):
+    path = isolated / "hu_index.txt"
+    first = HUIndex(str(path))
+    first.load()
+    other = HUIndex(str(path))
+    other.add("B")
+    other.save()
+    first.add("A")
+    first.save()
+    assert path.read_text(encoding="utf-8").split() == ["A", "B"]
+    assert "b" in HUIndex(str(path))
+    assert not list(isolated.glob(".hu_index-*"))
+
+
+def test_hu_index_ignores_hus_without_number(isolated):
+    index = HUIndex()
+    index.add("")
+    index.save()
+    assert len(index) == 0
+    assert not (isolated / main_app.HU_INDEX_FILE).exists()
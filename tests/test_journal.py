@@ -0,0 +1,64 @@
+import main_app
+from main_app import HUJournal, STATUS_RETRY, run_journaled_batch
+
+
+def run_batch(sap_pool, session, hus, journal, **kwargs):
+    return list(run_journaled_batch(sap_pool, [session.Id], hus, "PAC0011", "GPAK", "PACK-01",
+                                    journal, "B1", retry_backoff=0, **kwargs))
+
+
+def test_batch_records_every_hu(sap_pool, session, isolated):
+    journal = HUJournal(str(isolated / "journal.jsonl"))
+    results = run_batch(sap_pool, session, ["HU1", "HU2", "HU3"], journal)
+    journal.close()
+    assert [(index, hu, created) for index, hu, _, created, _ in results] == [(0, "HU1", True), (1, "HU2", True), (2, "HU3", True)]
+    assert journal.completed("B1") == {"HU1", "HU2", "HU3"}
+
+
+def test_resume_skips_hus_already_created(sap_pool, session, isolated, simulator):
+    journal = HUJournal(str(isolated / "journal.jsonl"))
+    run_batch(sap_pool, session, ["HU1", "HU2"], journal)
+    results = run_batch(sap_pool, session, ["HU1", "HU2", "HU3", "HU4"], journal, resume=True)
+    journal.close()
+    # Les HU 1 et 2 ne sont pas renvoyées à SAP (elles y seraient signalées en double)
+    assert [(index, hu) for index, hu, *_ in results] == [(2, "HU3"), (3, "HU4")]
+    assert all(created for *_, created, _ in results)
+
+
+def test_resume_keys_hus_without_number_by_position(sap_pool, session, isolated):
+    journal = HUJournal(str(isolated / "journal.jsonl"))
+    journal.record("B1", 0, "", "PAC0012", "GPAK", "PACK-01", "HU 1 was constructed", True, 0)
+    results = run_batch(sap_pool, session, ["", ""], journal, resume=True)
+    journal.close()
+    assert [index for index, *_ in results] == [1]
+
+
+def test_transient_errors_are_retried(sap_pool, session, isolated, simulator):
+    simulator.error_rate = 0.5
+    journal = HUJournal(str(isolated / "journal.jsonl"))
+    hus = [f"HU{i}" for i in range(20)]
+    results = run_batch(sap_pool, session, hus, journal, max_retries=20)
+    journal.close()
+    attempts = [attempt for *_, attempt in results]
+    assert max(attempts) > 0
+    created = {hu for _, hu, _, created, _ in results if created}
+    assert created == set(hus)
+    retried = [entry for entry in journal.entries("B1") if entry["outcome"] == STATUS_RETRY]
+    assert len(retried) == len(results) - len(hus)
+
+
+def test_retries_stop_after_max_retries(sap_pool, session, isolated, simulator):
+    simulator.error_rate = 1.0
+    journal = HUJournal(str(isolated / "journal.jsonl"))
+    results = run_batch(sap_pool, session, ["HU1"], journal, max_retries=2)
+    journal.close()
+    assert [attempt for *_, attempt in results] == [0, 1, 2]
+    assert not any(created for *_, created, _ in results)
+
+
+def test_duplicates_are_not_retried(sap_pool, session, isolated):
+    journal = HUJournal(str(isolated / "journal.jsonl"))
+    results = run_batch(sap_pool, session, ["HU1", "HU1"], journal)
+    journal.close()
+    assert len(results) == 2
+    assert main_app.status_outcome(results[1][2]) == main_app.STATUS_DUPLICATE
@@ -0,0 +1,51 @@
+from main_app import STATUS_SUCCESS
+import main_app
+
+
+def test_launch_transaction_waits_for_session(slow_pool):
+    sessions_map = {"Session 0": 0}
+    for _ in range(3):
+        main_app.launch_sap_transaction(slow_pool, "/n/scwm/mon", "Session 0", sessions_map)
+    main_app.launch_sap_transaction(slow_pool, "/n/scwm/mon", "Nouvelle session", sessions_map)
+    connection, _ = slow_pool.get_connection()
+    assert connection.Children.Count == 2
+    assert connection.Children(1).Info.Transaction == "/SCWM/MON"
+
+
+def test_parallel_hu_batch_under_latency(slow_pool):
+    connection, _ = slow_pool.get_connection()
+    session_ids = main_app.open_worker_sessions(slow_pool, connection.Children(0), 3)
+    assert len(session_ids) == 3
+    hus = [f"HU{i}" for i in range(12)]
+    errors = []
+    try:
+        results = list(main_app.create_hu_batch(slow_pool, session_ids, hus, "PAC0011", "GPAK", "PACK-01",
+                                                 errors=errors))
+    finally:
+        main_app.close_worker_sessions(slow_pool, session_ids)
+    assert errors == []
+    assert [hu for hu, _ in results] == hus
+    assert all(main_app.is_hu_created(status) for _, status in results)
+
+
+def test_schedule_under_latency(slow_pool):
+    connection, _ = slow_pool.get_connection()
+    session_ids = main_app.open_worker_sessions(slow_pool, connection.Children(0), 3)
+    rows = [{"transaction": "/n/scwm/mon"} for _ in range(9)]
+    errors = []
+    try:
+        results = list(main_app.run_schedule(slow_pool, session_ids, rows, {}, errors=errors))
+    finally:
+        main_app.close_worker_sessions(slow_pool, session_ids)
+    assert errors == []
+    assert sorted(index for index, *_ in results) == list(range(9))
+    assert all(status.outcome == STATUS_SUCCESS for _, _, _, status, _ in results)
+
+
+def test_pack_values_under_latency(slow_pool, slow_simulator):
+    for grid in (False, True):
+        slow_simulator.f4_grid = grid
+        values = main_app.load_pack_values(None, slow_pool, "f4", "GPAK", "PACK-01")
+        assert values["work_center"] == ["GPAK", "GPK2", "RPAK"]
+        assert values["hu_type"] == sorted(main_app.SIM_F4_VALUES[main_app.PACK_SCREEN["pack_material"]])
+        assert values["incomplete"] == []
@@ -0,0 +1,97 @@
+import main_app
+from main_app import BufferedTextLog
+
+
+class FakeText:
+    """Remplace le widget Text : contenu par lignes, rappels after() gardés jusqu'à run_after()."""
+    def __init__(self):
+        self.text = ""
+        self.inserts = 0
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append((delay, callback))
+
+    def run_after(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for _, callback in scheduled:
+            callback()
+
+    def insert(self, index, text):
+        assert index == main_app.tk.END
+        self.text += text
+        self.inserts += 1
+
+    def delete(self, start, end):
+        assert start == "1.0"
+        if end == main_app.tk.END:
+            self.text = ""
+        else:
+            # "N.0" : début de la ligne N, les N - 1 premières lignes sont supprimées
+            line = int(end.split(".")[0])
+            self.text = "".join(self.text.splitlines(keepends=True)[line - 1:])
+
+    def see(self, index):
+        pass
+
+    def lines(self):
+        return self.text.splitlines()
+
+
+class ListLogger:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+
+def test_lines_are_flushed_in_one_insert_per_frame():
+    widget = FakeText()
+    flushes = []
+    log = BufferedTextLog(widget, interval_ms=40, max_lines=100, on_flush=lambda: flushes.append(None))
+    for i in range(5):
+        log.write(f"ligne {i}")
+    # Une seule image programmée, rien d'affiché avant
+    assert [delay for delay, _ in widget.scheduled] == [40]
+    assert widget.text == ""
+    widget.run_after()
+    assert widget.lines() == [f"ligne {i}" for i in range(5)]
+    assert widget.inserts == 1 and len(flushes) == 1
+    log.write("ligne 5")
+    widget.run_after()
+    assert widget.lines()[-1] == "ligne 5" and widget.inserts == 2
+
+
+def test_widget_keeps_only_the_last_lines_but_file_gets_all():
+    widget = FakeText()
+    logger = ListLogger()
+    log = BufferedTextLog(widget, max_lines=10, file_logger=logger)
+    for i in range(25):
+        log.write(f"ligne {i}")
+    log.write("fichier seulement", display=False)
+    widget.run_after()
+    assert widget.lines() == [f"ligne {i}" for i in range(15, 25)]
+    for i in range(25, 28):
+        log.write(f"ligne {i}")
+    widget.run_after()
+    assert widget.lines() == [f"ligne {i}" for i in range(18, 28)]
+    assert logger.messages == [f"ligne {i}" for i in range(25)] + ["fichier seulement"] + \
+        [f"ligne {i}" for i in range(25, 28)]
+    log.clear()
+    assert widget.text == ""
+
+
+def test_flush_ignores_closed_window():
+    widget = FakeText()
+
+    def closed(index, text):
+        raise main_app.tk.TclError("invalid command name")
+
+    widget.insert = closed
+    log = BufferedTextLog(widget)
+    log.write("perdue")
+    widget.run_after()
+    # Une nouvelle ligne reprogramme une image
+    log.write("suivante")
+    assert len(widget.scheduled) == 1
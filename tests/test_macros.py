@@ -0,0 +1,110 @@
+import pytest
+
+import main_app
+from main_app import MacroError, compile_macro, import_vbs_macro
+
+MACRO = {
+    "transaction": "/n/scwm/sbup",
+    "fields": {"hu": "wnd[0]/usr/ctxtP_HUIDENT"},
+    "setup": [{"set": "wnd[0]/usr/ctxtP_LGNUM", "value": "1075"}, {"key": 8}],
+    "steps": [{"set": "hu", "value": "{HU}"}, {"key": 0}, {"wait": "idle"},
+              {"assert": ["success"], "on_error": "back"}],
+}
+
+
+def test_compile_macro_resolves_fields_and_columns():
+    plan = compile_macro("sbup", MACRO)
+    assert plan.transaction == "/n/scwm/sbup"
+    assert plan.columns == {"HU"}
+    assert plan.steps[0] == ("set", "wnd[0]/usr/ctxtP_HUIDENT", "{HU}", True)
+    assert plan.steps[2] == ("wait", "idle", main_app.WAIT_TIMEOUT)
+    assert plan.steps[3] == ("assert", frozenset({"success"}), "back")
+    assert plan.setup[0] == ("set", "wnd[0]/usr/ctxtP_LGNUM", "1075", False)
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([], "aucune étape"),
+    ([{"set": "x"}], "'value' manquant"),
+    ([{"set": "x", "value": "{}"}], "doit nommer une colonne"),
+    ([{"set": "x", "value": "{HU"}], "valeur invalide"),
+    ([{"key": "F8"}], "touche invalide"),
+    ([{"key": 0, "press": "btn"}], "une seule action"),
+    ([{"assert": ["ok"]}], "résultat"),
+    ([{"assert": "success", "on_error": "retry"}], "on_error"),
+])
+def test_compile_macro_rejects_invalid_steps(steps, message):
+    with pytest.raises(MacroError, match=message):
+        compile_macro("m", {"steps": steps})
+
+
+def test_compile_macro_rejects_columns_in_setup():
+    with pytest.raises(MacroError, match="setup"):
+        compile_macro("m", {"setup": [{"set": "x", "value": "{HU}"}], "steps": [{"key": 0}]})
+
+
+def test_check_columns():
+    plan = compile_macro("sbup", MACRO)
+    plan.check_columns(["HU", "autre"])
+    with pytest.raises(MacroError, match="HU"):
+        plan.check_columns(["autre"])
+
+
+def test_import_vbs_macro():
+    lines = [
+        'session.findById("wnd[0]").maximize',
+        'session.findById("wnd[0]/tbar[0]/okcd").text = "/n/scwm/sbup"',
+        'session.findById("wnd[0]").sendVKey 0',
+        'session.findById("wnd[0]/usr/ctxtP_HUIDENT").text = "say ""hi"""',
+        'session.findById("wnd[0]/usr/ctxtP_HUIDENT").caretPosition = 4',
+        'session.findById("wnd[0]/tbar[1]/btn[8]").press',
+        'session.findById("wnd[0]").sendVKey 3',
+    ]
+    definition = import_vbs_macro(lines)
+    assert definition == {
+        "transaction": "/n/scwm/sbup",
+        "steps": [{"set": "wnd[0]/usr/ctxtP_HUIDENT", "value": 'say "hi"'},
+                  {"press": "wnd[0]/tbar[1]/btn[8]"},
+                  {"key": 3}],
+    }
+    assert compile_macro("imported", definition).columns == set()
+
+
+def test_save_and_load_macro(isolated):
+    path = str(isolated / "macros.json")
+    main_app.save_macro("sbup", MACRO, path)
+    assert main_app.load_macro("sbup", path).columns == {"HU"}
+    with pytest.raises(MacroError, match="introuvable"):
+        main_app.load_macro("absente", path)
+
+
+def test_import_vbs_macro_keeps_braces_literal(session):
+    lines = [
+        'session.findById("wnd[0]/tbar[0]/okcd").text = "/nzbrace"',
+        'session.findById("wnd[0]").sendVKey 0',
+        'session.findById("wnd[0]/tbar[0]/okcd").text = "{HU} }{"',
+    ]
+    definition = import_vbs_macro(lines)
+    assert definition["steps"][0]["value"] == "{{HU}} }}{{"
+    plan = compile_macro("imported", definition)
+    assert plan.columns == set()
+    controls = main_app.ControlCache(session, main_app.PACK_SCREEN)
+    main_app.run_macro_steps(controls, plan.steps, {})
+    assert session.fields["wnd[0]/tbar[0]/okcd"] == "{HU} }{"
+
+
+def test_import_vbs_macro_rejects_unsupported_actions():
+    lines = [
+        'session.findById("wnd[0]").resizeWorkingPane 120,26,false',
+        'session.findById("wnd[0]/usr/ctxtP_HUIDENT").setFocus',
+        'session.findById("wnd[0]/usr/tabsTAB/tabpSCAN").select',
+        'session.findById("wnd[0]/usr/chkP_TEST").selected = true',
+        'session.findById("wnd[0]/usr/cmbP_MODE").key = "2"',
+        'session.findById("wnd[0]/shellcont/shell").doubleClickNode "F00001"',
+        'session.findById("wnd[0]/tbar[1]/btn[8]").press',
+    ]
+    with pytest.raises(MacroError) as error:
+        import_vbs_macro(lines)
+    message = str(error.value)
+    for number in (3, 4, 5, 6):
+        assert f"ligne {number} :" in message
+    assert "ligne 1 " not in message and "ligne 2 " not in message and "ligne 7 " not in message
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import main_app
+from main_app import PACK_SCREEN, PackValuesCache, SIM_F4_VALUES
+
+
+def open_selection_screen(session):
+    session.findById("wnd[0]/tbar[0]/okcd").text = "/n/scwm/pack"
+    session.findById("wnd[0]").sendVKey(0)
+
+
+@pytest.mark.parametrize("grid", [False, True])
+def test_f4_values_are_read_page_by_page(session, simulator, grid):
+    simulator.f4_grid = grid
+    simulator.f4_page_size = 2
+    open_selection_screen(session)
+    values, complete = main_app.read_f4_values(session, PACK_SCREEN["storage_bin"])
+    assert values == sorted(SIM_F4_VALUES[PACK_SCREEN["storage_bin"]])
+    assert complete
+    # Le popup est refermé
+    assert session.popup is None
+
+
+def test_f4_list_that_stops_scrolling_is_incomplete(session, monkeypatch):
+    monkeypatch.setattr(main_app.SimScrollbar, "Position",
+                        property(lambda self: 0, lambda self, value: None))
+    open_selection_screen(session)
+    values, complete = main_app.read_f4_values(session, PACK_SCREEN["storage_bin"])
+    assert values == sorted(SIM_F4_VALUES[PACK_SCREEN["storage_bin"]][:3])
+    assert not complete
+
+
+@pytest.mark.parametrize("grid", [False, True])
+def test_f4_values_beyond_the_row_limit_are_incomplete(session, simulator, monkeypatch, grid):
+    simulator.f4_grid = grid
+    monkeypatch.setattr(main_app, "F4_MAX_ROWS", 2)
+    open_selection_screen(session)
+    values, complete = main_app.read_f4_values(session, PACK_SCREEN["storage_bin"])
+    assert not complete
+    assert len(values) >= 2
+
+
+def test_pack_values_are_loaded_in_a_session_of_their_own(sap_pool, session):
+    session.findById(PACK_SCREEN["okcode"]).text = "/n/scwm/mon"
+    session.findById(PACK_SCREEN["window"]).sendVKey(0)
+    cache = PackValuesCache()
+    values = main_app.load_pack_values(None, sap_pool, "f4", "RPAK", "PACK-02", cache=cache)
+    connection, _ = sap_pool.get_connection()
+    # La session de l'utilisateur garde sa transaction ; celle du chargement est refermée
+    assert connection.sessions == [session]
+    assert session.transaction == "/SCWM/MON"
+    assert values["storage_bin"] == sorted(SIM_F4_VALUES[PACK_SCREEN["storage_bin"]])
+    assert cache.get("TEST") == values
+
+
+def test_pack_values_session_is_closed_on_error(sap_pool, session, monkeypatch):
+    def failing_fetcher(session, wc, sb):
+        raise RuntimeError("F4 indisponible")
+
+    monkeypatch.setitem(main_app.PACK_VALUE_FETCHERS, "f4", failing_fetcher)
+    with pytest.raises(RuntimeError, match="F4 indisponible"):
+        main_app.load_pack_values(None, sap_pool, "f4")
+    connection, _ = sap_pool.get_connection()
+    assert connection.sessions == [session]
+
+
+def test_pack_values_cache_expires(isolated, monkeypatch):
+    cache = PackValuesCache(ttl=60)
+    values = {"work_center": ["GPAK"], "storage_bin": [], "hu_type": [], "incomplete": []}
+    cache.put("PW1", values)
+    assert cache.get("PW1") == values
+    assert cache.get("QW1") is None
+    now = main_app.time.time()
+    monkeypatch.setattr(main_app.time, "time", lambda: now + 61)
+    assert cache.get("PW1") is None
+
+
+def test_pack_values_cache_ignores_old_format_and_corrupt_file(isolated):
+    cache = PackValuesCache()
+    with open(cache.path, "w", encoding="utf-8") as f:
+        json.dump({"PW1": {"fetched_at": main_app.time.time(), "values": {"work_center": ["GPAK"]}}}, f)
+    assert cache.get("PW1") is None
+    with open(cache.path, "w", encoding="utf-8") as f:
+        f.write("{tronqué")
+    assert cache.get("PW1") is None
+    cache.put("PW1", {"work_center": ["GPAK"]})
+    assert cache.get("PW1") == {"work_center": ["GPAK"]}
+
+
+def test_check_pack_values():
+    values = {"work_center": ["GPAK"], "storage_bin": ["PACK-01"], "hu_type": [], "incomplete": ["storage_bin"]}
+    assert main_app.check_pack_values(values, work_center="GPAK", storage_bin="PACK-01", hu_type="PAC0011") == ([], [])
+    # Absente d'une liste complète : invalide ; d'une liste peut-être incomplète : douteuse ; sans liste : acceptée
+    assert main_app.check_pack_values(values, work_center="XXXX", storage_bin="OTHER", hu_type="PAC0011") == \
+        (["work_center"], ["storage_bin"])
+    assert main_app.check_pack_values({}, work_center="XXXX") == ([], [])
@@ -0,0 +1,95 @@
+import collections
+import time
+
+import pytest
+
+import main_app
+from main_app import SessionLane, STATUS_RETRY, STATUS_SUCCESS
+
+
+class SlowSessionBackend(main_app.SimulatorBackend):
+    """Simulateur dont une session répond lentement à chaque aller-retour serveur."""
+    def __init__(self, slow_session_id, delay):
+        super().__init__()
+        self.slow_session_id = slow_session_id
+        self.delay = delay
+
+    def roundtrip(self, session=None):
+        super().roundtrip(session)
+        if session is not None and session.Id == self.slow_session_id:
+            time.sleep(self.delay)
+
+
+def test_lane_cost_accounts_for_latency_and_transaction_switch():
+    lane = SessionLane("s")
+    assert lane.cost(("", "/n/a"), 1.0) == 2.0
+    lane.last_key = ("", "/n/a")
+    assert lane.cost(("", "/n/a"), 1.0) == 1.0
+    lane.observe(0.1)
+    lane.observe(0.2)
+    assert lane.done == 2
+    assert abs(lane.latency - 0.13) < 1e-9
+
+
+def test_fast_sessions_get_more_jobs():
+    backend = SlowSessionBackend("/app/con[0]/ses[2]", 0.02)
+    main_app.set_backend(backend)
+    sap_pool = main_app.SapConnectionManager("saplogon.exe", "TEST")
+    connection, _ = sap_pool.get_connection()
+    session_ids = main_app.open_worker_sessions(sap_pool, connection.Children(0), 3)
+    assert session_ids[2] == backend.slow_session_id
+    rows = [{"transaction": "/n/scwm/mon"} for _ in range(60)]
+    try:
+        results = list(main_app.run_schedule(sap_pool, session_ids, rows, {}))
+    finally:
+        main_app.close_worker_sessions(sap_pool, session_ids)
+    assert sorted(index for index, *_ in results) == list(range(60))
+    assert all(status.outcome == STATUS_SUCCESS for _, _, _, status, _ in results)
+    per_session = collections.Counter(session_id for _, _, session_id, _, _ in results)
+    assert per_session[backend.slow_session_id] < min(per_session[session_ids[0]], per_session[session_ids[1]])
+
+
+class CrashingSessionBackend(main_app.SimulatorBackend):
+    """Simulateur dont une session s'arrête (erreur hors COM) au 'crash_at'-ième aller-retour."""
+    def __init__(self, crash_session_id, crash_at):
+        super().__init__()
+        self.crash_session_id = crash_session_id
+        self.crash_at = crash_at
+        self.crash_roundtrips = 0
+
+    def roundtrip(self, session=None):
+        super().roundtrip(session)
+        if session is not None and session.Id == self.crash_session_id:
+            self.crash_roundtrips += 1
+            if self.crash_roundtrips >= self.crash_at:
+                raise OSError("Le serveur RPC n'est pas disponible.")
+        time.sleep(0.002)
+
+
+def test_jobs_queued_on_a_stopped_session_run_on_the_others():
+    backend = CrashingSessionBackend("/app/con[0]/ses[1]", 3)
+    main_app.set_backend(backend)
+    sap_pool = main_app.SapConnectionManager("saplogon.exe", "TEST")
+    connection, _ = sap_pool.get_connection()
+    session_ids = main_app.open_worker_sessions(sap_pool, connection.Children(0), 3)
+    rows = [{"transaction": "/n/scwm/mon"} for _ in range(30)]
+    errors = []
+    try:
+        results = list(main_app.run_schedule(sap_pool, session_ids, rows, {}, errors=errors))
+    finally:
+        main_app.close_worker_sessions(sap_pool, session_ids)
+    assert sorted(index for index, *_ in results) == list(range(30))
+    assert len(errors) == 1 and backend.crash_session_id in errors[0]
+    # Seule la tâche en cours sur la session arrêtée est à retenter ; sa file est passée aux autres
+    retried = [(session_id, status) for _, _, session_id, status, _ in results if status.outcome != STATUS_SUCCESS]
+    assert len(retried) == 1
+    assert retried[0][0] == backend.crash_session_id and retried[0][1].outcome == STATUS_RETRY
+    per_session = collections.Counter(session_id for _, _, session_id, _, _ in results)
+    assert per_session[backend.crash_session_id] == 3
+
+
+def test_load_job_plans_rejects_unknown_macro(isolated):
+    with pytest.raises(main_app.MacroError, match="absente"):
+        main_app.load_job_plans([{"transaction": "/n/scwm/mon"}, {"macro": "absente"}])
+    with pytest.raises(main_app.MacroError, match="transaction"):
+        main_app.load_job_plans([{"transaction": " "}])
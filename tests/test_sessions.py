@@ -0,0 +1,78 @@
+import main_app
+from main_app import SessionInventory
+
+
+class FakeRoot:
+    """Remplace Tk : les rappels programmés avec after() sont gardés, pas exécutés."""
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+
+class InlineExecutor:
+    """Exécute les tâches tout de suite, dans la thread du test."""
+    def submit(self, task, *args, on_done=None, on_error=None, **kwargs):
+        try:
+            result = task(None, *args, **kwargs)
+        except Exception as e:
+            on_error(e)
+        else:
+            on_done(result)
+
+
+def make_inventory(sap_pool):
+    inventory = SessionInventory(FakeRoot(), InlineExecutor(), sap_pool)
+    updates = []
+    inventory.subscribe(updates.append)
+    return inventory, updates
+
+
+def test_periodic_refresh_does_not_restart_closed_sap(sap_pool, simulator):
+    inventory, updates = make_inventory(sap_pool)
+    inventory.refresh(connect=True)
+    assert len(inventory.sessions) == 1
+    simulator.stop_saplogon()
+    inventory._tick()
+    assert not simulator.saplogon_running
+    assert simulator.application.connections == []
+    assert inventory.error is not None and inventory.sessions == []
+    # Une erreur inchangée ne rappelle pas les abonnés à chaque rafraîchissement
+    count = len(updates)
+    inventory._tick()
+    assert len(updates) == count
+
+
+def test_periodic_refresh_does_not_open_missing_connection(sap_pool, simulator):
+    inventory, _ = make_inventory(sap_pool)
+    inventory.refresh()
+    assert "Aucune connexion" in str(inventory.error)
+    assert simulator.application.connections == []
+    inventory.refresh(connect=True)
+    assert inventory.error is None
+    assert len(simulator.application.connections) == 1
+
+
+def test_session_list_recovers_when_sap_is_back(sap_pool, simulator):
+    inventory, updates = make_inventory(sap_pool)
+    inventory.refresh(connect=True)
+    simulator.stop_saplogon()
+    inventory._tick()
+    inventory.refresh(connect=True)
+    assert simulator.saplogon_running
+    assert inventory.error is None and len(inventory.sessions) == 1
+    assert updates[-1] == inventory.sessions
+
+
+def test_refresh_follows_screen_change_within_transaction(sap_pool, simulator, session):
+    inventory, updates = make_inventory(sap_pool)
+    session.findById("wnd[0]/tbar[0]/okcd").text = "/scwm/pack"
+    session.findById("wnd[0]").sendVKey(0)
+    inventory.refresh(connect=True)
+    assert inventory.sessions[0][2] == "Packing - General"
+    # Même transaction, écran suivant : le titre doit suivre
+    session.findById("wnd[0]").sendVKey(8)
+    inventory._tick()
+    assert inventory.sessions[0][2] == "Packing - Work Center"
+    assert updates[-1] == inventory.sessions
@@ -0,0 +1,64 @@
+import pytest
+
+import main_app
+from main_app import STATUS_DUPLICATE, STATUS_FATAL, STATUS_RETRY, STATUS_SUCCESS
+
+
+@pytest.mark.parametrize("args, outcome", [
+    (("HU 1 was constructed", "S", "ZZ", "1"), STATUS_SUCCESS),
+    (("Object locked", "E", "MC", "601"), STATUS_RETRY),
+    (("Object locked", "E", "mc", "601 "), STATUS_RETRY),
+    (("HU 1 already exists", "E", "/SCWM/HU_WM", "12"), STATUS_DUPLICATE),
+    # Message d'erreur absent de la table : repli sur le texte avant l'erreur définitive
+    (("HU 1 already exists", "E", "ZZ", "999"), STATUS_DUPLICATE),
+    (("Unknown error", "E", "ZZ", "999"), STATUS_FATAL),
+    # Sans type de message : le texte seul
+    (("3 HUs were constructed",), STATUS_SUCCESS),
+    (("Something else",), STATUS_FATAL),
+    (("",), STATUS_RETRY),
+])
+def test_classify_status(args, outcome):
+    assert main_app.classify_status(*args) == outcome
+
+
+def test_config_overrides_status_table(isolated):
+    (isolated / "config.ini").write_text("[StatusMessages]\nZZ 999 = retry\nMC 601 = fatal\n", encoding="utf-8")
+    assert main_app.classify_status("x", "E", "ZZ", "999") == STATUS_RETRY
+    assert main_app.classify_status("x", "E", "MC", "601") == STATUS_FATAL
+
+
+def test_simulator_messages_stay_local_to_the_backend():
+    messages = dict(main_app.STATUS_MESSAGES)
+    simulator = main_app.SimulatorBackend()
+    assert main_app.STATUS_MESSAGES == messages
+    main_app.set_backend(simulator)
+    assert main_app.classify_status("x", "E", "SIMPACK", "002") == STATUS_DUPLICATE
+    assert main_app.classify_status("x", "E", "SIMPACK", "002") == STATUS_DUPLICATE
+    main_app.set_backend(main_app.TracingBackend(simulator))
+    assert main_app.classify_status("x", "E", "SIMPACK", "002") == STATUS_DUPLICATE
+    # Un simulateur créé (bench, tests) ne change pas la classification sur le backend COM
+    main_app.set_backend(main_app.ComBackend())
+    assert main_app.classify_status("x", "E", "SIMPACK", "002") == STATUS_FATAL
+
+
+def test_read_status_reads_message_fields(session):
+    session.set_status("HU X is currently locked by another user", "E", "MC", "601")
+    status = main_app.read_status(session.findById("wnd[0]/sbar"))
+    assert status == "HU X is currently locked by another user"
+    assert (status.type, status.msg_id, status.number, status.outcome) == ("E", "MC", "601", STATUS_RETRY)
+
+
+def test_config_reclassifies_success_message(isolated, session, monkeypatch):
+    (isolated / "config.ini").write_text("[StatusMessages]\nZZPACK 042 = retry\n", encoding="utf-8")
+    # La session a déjà chargé la configuration par défaut
+    monkeypatch.setattr(main_app, "_config_store", None)
+    monkeypatch.setattr(main_app, "_status_table", None)
+    session.set_status("Nothing was packed", "S", "ZZPACK", "042")
+    status = main_app.read_status(session.findById("wnd[0]/sbar"))
+    assert (status.type, status.msg_id, status.number) == ("S", "ZZPACK", "042")
+    assert status.outcome == STATUS_RETRY
+
+
+def test_status_outcome_of_plain_text():
+    assert main_app.status_outcome("HU X was constructed") == STATUS_SUCCESS
+    assert main_app.is_hu_created(main_app.SapStatus("", outcome=STATUS_SUCCESS))
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import main_app
+
+
+@pytest.fixture
+def tracing(simulator):
+    """Trace active sur le simulateur ; TRACER vidé et désactivé à la fin du test."""
+    main_app.TRACER.clear()
+    main_app.set_tracing(True)
+    yield main_app.TRACER
+    main_app.set_tracing(False)
+    main_app.TRACER.clear()
+
+
+def test_traced_hu_creation_is_exported(tracing, isolated):
+    sap_pool = main_app.SapConnectionManager("saplogon.exe", "TEST")
+    connection, _ = sap_pool.get_connection()
+    assert isinstance(connection, main_app.TracedObject)
+    controls = main_app.open_pack_screen(connection.Children(0), "GPAK", "PACK-01")
+    status = main_app.create_one_hu(controls, "HU1", "PAC0011", "PACK-01")
+    assert main_app.is_hu_created(status)
+
+    tracing.export_chrome_trace(str(isolated / "trace.json"))
+    trace = json.loads((isolated / "trace.json").read_text(encoding="utf-8"))
+    events = trace["traceEvents"]
+    assert all(event["ph"] == "X" and event["cat"] == "sap" and event["dur"] >= 0 for event in events)
+    names = {event["name"] for event in events}
+    assert {"GetObject", "findById", "sendVKey(8)", "set text", "HU"} <= names
+    targets = {event["args"]["target"] for event in events if event["name"] == "findById"}
+    assert main_app.PACK_SCREEN["dest_hu"] in targets
+    hu_events = [event for event in events if event["name"] == "HU"]
+    assert [event["args"]["target"] for event in hu_events] == ["HU1"]
+    assert hu_events[0]["args"]["result"] == status
+
+    tracing.export_json(str(isolated / "trace_raw.json"))
+    raw = json.loads((isolated / "trace_raw.json").read_text(encoding="utf-8"))
+    assert len(raw["events"]) == len(events)
+    stats = {(row["op"], row["target"]): row["count"] for row in raw["stats"]}
+    assert stats[("HU", "HU1")] == 1
+    assert sum(count for (op, _), count in stats.items() if op == "findById") == \
+        sum(event["name"] == "findById" for event in events)
+    assert tracing.throughput() > 0
+
+
+def test_traced_object_records_reads_writes_and_calls(simulator, session):
+    tracer = main_app.SapTracer()
+    tracer.enabled = True
+    traced = main_app.TracedObject(session, "ses[0]", tracer)
+    okcode = traced.findById("wnd[0]/tbar[0]/okcd")
+    okcode.text = "/n/scwm/mon"
+    assert okcode.text == "/n/scwm/mon"
+    assert isinstance(okcode, main_app.TracedObject)
+    ops = [(op, target) for op, target, *_ in tracer.events]
+    assert ops == [("findById", "wnd[0]/tbar[0]/okcd"),
+                   ("set text", "wnd[0]/tbar[0]/okcd"),
+                   ("get text", "wnd[0]/tbar[0]/okcd")]
+    assert sorted(row[:3] for row in tracer.slowest()) == sorted((op, target, 1) for op, target in ops)
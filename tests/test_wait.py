@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+import main_app
+
+
+def test_wait_until_returns_first_true_value(simulator):
+    calls = []
+
+    def predicate():
+        calls.append(None)
+        return len(calls) >= 3 and "prêt"
+
+    assert main_app.wait_until(predicate, timeout=1, poll_min=0.001, poll_max=0.001) == "prêt"
+    assert len(calls) == 3
+
+
+def test_wait_until_raises_timeout(simulator):
+    start = time.monotonic()
+    with pytest.raises(TimeoutError, match="le contrôle"):
+        main_app.wait_until(lambda: False, timeout=0.05, description="le contrôle", poll_min=0.01)
+    assert time.monotonic() - start < 1
+
+
+def test_wait_until_treats_com_error_as_not_ready(simulator):
+    attempts = []
+
+    def predicate():
+        attempts.append(None)
+        if len(attempts) < 2:
+            raise main_app.SimulatedComError("La session est occupée.")
+        return True
+
+    assert main_app.wait_until(predicate, timeout=1, poll_min=0.001)
+    assert len(attempts) == 2
+
+
+def test_wait_until_does_not_swallow_other_errors(simulator):
+    with pytest.raises(ZeroDivisionError):
+        main_app.wait_until(lambda: 1 / 0, timeout=0.05)
+
+
+def test_wait_for_control_times_out_on_missing_control(session):
+    with pytest.raises(TimeoutError):
+        main_app.wait_for_control(session, "wnd[0]/usr/ctxtABSENT", timeout=0.05)
+
+
+def test_wait_session_idle_waits_for_the_server_roundtrip(simulator, session):
+    simulator.roundtrip_latency = 0.05
+    start = time.monotonic()
+    session.findById("wnd[0]").sendVKey(0)
+    assert session.Busy
+    with pytest.raises(main_app.SimulatedComError):
+        session.findById("wnd[0]")
+    main_app.wait_session_idle(session, timeout=1)
+    assert time.monotonic() - start >= 0.05
+    assert not session.Busy
+
+
+def test_wait_until_first_delay_then_polls_closely(simulator):
+    checks = []
+
+    def predicate():
+        checks.append(time.monotonic())
+        return len(checks) >= 3
+
+    start = time.monotonic()
+    main_app.wait_until(predicate, timeout=1, poll_min=0.001, poll_max=0.5, first_delay=0.03)
+    assert checks[1] - start >= 0.03
+    assert checks[2] - checks[1] < 0.02
+
+
+def roundtrips_per_second(session, wait, count=30):
+    start = time.monotonic()
+    for _ in range(count):
+        session.findById("wnd[0]").sendVKey(0)
+        wait(session)
+    return count / (time.monotonic() - start)
+
+
+def test_wait_session_idle_follows_a_10ms_roundtrip(simulator, session):
+    simulator.roundtrip_latency = 0.01
+    roundtrip = main_app.RoundtripEstimate()
+
+    def backoff_from_20ms(session):
+        # Ancienne attente : sondage à partir de 20 ms, doublé à chaque essai
+        main_app.wait_until(lambda: not session.Busy, 1, poll_min=0.02, poll_max=1.0)
+
+    before = roundtrips_per_second(session, backoff_from_20ms)
+    after = roundtrips_per_second(session, lambda s: main_app.wait_session_idle(s, 1, roundtrip))
+    assert 0.005 < roundtrip.value < 0.02
+    # Une attente de 20 ms minimum plafonne à 50 allers-retours/s ; le suivi de la durée observée
+    # doit s'approcher des 100/s permis par le serveur
+    assert before < 52
+    assert after > 1.4 * before
+
+
+def test_one_long_roundtrip_does_not_slow_down_the_next_ones(simulator, session):
+    simulator.roundtrip_latency = 0.01
+    roundtrip = main_app.RoundtripEstimate()
+    roundtrips_per_second(session, lambda s: main_app.wait_session_idle(s, 1, roundtrip), count=10)
+    simulator.roundtrip_latency = 0.5
+    roundtrips_per_second(session, lambda s: main_app.wait_session_idle(s, 1, roundtrip), count=1)
+    simulator.roundtrip_latency = 0.01
+    # Estimation réduite à chaque aller-retour plus court que prévu : retour à la normale
+    # en quelques allers-retours, au lieu d'une décroissance de 4 % par HU
+    roundtrips_per_second(session, lambda s: main_app.wait_session_idle(s, 1, roundtrip), count=8)
+    assert roundtrip.value < 0.03
+    assert roundtrips_per_second(session, lambda s: main_app.wait_session_idle(s, 1, roundtrip), count=20) > 45
+
+
+def test_roundtrip_estimates_are_kept_per_session(simulator, sap_pool, session):
+    connection, _ = sap_pool.get_connection()
+    other = main_app.open_new_session(connection)
+    fast, slow = main_app.ControlCache(session), main_app.ControlCache(other)
+    simulator.roundtrip_latency = 0.05
+    slow.session.findById("wnd[0]").sendVKey(0)
+    slow.wait_idle()
+    assert slow.roundtrip.value > 0
+    assert fast.roundtrip.value == 0.0
+    # Une session déjà libre ne fausse pas l'estimation
+    slow.wait_idle()
+    assert slow.roundtrip.value > 0.005